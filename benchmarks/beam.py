@@ -0,0 +1,96 @@
+"""Cost gap and speed of the beam search decoder compared to the exact segment Viterbi decoder.
+
+Run with ``python -m benchmarks.beam``.
+"""
+import argparse
+import random
+from time import perf_counter
+
+import numpy as np
+
+from benchmarks.fingerings import random_chords
+from tuttut.logic.fretboard import Fretboard
+from tuttut.logic.graph_utils import (beam_viterbi, compute_isolated_path_difficulty, difficulties_to_probabilities,
+                                      get_fingering_features, segment_path_log_probability, segment_viterbi)
+from tuttut.logic.theory import Tuning
+
+WEIGHTS = {"b": 1, "height": 1, "length": 1, "n_changed_strings": 1}
+
+
+def random_song(fretboard, n_events, n_chords=40, seed=0):
+    """Returns a random sequence of chords of 1 to 4 notes, with the inputs of the decoders.
+
+    Args:
+        fretboard (Fretboard): Fretboard
+        n_events (int): Number of events in the song
+        n_chords (int, optional): Number of distinct chords. Defaults to 40.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        tuple: Observations, chord ranges, fingering features and initial distribution
+    """
+    rnd = random.Random(seed)
+    chords = [chord for size in range(1, 5) for chord in random_chords(fretboard, size, n_chords // 4, seed=seed + size)]
+
+    fingerings = []
+    chord_ranges = []
+    for note_options in chords:
+        chord_fingerings = fretboard.get_possible_fingerings(note_options)
+        chord_ranges.append((len(fingerings), len(fingerings) + len(chord_fingerings)))
+        fingerings += chord_fingerings
+
+    V = [rnd.randrange(len(chords)) for _ in range(n_events)]
+    start, end = chord_ranges[V[0]]
+    initial = difficulties_to_probabilities([compute_isolated_path_difficulty(fretboard, path, fretboard.tuning)
+                                             for path in fingerings[start:end]])
+
+    return V, chord_ranges, get_fingering_features(fretboard, fingerings), initial
+
+
+def run(n_songs=5, n_events=500, n_chords=40, widths=(1, 2, 4, 8, 16, 32)):
+    """Decodes random songs with segment_viterbi and beam_viterbi.
+
+    Args:
+        n_songs (int, optional): Number of songs. Defaults to 5.
+        n_events (int, optional): Number of events per song. Defaults to 500.
+        n_chords (int, optional): Number of distinct chords per song. Defaults to 40.
+        widths (tuple, optional): Beam widths. Defaults to (1, 2, 4, 8, 16, 32).
+
+    Returns:
+        list: One dict per decoder, with its time and its cost gap to the exact decoder (relative, averaged over songs)
+    """
+    fretboard = Fretboard(Tuning())
+    tuning = fretboard.tuning
+    songs = [random_song(fretboard, n_events, n_chords, seed=seed) for seed in range(n_songs)]
+
+    def cost(S, song):
+        V, chord_ranges, features, initial = song
+        return -segment_path_log_probability(S, chord_ranges, features, WEIGHTS, tuning, initial)
+
+    start = perf_counter()
+    exact_paths = [segment_viterbi(*song[:3], WEIGHTS, tuning, song[3]) for song in songs]
+    elapsed = perf_counter() - start
+    exact_costs = [cost(S, song) for S, song in zip(exact_paths, songs)]
+    results = [{"decoder": "segment", "beam_width": None, "time_s": elapsed / n_songs, "cost_gap": 0.0}]
+
+    for width in widths:
+        start = perf_counter()
+        paths = [beam_viterbi(*song[:3], WEIGHTS, tuning, song[3], beam_width=width) for song in songs]
+        elapsed = perf_counter() - start
+        gaps = [(cost(S, song) - exact_cost) / exact_cost for S, song, exact_cost in zip(paths, songs, exact_costs)]
+        results.append({"decoder": "beam", "beam_width": width, "time_s": elapsed / n_songs, "cost_gap": float(np.mean(gaps))})
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Beam search decoder benchmark")
+    parser.add_argument("-n", "--songs", type=int, help="Number of random songs", default=5)
+    parser.add_argument("-e", "--events", type=int, help="Number of events per song", default=500)
+    parser.add_argument("-c", "--chords", type=int, help="Number of distinct chords per song", default=40)
+    args = parser.parse_args()
+
+    print(f"{'decoder':>8} {'width':>6} {'time':>10} {'cost gap':>10}")
+    for result in run(args.songs, args.events, args.chords):
+        width = result["beam_width"] if result["beam_width"] is not None else "-"
+        print(f"{result['decoder']:>8} {width:>6} {result['time_s'] * 1000:8.1f}ms {result['cost_gap'] * 100:9.3f}%")
@@ -0,0 +1,79 @@
+"""Benchmark of the fingering enumeration for 1 to 6-note chords.
+
+Run with ``python -m benchmarks.fingerings``.
+"""
+import argparse
+import random
+from time import perf_counter
+
+from tuttut.logic.fretboard import Fretboard
+from tuttut.logic.graph_utils import find_path_graph_fingerings
+from tuttut.logic.theory import Note, Tuning
+
+
+def random_chords(fretboard, size, n, seed=0):
+    """Returns random chords of distinct pitches that can be played on the fretboard.
+
+    Args:
+        fretboard (Fretboard): Fretboard
+        size (int): Number of notes in a chord
+        n (int): Number of chords
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        list: List of note options, one per chord
+    """
+    rnd = random.Random(seed)
+    min_pitch, max_pitch = fretboard.tuning.get_pitch_bounds()
+    chords = []
+    while len(chords) < n:
+        pitches = rnd.sample(range(min_pitch, min(max_pitch, min_pitch + 36) + 1), size)
+        note_options = fretboard.get_note_options([Note(pitch) for pitch in pitches])
+        if len(fretboard.get_possible_fingerings(note_options)) > 0:
+            chords.append(note_options)
+    return chords
+
+
+def time_per_chord(function, fretboard, chords):
+    start = perf_counter()
+    for note_options in chords:
+        function(fretboard, note_options)
+    return (perf_counter() - start) / len(chords)
+
+
+def run(n_chords=10, max_reference_size=5):
+    """Times the enumeration of fingerings for chords of 1 to 6 notes.
+
+    Args:
+        n_chords (int, optional): Number of chords per size. Defaults to 10.
+        max_reference_size (int, optional): Largest chord size timed with the path graph implementation. Defaults to 5.
+
+    Returns:
+        list: One dict per chord size
+    """
+    fretboard = Fretboard(Tuning())
+    results = []
+    for size in range(1, 7):
+        chords = random_chords(fretboard, size, n_chords, seed=size)
+        result = {
+            "notes": size,
+            "fingerings": sum(len(fretboard.get_possible_fingerings(chord)) for chord in chords) / len(chords),
+            "enumerator_s": time_per_chord(Fretboard.get_possible_fingerings, fretboard, chords),
+            "path_graph_s": None
+        }
+        if size <= max_reference_size:
+            result["path_graph_s"] = time_per_chord(find_path_graph_fingerings, fretboard, chords)
+        results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fingering enumeration benchmark")
+    parser.add_argument("-n", "--chords", type=int, help="Number of chords per size", default=10)
+    parser.add_argument("-r", "--reference-size", type=int, help="Largest chord size timed with the path graph search", default=5)
+    args = parser.parse_args()
+
+    print(f"{'notes':>5} {'fingerings':>10} {'enumerator':>12} {'path graph':>12}")
+    for result in run(args.chords, args.reference_size):
+        reference = f"{result['path_graph_s'] * 1000:10.3f}ms" if result["path_graph_s"] is not None else f"{'-':>12}"
+        print(f"{result['notes']:>5} {result['fingerings']:>10.1f} {result['enumerator_s'] * 1000:10.3f}ms {reference}")
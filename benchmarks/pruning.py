@@ -0,0 +1,68 @@
+"""Speed and quality of decoding with the fingerings of each chord pruned to the easiest ones, on the songs of the
+benchmark suite.
+
+Run with ``python -m benchmarks.pruning``.
+"""
+import argparse
+
+from benchmarks.suite import AXES, QUICK_AXES, get_cases, make_midi
+from benchmarks.synthetic import get_tuning
+from tuttut.logic.profiling import Profiler
+from tuttut.logic.tab import Tab
+from tuttut.logic.validation import get_tab_difficulty
+
+WEIGHTS = {"b": 1, "height": 1, "length": 1, "n_changed_strings": 1}
+
+SETTINGS = [{}, {"max_candidates": 16}, {"max_candidates": 8}, {"max_candidates": 4}, {"max_candidates": 2},
+            {"max_difficulty_ratio": 2}, {"max_difficulty_ratio": 1.5}, {"max_candidates": 8, "max_difficulty_ratio": 2}]
+
+
+def run(axes=AXES, settings=SETTINGS, seed=0):
+    """Converts the songs of the benchmark cases with each pruning setting.
+
+    Args:
+        axes (dict, optional): Values of each parameter of the cases, see benchmarks.suite. Defaults to AXES.
+        settings (list, optional): Pruning options of Tab, {} doesn't prune. Defaults to SETTINGS.
+        seed (int, optional): Random seed of the songs. Defaults to 0.
+
+    Returns:
+        list: Per setting, the time of the stages after the fingerings, the fingerings kept and pruned, and the
+            difficulty of the tabs (see validation.get_tab_difficulty) relative to the unpruned ones
+    """
+    cases = get_cases(axes)
+    results = [{"setting": setting, "decoding_s": 0.0, "fingerings": 0, "pruned_fingerings": 0,
+                "max_candidates_per_event": 0, "difficulty": 0.0} for setting in settings]
+
+    for case in cases:
+        midi = make_midi(case, seed)
+        tuning = get_tuning(case["tuning"])
+        for result in results:
+            profiler = Profiler(trace_memory=False)
+            tab = Tab("benchmark", tuning, midi, fingering_cache=None, decoder=case["decoder"], profiler=profiler,
+                      **result["setting"])
+            stages = {stage["stage"]: stage for stage in profiler.report()["stages"]}
+            result["decoding_s"] += sum(stages[name]["time"] for name in ["features", "transition_matrix", "emissions", "decoding"]
+                                        if name in stages)
+            counts = stages["fingerings"]["counts"]
+            result["fingerings"] += counts["fingerings"]
+            result["pruned_fingerings"] += counts["pruned_fingerings"]
+            result["max_candidates_per_event"] = max(result["max_candidates_per_event"], counts["max_candidates_per_event"])
+            result["difficulty"] += get_tab_difficulty(tab.tab, WEIGHTS)
+
+    for result in results:
+        result["difficulty_change"] = result["difficulty"] / results[0]["difficulty"] - 1
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fingerings pruning benchmark")
+    parser.add_argument("-s", "--seed", type=int, help="Random seed of the songs", default=0)
+    parser.add_argument("-q", "--quick", help="Only runs a few small cases", action="store_true")
+    args = parser.parse_args()
+
+    print(f"{'setting':>40} {'decoding':>10} {'fingerings':>11} {'pruned':>8} {'max/event':>10} {'difficulty':>11}")
+    for result in run(QUICK_AXES if args.quick else AXES, seed=args.seed):
+        setting = ", ".join(f"{key}={value}" for key, value in result["setting"].items()) or "none"
+        print(f"{setting:>40} {result['decoding_s']:9.2f}s {result['fingerings']:>11} {result['pruned_fingerings']:>8} "
+              f"{result['max_candidates_per_event']:>10} {result['difficulty_change'] * 100:+10.2f}%")
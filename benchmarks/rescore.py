@@ -0,0 +1,68 @@
+"""Speed of a search over the weights of the difficulty metric, converting the songs again for each weights compared to
+decoding their lattices.
+
+Run with ``python -m benchmarks.rescore``.
+"""
+import argparse
+from time import perf_counter
+
+from benchmarks.synthetic import synthetic_midi
+from tuttut.logic.lattice import Lattice, sample_weights, search_weights
+from tuttut.logic.tab import Tab
+from tuttut.logic.theory import Tuning
+from tuttut.logic.validation import get_tab_difficulty
+
+WEIGHTS = {"b": 1, "height": 1, "length": 1, "n_changed_strings": 1}
+RANGES = {"b": (0.2, 3), "height": (0, 5), "length": (0, 5), "n_changed_strings": (0, 5)}
+
+
+def run(n_songs=4, n_events=300, n_weights=20, decoder="segment", workers=None):
+    """Searches random weights over synthetic songs, by converting them again and with their lattices.
+
+    Args:
+        n_songs (int, optional): Number of songs. Defaults to 4.
+        n_events (int, optional): Number of events per song. Defaults to 300.
+        n_weights (int, optional): Number of weights to try. Defaults to 20.
+        decoder (str, optional): Decoder of the tabs. Defaults to "segment".
+        workers (int, optional): Number of processes of the lattice search. Defaults to the number of CPUs.
+
+    Returns:
+        dict: Time in seconds of each method, and whether both found the same difficulties
+    """
+    tuning = Tuning()
+    midis = [synthetic_midi(n_events, seed=seed) for seed in range(n_songs)]
+    candidates = sample_weights(n_weights, RANGES)
+
+    start = perf_counter()
+    converted = [[get_tab_difficulty(Tab("benchmark", tuning, midi, weights=weights, decoder=decoder, fingering_cache=None).tab,
+                                     WEIGHTS) for midi in midis] for weights in candidates]
+    convert_s = perf_counter() - start
+
+    start = perf_counter()
+    lattices = [Lattice.from_tab(Tab("benchmark", tuning, midi, decoder=decoder, fingering_cache=None)) for midi in midis]
+    lattice_s = perf_counter() - start
+
+    start = perf_counter()
+    results = search_weights(lattices, candidates, WEIGHTS, workers=workers)
+    search_s = perf_counter() - start
+
+    return {
+        "convert_s": convert_s,
+        "lattice_s": lattice_s,
+        "search_s": search_s,
+        "same_difficulties": [result["difficulties"] for result in results] == converted,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Weights search benchmark")
+    parser.add_argument("-n", "--songs", type=int, help="Number of synthetic songs", default=4)
+    parser.add_argument("-e", "--events", type=int, help="Number of events per song", default=300)
+    parser.add_argument("-k", "--weights", type=int, help="Number of random weights", default=20)
+    parser.add_argument("-d", "--decoder", type=str, choices=Tab.decoders, help="Decoder of the tabs", default="segment")
+    parser.add_argument("-w", "--workers", type=int, help="Number of processes of the lattice search", default=None)
+    args = parser.parse_args()
+
+    result = run(args.songs, args.events, args.weights, args.decoder, args.workers)
+    print(f"converting again {result['convert_s']:.2f}s, lattices {result['lattice_s']:.2f}s + "
+          f"search {result['search_s']:.2f}s, same difficulties: {result['same_difficulties']}")
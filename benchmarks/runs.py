@@ -0,0 +1,86 @@
+"""Speed of decoding rhythm parts with and without the compression of repeated chords, and how often the compressed
+decode chooses other fingerings.
+
+Run with ``python -m benchmarks.runs``.
+"""
+import argparse
+import random
+
+import pretty_midi
+
+from tuttut.logic.profiling import Profiler
+from tuttut.logic.tab import Tab
+from tuttut.logic.theory import Tuning
+
+
+def rhythm_midi(n_chords, repeats=(1, 2, 4, 8, 16), seed=0):
+    """Generates a rhythm part, random chords strummed several times each in eighth notes.
+
+    Args:
+        n_chords (int): Number of chord changes
+        repeats (tuple, optional): Possible number of strums of each chord. Defaults to (1, 2, 4, 8, 16).
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        pretty_midi.PrettyMIDI: The song
+    """
+    rnd = random.Random(seed)
+    midi = pretty_midi.PrettyMIDI()
+    instrument = pretty_midi.Instrument(program=25)
+
+    time = 0.0
+    for _ in range(n_chords):
+        pitches = rnd.sample(range(40, 76), rnd.randint(2, 4))
+        for _ in range(rnd.choice(repeats)):
+            instrument.notes += [pretty_midi.Note(velocity=90, pitch=pitch, start=time, end=time + 0.25) for pitch in pitches]
+            time += 0.25
+    midi.instruments.append(instrument)
+
+    return midi
+
+
+def run(n_songs=3, n_chords=200, decoders=("viterbi", "segment")):
+    """Converts rhythm parts with each decoder, with and without compress_runs.
+
+    Args:
+        n_songs (int, optional): Number of songs. Defaults to 3.
+        n_chords (int, optional): Number of chord changes per song. Defaults to 200.
+        decoders (tuple, optional): Decoders. Defaults to ("viterbi", "segment").
+
+    Returns:
+        list: Per decoder, events and decoded observations, decoding times and share of events with another fingering
+    """
+    tuning = Tuning()
+    midis = [rhythm_midi(n_chords, seed=seed) for seed in range(n_songs)]
+
+    results = []
+    for decoder in decoders:
+        result = {"decoder": decoder, "observations": 0, "decoded_observations": 0, "decoding_s": 0.0,
+                  "compressed_decoding_s": 0.0, "changed_events": 0}
+        for midi in midis:
+            tabs = []
+            for compress_runs in [False, True]:
+                profiler = Profiler(trace_memory=False)
+                tabs.append(Tab("benchmark", tuning, midi, decoder=decoder, compress_runs=compress_runs, profiler=profiler))
+                decoding = next(stage for stage in profiler.report()["stages"] if stage["stage"] == "decoding")
+                result["compressed_decoding_s" if compress_runs else "decoding_s"] += decoding["time"]
+
+            result["observations"] += decoding["counts"]["observations"]
+            result["decoded_observations"] += decoding["counts"]["decoded_observations"]
+            events = [[event for measure in tab.tab["measures"] for event in measure["events"] if "notes" in event] for tab in tabs]
+            result["changed_events"] += sum(event != compressed_event for event, compressed_event in zip(*events))
+        results.append(result)
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compression of repeated chords benchmark")
+    parser.add_argument("-n", "--songs", type=int, help="Number of rhythm parts", default=3)
+    parser.add_argument("-c", "--chords", type=int, help="Number of chord changes per song", default=200)
+    args = parser.parse_args()
+
+    for result in run(args.songs, args.chords):
+        print(f"{result['decoder']:>8}: {result['observations']} events decoded as {result['decoded_observations']}, "
+              f"{result['decoding_s']:.2f}s -> {result['compressed_decoding_s']:.2f}s, "
+              f"{result['changed_events'] / result['observations'] * 100:.1f}% events with another fingering")
@@ -0,0 +1,189 @@
+"""Benchmark suite on synthetic songs, with results in JSON to track scaling curves between releases.
+
+Each case changes one parameter of a base song: length, chord size, number of instruments, tempo and time signature
+changes, or tuning. Every case times the construction of the Fretboard, the enumeration of the fingerings of its
+chords, and the creation of a Tab with the time of its stages (transition matrix, decoding...).
+
+Run with ``python -m benchmarks.suite -o results.json``.
+"""
+import argparse
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+from importlib import metadata
+from pathlib import Path
+from time import perf_counter
+
+import numpy as np
+
+from benchmarks.synthetic import TUNINGS, get_tuning, synthetic_midi
+from tuttut.logic.fretboard import Fretboard
+from tuttut.logic.midi_utils import get_non_drum
+from tuttut.logic.profiling import Profiler
+from tuttut.logic.tab import Tab
+from tuttut.logic.theory import Note
+
+BASE_CASE = {"events": 200, "chord_size": 3, "instruments": 1, "tempo_changes": 0, "time_signature_changes": 0,
+             "tuning": "guitar", "decoder": "viterbi"}
+
+AXES = {
+    "events": [50, 100, 200, 400, 800],
+    "chord_size": [1, 2, 3, 4, 5, 6],
+    "instruments": [1, 2, 4],
+    "tempo_changes": [0, 4, 16],
+    "time_signature_changes": [0, 2, 8],
+    "tuning": list(TUNINGS),
+    "decoder": Tab.decoders,
+}
+
+QUICK_AXES = {"events": [50, 100], "chord_size": [1, 4], "tuning": ["guitar", "ukulele"], "decoder": Tab.decoders}
+
+
+def get_cases(axes=AXES):
+    """Returns the benchmark cases, the base case and the base case with each value of each axis.
+
+    Args:
+        axes (dict, optional): Values of each parameter. Defaults to AXES.
+
+    Returns:
+        list: Parameters of each case, without duplicates
+    """
+    cases = [dict(BASE_CASE)]
+    for axis, values in axes.items():
+        cases += [{**BASE_CASE, axis: value} for value in values if value != BASE_CASE[axis]]
+    return cases
+
+
+def make_midi(case, seed=0):
+    """Generates the song of a case.
+
+    Args:
+        case (dict): Parameters of the case
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        pretty_midi.PrettyMIDI: The song
+    """
+    tempos = [90 + 40 * (i % 3) for i in range(case["tempo_changes"] + 1)]
+    time_signatures = [[(4, 4), (3, 4), (6, 8), (5, 4)][i % 4] for i in range(case["time_signature_changes"] + 1)]
+    return synthetic_midi(case["events"], (max(1, case["chord_size"] - 1), case["chord_size"]), case["instruments"],
+                          tempos, time_signatures, seed=seed)
+
+
+def run_case(case, repeat=3, seed=0):
+    """Times a case, keeping the fastest of the repetitions.
+
+    Args:
+        case (dict): Parameters of the case
+        repeat (int, optional): Number of repetitions. Defaults to 3.
+        seed (int, optional): Random seed of the song. Defaults to 0.
+
+    Returns:
+        dict: Times in seconds and counts of the case
+    """
+    midi = make_midi(case, seed)
+    tuning = get_tuning(case["tuning"])
+
+    chords = {tuple(sorted({note.pitch for note in instrument.notes if note.start == start}))
+              for instrument in get_non_drum(midi.instruments) for start in {note.start for note in instrument.notes}}
+
+    results = {"fretboard_s": [], "fingerings_s": [], "tab_s": [], "stages_s": []}
+    for _ in range(repeat):
+        start = perf_counter()
+        fretboard = Fretboard(tuning, cache=None)
+        results["fretboard_s"].append(perf_counter() - start)
+
+        start = perf_counter()
+        n_fingerings = 0
+        for pitches in chords:
+            notes = fretboard.fix_oob_notes([Note(pitch) for pitch in pitches], preserve_highest_note=False)
+            n_fingerings += len(fretboard.get_possible_fingerings(fretboard.get_note_options(notes)))
+        results["fingerings_s"].append(perf_counter() - start)
+
+        profiler = Profiler(trace_memory=False)
+        start = perf_counter()
+        Tab("benchmark", tuning, midi, fingering_cache=None, decoder=case["decoder"], profiler=profiler)
+        results["tab_s"].append(perf_counter() - start)
+        results["stages_s"].append({stage["stage"]: stage["time"] for stage in profiler.report()["stages"]})
+
+    stages = results.pop("stages_s")
+    counts = {stage["stage"]: stage["counts"] for stage in profiler.report()["stages"]}
+    return {
+        **{key: min(times) for key, times in results.items()},
+        "stages_s": {stage: min(times[stage] for times in stages) for stage in stages[0]},
+        "notes": counts["build_timeline"]["notes"],
+        "chords": len(chords),
+        "chord_fingerings": n_fingerings,
+        "vocabulary": counts["fingerings"]["fingerings"],
+        "max_candidates_per_event": counts["fingerings"]["max_candidates_per_event"],
+    }
+
+
+def get_version():
+    """Returns the version of the installed tuttut-dt distribution, or git describe of the checkout when it isn't
+    installed. None if neither is available."""
+    try:
+        return metadata.version("tuttut-dt")
+    except metadata.PackageNotFoundError:
+        pass
+
+    try:
+        return subprocess.run(["git", "describe", "--tags", "--always", "--dirty"], cwd=Path(__file__).parent,
+                              capture_output=True, text=True, check=True).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def get_environment():
+    """Returns the versions of the benchmarked code and of its environment."""
+    return {
+        "tuttut": get_version(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def run(axes=AXES, repeat=3, seed=0, callback=None):
+    """Runs the benchmark cases.
+
+    Args:
+        axes (dict, optional): Values of each parameter. Defaults to AXES.
+        repeat (int, optional): Number of repetitions of each case. Defaults to 3.
+        seed (int, optional): Random seed of the songs. Defaults to 0.
+        callback (function, optional): Called with each case and its results when done. Defaults to None.
+
+    Returns:
+        dict: Environment and results of each case
+    """
+    cases = []
+    for case in get_cases(axes):
+        result = {"case": case, "results": run_case(case, repeat, seed)}
+        cases.append(result)
+        if callback is not None:
+            callback(result)
+
+    return {"environment": get_environment(), "repeat": repeat, "seed": seed, "cases": cases}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark suite on synthetic songs")
+    parser.add_argument("-o", "--output", type=str, help="JSON file of the results", default=None)
+    parser.add_argument("-r", "--repeat", type=int, help="Number of repetitions of each case", default=3)
+    parser.add_argument("-s", "--seed", type=int, help="Random seed of the songs", default=0)
+    parser.add_argument("-q", "--quick", help="Only runs a few small cases", action="store_true")
+    args = parser.parse_args()
+
+    def print_result(result):
+        case = ", ".join(f"{key}={value}" for key, value in result["case"].items() if value != BASE_CASE[key]) or "base"
+        times = result["results"]
+        print(f"{case:<28} fretboard {times['fretboard_s'] * 1000:7.2f}ms  fingerings {times['fingerings_s'] * 1000:8.2f}ms  "
+              f"tab {times['tab_s'] * 1000:9.2f}ms  vocabulary {times['vocabulary']:>5}")
+
+    report = run(QUICK_AXES if args.quick else AXES, args.repeat, args.seed, print_result)
+
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=4)
@@ -0,0 +1,87 @@
+"""Synthetic MIDI songs and tunings for the benchmarks."""
+import math
+import random
+
+import pretty_midi
+
+from tuttut.logic.theory import Diatonic, Tuning
+
+TUNINGS = {
+    "guitar": {"strings": Tuning.standard_tuning},
+    "ukulele": {"strings": Tuning.standard_ukulele_tuning, "nfrets": 15},
+    "7-string": {"strings": Tuning.standard_tuning + ["B1"]},
+    "diatonic-ionian": {"strings": ["D4", "A3", "D3"], "diatonic": (True, Diatonic.Modes.IONIAN)},
+    "diatonic-dorian": {"strings": ["D4", "A3", "D3"], "diatonic": (True, Diatonic.Modes.DORIAN)},
+    "diatonic-aeolian": {"strings": ["D4", "A3", "D3"], "diatonic": (True, Diatonic.Modes.AEOLIAN)},
+}
+
+
+def get_tuning(name):
+    """Returns one of the benchmarked tunings.
+
+    Args:
+        name (str): Name of the tuning in TUNINGS
+
+    Returns:
+        Tuning: The tuning
+    """
+    return Tuning(**TUNINGS[name])
+
+
+def synthetic_midi(n_events=200, chord_size=(1, 3), n_instruments=1, tempos=(120,), time_signatures=((4, 4),),
+                   pitch_range=(40, 84), resolution=220, seed=0):
+    """Generates a random song.
+
+    The song is split in equal sections, one per tempo and one per time signature. Time signatures change on measure
+    boundaries.
+
+    Args:
+        n_events (int, optional): Number of chords per instrument. Defaults to 200.
+        chord_size (tuple, optional): Minimum and maximum number of notes of a chord. Defaults to (1, 3).
+        n_instruments (int, optional): Number of instruments. Defaults to 1.
+        tempos (tuple, optional): Tempo of each section, in beats per minute. Defaults to (120,).
+        time_signatures (tuple, optional): Numerator and denominator of each section. Defaults to ((4, 4),).
+        pitch_range (tuple, optional): Lowest and highest pitch of the notes. Defaults to (40, 84).
+        resolution (int, optional): Ticks per beat. Defaults to 220.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        pretty_midi.PrettyMIDI: The song
+    """
+    rnd = random.Random(seed)
+    midi = pretty_midi.PrettyMIDI(resolution=resolution)
+
+    # Onsets and durations in beats, per instrument
+    parts = []
+    for _ in range(n_instruments):
+        beat, part = 0.0, []
+        for _ in range(n_events):
+            duration = rnd.choice([0.25, 0.5, 0.5, 1.0])
+            pitches = rnd.sample(range(pitch_range[0], pitch_range[1] + 1), rnd.randint(*chord_size))
+            part.append((beat, duration, pitches))
+            beat += duration
+        parts.append(part)
+    n_beats = max(part[-1][0] + part[-1][1] for part in parts)
+
+    # Tempo changes, as pretty_midi stores them when loading a file
+    section_ticks = [round(i * n_beats / len(tempos)) * resolution for i in range(len(tempos))]
+    midi._tick_scales = [(tick, 60.0 / (tempo * resolution)) for tick, tempo in zip(section_ticks, tempos)]
+    midi._update_tick_to_time(int(n_beats * resolution) + 1)
+
+    def beat_to_time(beat):
+        return midi.tick_to_time(int(round(beat * resolution)))
+
+    beat = 0.0
+    for numerator, denominator in time_signatures:
+        midi.time_signature_changes.append(pretty_midi.TimeSignature(numerator, denominator, beat_to_time(beat)))
+        measure_beats = numerator * 4 / denominator
+        beat += math.ceil(n_beats / len(time_signatures) / measure_beats) * measure_beats
+
+    for part in parts:
+        instrument = pretty_midi.Instrument(program=24)
+        for beat, duration, pitches in part:
+            start, end = beat_to_time(beat), beat_to_time(beat + duration)
+            instrument.notes += [pretty_midi.Note(velocity=90, pitch=pitch, start=start, end=end) for pitch in pitches]
+        midi.instruments.append(instrument)
+
+    return midi
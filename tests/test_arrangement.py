@@ -0,0 +1,51 @@
+import random
+import unittest
+
+from tuttut.logic.arrangement import Arrangement, fold_pitches
+from tuttut.logic.fretboard import Fretboard
+from tuttut.logic.theory import Diatonic, Note, Tuning
+
+
+class TestArrangement(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self) -> None:
+        pass
+
+    def test_fold_pitches(self):
+        tuning = Tuning()
+        fretboard = Fretboard(tuning, cache=None)
+        pitches = list(range(0, 128))
+
+        folded, in_bounds = fold_pitches(pitches, tuning.get_pitch_bounds())
+
+        self.assertTrue(all(in_bounds))
+        self.assertEqual(folded.tolist(), [note.pitch for pitch in pitches
+                                           for note in fretboard.fix_oob_notes([Note(pitch)])])
+
+        # Bounds less than an octave apart can't fit every pitch
+        folded, in_bounds = fold_pitches([74, 60, 77], (62, 65))
+        self.assertEqual(folded[in_bounds].tolist(), [62, 65])
+
+    def test_fit_notes_to_tuning(self):
+        rnd = random.Random(0)
+        tunings = [Tuning(), Tuning(Tuning.standard_ukulele_tuning, nfrets=15),
+                   Tuning(["D4", "A3", "D3"], diatonic=(True, Diatonic.Modes.IONIAN))]
+
+        for tuning in tunings:
+            fretboard = Fretboard(tuning, cache=None)
+            events = [[Note(rnd.randint(10, 120)) for _ in range(rnd.randint(0, 6))] for _ in range(300)]
+
+            arrangement = Arrangement(events, tuning)
+            chord_ids = arrangement.fit_notes_to_tuning()
+
+            expected = [tuple(sorted(note.pitch for note in fretboard.fix_oob_notes(notes))) for notes in events]
+            self.assertEqual([arrangement.chords[chord_id] for chord_id in chord_ids], expected)
+
+            # One id per distinct chord, numbered by first appearance
+            self.assertEqual(arrangement.chords, list(dict.fromkeys(expected)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+import pretty_midi
+
+from tuttut.logic.batch import BatchConverter, collect_sources, get_target
+from tuttut.logic.fingering_cache import FingeringCache
+
+
+def write_midi(path, pitches):
+    midi = pretty_midi.PrettyMIDI()
+    instrument = pretty_midi.Instrument(0)
+    for i, pitch in enumerate(pitches):
+        instrument.notes.append(pretty_midi.Note(velocity=100, pitch=pitch, start=i * 0.5, end=i * 0.5 + 0.5))
+    midi.instruments.append(instrument)
+    midi.write(str(path))
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = Path(self.directory.name)
+
+        (self.root / "sub").mkdir()
+        write_midi(self.root / "a.mid", [60, 62, 64])
+        write_midi(self.root / "sub" / "b.mid", [55, 57])
+        with open(self.root / "broken.mid", "w") as file:
+            file.write("not a midi file")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_collect_sources(self):
+        self.assertEqual(collect_sources([self.root / "sub"]), [self.root / "sub" / "b.mid"])
+        self.assertEqual(collect_sources([self.root / "*.mid"]), [self.root / "a.mid", self.root / "broken.mid"])
+
+        # Tabs and exports written next to the sources aren't matched
+        (self.root / "a.txt").write_text("")
+        (self.root / "a.npz").write_bytes(b"")
+        write_midi(self.root / "c.MIDI", [60])
+        self.assertEqual(collect_sources([self.root / "*"]), [self.root / "a.mid", self.root / "broken.mid", self.root / "c.MIDI"])
+
+        with open(self.root / "manifest.txt", "w") as manifest:
+            manifest.write("# Songs\nsub/b.mid\n\na.mid\n")
+        self.assertEqual(collect_sources([self.root / "manifest.txt", self.root / "a.mid"]),
+                         [self.root / "sub" / "b.mid", self.root / "a.mid"])
+
+    def test_get_target(self):
+        self.assertEqual(get_target(Path("songs/a.mid")), Path("songs/a.txt"))
+        self.assertEqual(get_target(Path("songs/a.mid"), Path("tabs")), Path("tabs/a.txt"))
+
+    def test_run(self):
+        files = [self.root / "a.mid", self.root / "broken.mid", self.root / "sub" / "b.mid"]
+        target_dir = self.root / "tabs"
+        target_dir.mkdir()
+
+        report = BatchConverter({"nfrets": 20}, workers=2).run(files, target_dir=target_dir)
+
+        self.assertEqual([result["status"] for result in report["results"]], ["ok", "error", "ok"])
+        self.assertEqual(sorted(os.listdir(target_dir)), ["a.txt", "b.txt"])
+        self.assertEqual((report["summary"]["ok"], report["summary"]["failed"]), (2, 1))
+        self.assertNotIn("profile", report["results"][0])
+
+    def test_run_cache(self):
+        cache_path = self.root / "cache.json"
+        FingeringCache().save(cache_path)
+        write_midi(self.root / "c.mid", [70, 72])
+        files = [self.root / "a.mid", self.root / "sub" / "b.mid", self.root / "c.mid"]
+
+        BatchConverter({"nfrets": 20}, workers=2, cache_path=cache_path).run(files, target_dir=self.root)
+
+        # The chords of the files converted by both workers are saved
+        cache = FingeringCache(path=cache_path)
+        self.assertEqual(sorted(pitches for (_, pitches), _ in cache.items()), [(pitch,) for pitch in [55, 57, 60, 62, 64, 70, 72]])
+
+    def test_run_profile(self):
+        report = BatchConverter({"nfrets": 20}, {"profile": True}, workers=1).run([self.root / "a.mid"], target_dir=self.root)
+
+        stages = [stage["stage"] for stage in report["results"][0]["profile"]["stages"]]
+        self.assertEqual(stages[0], "build_timeline")
+        self.assertEqual(stages[-1], "to_ascii")
+
+    def test_run_parts(self):
+        report = BatchConverter({"nfrets": 20}, {"parts": True, "profile": True}, workers=1).run([self.root / "a.mid"], target_dir=self.root)
+
+        self.assertEqual(report["results"][0]["status"], "ok")
+        self.assertEqual(len(report["results"][0]["profile"]), 1)
+        self.assertTrue((self.root / "a.txt").read_text().startswith("a - 1. Acoustic Grand Piano\n\n"))
+
+    @unittest.skipUnless(hasattr(os, "mkfifo"), "Needs named pipes")
+    def test_run_timeout(self):
+        # Reading a named pipe without writer blocks forever
+        os.mkfifo(self.root / "stuck.mid")
+        files = [self.root / "stuck.mid", self.root / "a.mid"]
+
+        report = BatchConverter({"nfrets": 20}, workers=1, timeout=0.5).run(files, target_dir=self.root)
+
+        # The worker is replaced after a timeout
+        self.assertEqual([result["status"] for result in report["results"]], ["timeout", "ok"])
+
+    @unittest.skipUnless(hasattr(os, "mkfifo"), "Needs named pipes")
+    def test_run_timeout_last_file(self):
+        os.mkfifo(self.root / "stuck.mid")
+        converter = BatchConverter({"nfrets": 20}, workers=1, timeout=0.5)
+        started = []
+        start_worker = converter._start_worker
+        converter._start_worker = lambda: started.append(None) or start_worker()
+
+        report = converter.run([self.root / "a.mid", self.root / "stuck.mid"], target_dir=self.root)
+
+        # No worker is started again when no file is left
+        self.assertEqual([result["status"] for result in report["results"]], ["ok", "timeout"])
+        self.assertEqual(len(started), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
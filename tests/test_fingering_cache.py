@@ -0,0 +1,79 @@
+import os
+import tempfile
+import unittest
+
+from tuttut.logic.fingering_cache import FingeringCache
+from tuttut.logic.fretboard import Fretboard
+from tuttut.logic.theory import Note, Tuning
+
+
+class TestFingeringCache(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_lru_eviction(self):
+        cache = FingeringCache(maxsize=2)
+
+        cache.put(("a",), ((1,),))
+        cache.put(("b",), ((2,),))
+        cache.get(("a",))
+        cache.put(("c",), ((3,),))
+
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get(("b",)))
+        self.assertEqual(cache.get(("a",)), ((1,),))
+
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 1))
+
+    def test_items_update(self):
+        cache = FingeringCache()
+        cache.put(("a",), ((1,),))
+        cache.put(("b",), ((2,),))
+        cache.get(("a",))
+        self.assertEqual(cache.items(), [(("b",), ((2,),)), (("a",), ((1,),))])
+
+        other_cache = FingeringCache(maxsize=2)
+        other_cache.put(("c",), ((3,),))
+        other_cache.update(cache.items())
+        self.assertEqual(other_cache.items(), cache.items())
+
+    def test_shared_between_fretboards(self):
+        cache = FingeringCache()
+        notes = [Note(64), Note(55), Note(48)]
+
+        fretboard = Fretboard(Tuning(), cache=cache)
+        fingerings = fretboard.get_fingerings(notes)
+
+        other_fretboard = Fretboard(Tuning(), cache=cache)
+        cached_fingerings = other_fretboard.get_fingerings(notes[::-1])
+
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual([[other_fretboard.get_pos(note) for note in fingering] for fingering in cached_fingerings],
+                         [[fretboard.get_pos(note) for note in fingering] for fingering in fingerings])
+        self.assertTrue(all(note in other_fretboard.node_index for fingering in cached_fingerings for note in fingering))
+
+        # Different tuning, different key
+        Fretboard(Tuning(["D4", "B3", "G3", "D3", "A2", "E2"]), cache=cache).get_fingerings(notes)
+        self.assertEqual(cache.stats()["misses"], 2)
+
+    def test_save_load(self):
+        cache = FingeringCache()
+        Fretboard(Tuning(), cache=cache).get_fingerings([Note(64), Note(55)])
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cache.json")
+            cache.save(path)
+
+            loaded_cache = FingeringCache(path=path)
+            self.assertEqual(len(loaded_cache), 1)
+
+            Fretboard(Tuning(), cache=loaded_cache).get_fingerings([Note(55), Note(64)])
+            self.assertEqual(loaded_cache.stats()["hits"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,13 @@
+import itertools
 import unittest
+from unittest import mock
+import numpy as np
 import pretty_midi
 
 from tuttut.logic import graph_utils
-from tuttut.logic.theory import Note, Tuning
+from tuttut.logic.theory import Note, Tuning, Diatonic
 from tuttut.logic.fretboard import Fretboard
+from tuttut.logic.fingering_cache import FingeringCache
 
 
 class TestGraphUtils(unittest.TestCase):
@@ -33,6 +37,26 @@ class TestGraphUtils(unittest.TestCase):
         p2 = (18, 4)  # for 3 (18/6), 4 and 5 triangle
         self.assertEqual(fretboard.distance_between(p1, p2), 5)
 
+    def test_distance_matrix(self):
+        fretboard = Fretboard(Tuning())
+
+        self.assertEqual(fretboard.distances.shape, (6 * 21, 6 * 21))
+
+        # 2nd string, 3rd fret to 4th string, 5th fret
+        i, j = 1 * 21 + 3, 3 * 21 + 5
+        self.assertAlmostEqual(fretboard.distances[i, j], fretboard.distance_between((1, 3), (3, 5)))
+        self.assertAlmostEqual(fretboard.distances[i, j], fretboard.distances[j, i])
+
+        # Open string first
+        self.assertEqual(fretboard.distances[0, 21 + 10], 0)
+
+    def test_complete_graph_view(self):
+        fretboard = Fretboard(Tuning(["E4", "B3"], nfrets=4))
+
+        self.assertIsNone(fretboard._G)
+        self.assertEqual(fretboard.G.number_of_nodes(), 10)
+        self.assertEqual(fretboard.G.nodes[fretboard.nodes[7]]["pos"], (1, 2))
+
     def test_get_fret_distance(self):
         fretboard = Fretboard(Tuning())
 
@@ -41,16 +65,114 @@ class TestGraphUtils(unittest.TestCase):
         self.assertAlmostEqual(fretboard.get_fret_distance(nfret=10), 285.20, places=1)
 
     def test_get_notes_in_graph(self):
-        pass
+        fretboard = Fretboard(Tuning())
+
+        options = fretboard.get_specific_note_options(Note(64))
+        self.assertEqual([fretboard.get_pos(node) for node in options], [(0, 0), (1, 5), (2, 9), (3, 14), (4, 19)])
+        self.assertEqual(fretboard.get_specific_note_options(Note(30)), [])
+
+        # C is neither in the D nor in the A ionian scale of the strings
+        fretboard = Fretboard(Tuning(["D4", "A3", "D3"], diatonic=(True, Diatonic.Modes.IONIAN)))
+        self.assertEqual(fretboard.get_specific_note_options(Note(60)), [])
+        self.assertEqual(len(fretboard.get_specific_note_options(Note(62))), 3)
+
+    def test_get_chords_fingerings(self):
+        chords = [[Note(pitch) for pitch in pitches] for pitches in [(64,), (45, 57), (59, 56, 52), (64,), (20,), (55, 59, 62)]]
+        expected = [Fretboard(Tuning(), cache=None).get_fingerings(notes) for notes in chords]
+
+        cache = FingeringCache()
+        fretboard = Fretboard(Tuning(), cache=cache)
+        fretboard.get_fingerings(chords[1])
+        # Few chords are enumerated in this process
+        with mock.patch("tuttut.logic.fretboard.ProcessPoolExecutor", side_effect=AssertionError("Pool started")):
+            self.assertEqual(Fretboard(Tuning(), cache=None).get_chords_fingerings(chords, workers=2), expected)
+
+        with mock.patch("tuttut.logic.fretboard.MIN_NOTE_OPTIONS_PER_WORKER", 1):
+            for workers in [1, 2]:
+                self.assertEqual(fretboard.get_chords_fingerings(chords, workers=workers), expected)
+            self.assertEqual(Fretboard(Tuning(), cache=None).get_chords_fingerings(chords, workers=2), expected)
+
+        # Enumerated once per distinct chord, then cached
+        self.assertEqual(cache.stats()["misses"], 5)
+
+    def test_is_chord_feasible(self):
+        fretboard = Fretboard(Tuning(), cache=None)
+        rnd = np.random.default_rng(0)
+
+        for _ in range(500):
+            pitches = rnd.choice(np.arange(40, 85), size=rnd.integers(2, 8), replace=False)
+            note_options = fretboard.get_note_options([Note(int(pitch)) for pitch in pitches])
+            fingerings = [fingering for fingering in itertools.product(*note_options)
+                          if fretboard.is_fingering_possible(fingering, note_options)] if len(pitches) <= 6 else []
+
+            # Never rejects a chord that has fingerings
+            if len(fingerings) > 0:
+                self.assertTrue(fretboard.is_chord_feasible(note_options))
+
+        # More notes than strings, notes too far apart
+        self.assertFalse(fretboard.is_chord_feasible(fretboard.get_note_options([Note(pitch) for pitch in range(60, 67)])))
+        self.assertFalse(fretboard.is_chord_feasible(fretboard.get_note_options([Note(41), Note(42), Note(84)])))
+        self.assertTrue(fretboard.is_chord_feasible(fretboard.get_note_options([Note(40), Note(47), Note(52)])))
+
+    def test_reduce_chord(self):
+        fretboard = Fretboard(Tuning(), cache=None)
+
+        # Playable chords are kept whole
+        notes, fingerings = fretboard.reduce_chord([Note(52), Note(40), Note(47)])
+        self.assertEqual([note.pitch for note in notes], [40, 47, 52])
+        self.assertEqual(fingerings, fretboard.get_fingerings(notes))
+
+        pitches = [40, 45, 50, 55, 59, 64, 69, 76]
+        notes, fingerings = fretboard.reduce_chord([Note(pitch) for pitch in pitches])
+        reduced = [note.pitch for note in notes]
+
+        # Largest playable subset, keeping the outer voices
+        self.assertGreater(len(fingerings), 0)
+        self.assertEqual(len(reduced), max(size for size in range(1, 7) for subset in itertools.combinations(pitches, size)
+                                           if fretboard.get_fingerings([Note(pitch) for pitch in subset])))
+        self.assertEqual((reduced[0], reduced[-1]), (40, 76))
+        self.assertTrue(set(reduced) <= set(pitches))
+
+        self.assertEqual(fretboard.reduce_chord([Note(20)]), ([], []))
+
+        # Only the subset returned is cached
+        cache = FingeringCache()
+        notes, fingerings = Fretboard(Tuning(), cache=cache).reduce_chord([Note(pitch) for pitch in pitches])
+        self.assertEqual(cache.items(), [((fretboard.signature, tuple(reduced)),
+                                          tuple(tuple(fretboard.node_index[note] for note in fingering) for fingering in fingerings))])
+        self.assertEqual(cache.stats()["misses"], 0)
 
     def test_build_path_graph(self):
         pass
 
     def test_is_edge_possible(self):
-        pass
+        fretboard = Fretboard(Tuning())
+        nodes = fretboard.nodes
+
+        self.assertTrue(fretboard.is_edge_possible(nodes[3], nodes[21 + 5]))
+        self.assertFalse(fretboard.is_edge_possible(nodes[3], nodes[5]))  # Same string
+        self.assertFalse(fretboard.is_edge_possible(nodes[2], nodes[21 + 12]))  # Too far
 
     def test_find_all_paths(self):
-        pass
+        fretboard = Fretboard(Tuning())
+
+        def positions(fingerings):
+            return sorted(sorted(fretboard.get_pos(note) for note in fingering) for fingering in fingerings)
+
+        for pitches in [(60,), (45, 67), (52, 56, 59), (40, 47, 52, 55, 59), (43, 47, 50, 55, 59, 67)]:
+            note_options = fretboard.get_note_options([Note(pitch) for pitch in pitches])
+
+            self.assertEqual(
+                positions(fretboard.get_possible_fingerings(note_options)),
+                positions(graph_utils.find_path_graph_fingerings(fretboard, note_options))
+            )
+
+        # Open A string can't be linked with the 8th fret of the B string
+        fingerings = positions(fretboard.get_possible_fingerings(fretboard.get_note_options([Note(45), Note(67)])))
+        self.assertIn([(0, 3), (4, 0)], fingerings)
+        self.assertNotIn([(1, 8), (4, 0)], fingerings)
+
+        self.assertEqual(fretboard.get_possible_fingerings([]), [])
 
     def test_is_path_already_checked(self):
         pass
@@ -83,16 +205,196 @@ class TestGraphUtils(unittest.TestCase):
         pass
 
     def test_viterbi(self):
-        pass
+        rng = np.random.default_rng(0)
+        Tm = rng.random((4, 4))
+        Tm /= Tm.sum(axis=1, keepdims=True)
+        Em = np.array([[1, 0], [1, 0], [0, 1], [0, 1]])
+        initial_distribution = np.array([0.3, 0.7, 0, 0])
+
+        def log_probability(states, observations):
+            res = np.log(initial_distribution[states[0]] * Em[states[0], observations[0]])
+            for previous, current, observation in zip(states[:-1], states[1:], observations[1:]):
+                res += np.log(Tm[previous, current] * Em[current, observation])
+            return res
+
+        observations = [0, 1, 1, 0, 1]
+        with np.errstate(divide="ignore"):
+            best_states = max(itertools.product(range(4), repeat=len(observations)),
+                              key=lambda states: log_probability(states, observations))
+        emissions = np.array([0, 0, 1, 1])
+        self.assertEqual(list(graph_utils.viterbi(observations, Tm, emissions, initial_distribution)), list(best_states))
+
+        # Unplayable observations are skipped
+        S = graph_utils.viterbi([0, -1, 1, 1, -1, 0, 1], Tm, emissions, initial_distribution)
+        self.assertEqual(list(S), [best_states[0], -1, best_states[1], best_states[2], -1, best_states[3], best_states[4]])
+        self.assertEqual(list(graph_utils.viterbi([-1], Tm, emissions, initial_distribution)), [-1])
+
+    def test_segment_viterbi(self):
+        tuning = Tuning()
+        fretboard = Fretboard(tuning)
+        weights = {"b": 1, "height": 1, "length": 1, "n_changed_strings": 1}
+
+        fingerings, chord_ranges = [], []
+        for pitches in [(64,), (45, 57), (52, 56, 59)]:
+            options = fretboard.get_fingerings([Note(pitch) for pitch in pitches])
+            chord_ranges.append((len(fingerings), len(fingerings) + len(options)))
+            fingerings += options
+
+        features = graph_utils.get_fingering_features(fretboard, fingerings)
+        V = [1, 0, -1, 2, 1]
+
+        def log_probability(states):
+            res = 0
+            for previous, current, observation in zip(states[:-1], states[1:], [1, 0, 2, 1][1:]):
+                start, end = chord_ranges[observation]
+                easiness = [1/graph_utils.compute_path_difficulty(fretboard, fingerings[i], fingerings[previous], weights, tuning)
+                            for i in range(start, end)]
+                res += np.log(easiness[current - start] / np.sum(easiness))
+            return res
+
+        best_states = max(itertools.product(*[range(*chord_ranges[observation]) for observation in [1, 0, 2, 1]]),
+                          key=log_probability)
+
+        S = graph_utils.segment_viterbi(V, chord_ranges, features, weights, tuning)
+        self.assertEqual(list(S), [best_states[0], best_states[1], -1, best_states[2], best_states[3]])
+
+        self.assertEqual(list(graph_utils.segment_viterbi([-1, -1], chord_ranges, features, weights, tuning)), [-1, -1])
+
+    def test_beam_viterbi(self):
+        tuning = Tuning()
+        fretboard = Fretboard(tuning)
+        weights = {"b": 1, "height": 1, "length": 1, "n_changed_strings": 1}
+
+        fingerings, chord_ranges = [], []
+        for pitches in [(64,), (45, 57), (52, 56, 59), (55, 59, 62)]:
+            options = fretboard.get_fingerings([Note(pitch) for pitch in pitches])
+            chord_ranges.append((len(fingerings), len(fingerings) + len(options)))
+            fingerings += options
+
+        features = graph_utils.get_fingering_features(fretboard, fingerings)
+        V = [1, 0, -1, 2, 1, 3, 3, 0, 2]
+
+        exact = graph_utils.segment_viterbi(V, chord_ranges, features, weights, tuning)
+        exact_log_probability = graph_utils.segment_path_log_probability(exact, chord_ranges, features, weights, tuning)
+
+        # A beam wider than the fingerings of every observation is exact
+        S = graph_utils.beam_viterbi(V, chord_ranges, features, weights, tuning, beam_width=len(fingerings))
+        self.assertEqual(list(S), list(exact))
+
+        for beam_width in [1, 2, 4]:
+            S = graph_utils.beam_viterbi(V, chord_ranges, features, weights, tuning, beam_width=beam_width)
+            for state, observation in zip(S, V):
+                if observation == -1:
+                    self.assertEqual(state, -1)
+                else:
+                    self.assertTrue(chord_ranges[observation][0] <= state < chord_ranges[observation][1])
+            self.assertLessEqual(graph_utils.segment_path_log_probability(S, chord_ranges, features, weights, tuning),
+                                 exact_log_probability + 1e-9)
+
+        self.assertEqual(list(graph_utils.beam_viterbi([-1, -1], chord_ranges, features, weights, tuning)), [-1, -1])
+        with self.assertRaises(ValueError):
+            graph_utils.beam_viterbi(V, chord_ranges, features, weights, tuning, beam_width=0)
+
+    def test_compress_runs(self):
+        V, counts = graph_utils.compress_runs([1, 1, 1, 0, 0, -1, -1, 2, 1])
+        self.assertEqual(list(V), [1, 0, -1, 2, 1])
+        self.assertEqual(list(counts), [3, 2, 2, 1, 1])
+        self.assertEqual(list(graph_utils.expand_runs(V, counts)), [1, 1, 1, 0, 0, -1, -1, 2, 1])
+
+        V, counts = graph_utils.compress_runs([])
+        self.assertEqual((len(V), len(counts)), (0, 0))
+
+    def test_decode_compressed_runs(self):
+        tuning = Tuning()
+        fretboard = Fretboard(tuning)
+        weights = {"b": 1, "height": 1, "length": 1, "n_changed_strings": 1}
+
+        fingerings, chord_ranges = [], []
+        for pitches in [(64,), (45, 57), (52, 56, 59)]:
+            options = fretboard.get_fingerings([Note(pitch) for pitch in pitches])
+            chord_ranges.append((len(fingerings), len(fingerings) + len(options)))
+            fingerings += options
+
+        features = graph_utils.get_fingering_features(fretboard, fingerings)
+        log_Tm = np.log(graph_utils.build_transition_matrix(fretboard, fingerings, weights, tuning))
+
+        V, counts = graph_utils.compress_runs([1, 1, 1, 0, 0, -1, 2, 2, 1])
+        played = [t for t, observation in enumerate(V) if observation >= 0]
+
+        # Most likely sequences that keep the fingering of each run, by brute force
+        sequences = []
+        for states in itertools.product(*[range(*chord_ranges[V[t]]) for t in played]):
+            S = np.full(len(V), -1)
+            S[played] = states
+            sequences.append(graph_utils.expand_runs(S, counts))
+
+        def dense_log_probability(S):
+            states = [state for state in S if state >= 0]
+            return sum(log_Tm[previous_state, state] for previous_state, state in zip(states[:-1], states[1:]))
+
+        expected = max(sequences, key=lambda S: graph_utils.segment_path_log_probability(S, chord_ranges, features, weights, tuning))
+        S = graph_utils.segment_viterbi(V, chord_ranges, features, weights, tuning, counts=counts)
+        self.assertEqual(list(graph_utils.expand_runs(S, counts)), list(expected))
+        S = graph_utils.beam_viterbi(V, chord_ranges, features, weights, tuning, beam_width=len(fingerings), counts=counts)
+        self.assertEqual(list(graph_utils.expand_runs(S, counts)), list(expected))
+
+        expected = max(sequences, key=dense_log_probability)
+        S = graph_utils.viterbi(V, np.exp(log_Tm), graph_utils.build_emissions(chord_ranges), counts=counts)
+        self.assertEqual(list(graph_utils.expand_runs(S, counts)), list(expected))
+
+    def test_segment_path_log_probability(self):
+        tuning = Tuning()
+        fretboard = Fretboard(tuning)
+        weights = {"b": 1, "height": 1, "length": 1, "n_changed_strings": 1}
+
+        fingerings, chord_ranges = [], []
+        for pitches in [(64,), (45, 57)]:
+            options = fretboard.get_fingerings([Note(pitch) for pitch in pitches])
+            chord_ranges.append((len(fingerings), len(fingerings) + len(options)))
+            fingerings += options
+
+        features = graph_utils.get_fingering_features(fretboard, fingerings)
+        start, end = chord_ranges[1]
+        S = [0, -1, start + 1]
+
+        easiness = [1/graph_utils.compute_path_difficulty(fretboard, fingerings[i], fingerings[0], weights, tuning)
+                    for i in range(start, end)]
+        expected = -np.log(chord_ranges[0][1]) + np.log(easiness[1] / np.sum(easiness))
+
+        self.assertAlmostEqual(graph_utils.segment_path_log_probability(S, chord_ranges, features, weights, tuning), expected)
 
     def test_build_transition_matrix(self):
-        pass
+        tuning = Tuning()
+        fretboard = Fretboard(tuning)
+        weights = {"b": 0.5, "height": 2, "length": 1, "n_changed_strings": 0.3}
+
+        fingerings = []
+        for pitches in [(64,), (40,), (45, 57), (43, 47, 50, 55, 59, 67), (52, 56, 59)]:
+            fingerings += fretboard.get_fingerings([Note(pitch) for pitch in pitches])
+
+        transition_matrix = graph_utils.build_transition_matrix(fretboard, fingerings, weights, tuning)
+
+        for iprevious, previous in enumerate(fingerings):
+            easiness = [1/graph_utils.compute_path_difficulty(fretboard, current, previous, weights, tuning)
+                        for current in fingerings]
+            np.testing.assert_allclose(transition_matrix[iprevious], graph_utils.difficulties_to_probabilities(easiness))
 
     def test_difficulties_to_probabilities(self):
         pass
 
-    def test_expand_emission_matrix(self):
-        pass
+    def test_prune_fingerings(self):
+        difficulties = [3.0, 1.0, 2.0, 1.0, 5.0]
+        self.assertEqual(graph_utils.prune_fingerings(difficulties).tolist(), [0, 1, 2, 3, 4])
+        # Kept in their original order, ties keep the first ones
+        self.assertEqual(graph_utils.prune_fingerings(difficulties, max_candidates=3).tolist(), [1, 2, 3])
+        self.assertEqual(graph_utils.prune_fingerings(difficulties, max_candidates=1).tolist(), [1])
+        self.assertEqual(graph_utils.prune_fingerings(difficulties, max_difficulty_ratio=2).tolist(), [1, 2, 3])
+        self.assertEqual(graph_utils.prune_fingerings(difficulties, max_candidates=2, max_difficulty_ratio=3).tolist(), [1, 3])
+        self.assertEqual(len(graph_utils.prune_fingerings([], max_candidates=2, max_difficulty_ratio=2)), 0)
+
+    def test_build_emissions(self):
+        self.assertEqual(list(graph_utils.build_emissions([(0, 2), (2, 3), (3, 6)])), [0, 0, 1, 2, 2, 2])
+        self.assertEqual(len(graph_utils.build_emissions([])), 0)
 
     def test_display_notes_on_graph(self):
         pass
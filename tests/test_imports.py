@@ -0,0 +1,33 @@
+import subprocess
+import sys
+import unittest
+
+
+class TestImports(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def get_loaded_modules(self, module):
+        """Returns the modules loaded by a fresh interpreter after importing a module."""
+        code = f"import sys, {module}; print(' '.join(sys.modules))"
+        return subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.split()
+
+    def test_tab_import_is_lazy(self):
+        modules = self.get_loaded_modules("tuttut.logic.tab")
+
+        self.assertIn("tuttut.logic.tab", modules)
+        self.assertNotIn("matplotlib", modules)
+        self.assertNotIn("networkx", modules)
+
+    def test_cli_import_is_lazy(self):
+        modules = self.get_loaded_modules("tuttut.midi_tabs_cli")
+
+        self.assertNotIn("matplotlib", modules)
+        self.assertNotIn("networkx", modules)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import itertools
+import json
+import random
+import unittest
+import pretty_midi
+
+from tuttut.logic.lattice import Lattice, get_weights_grid, sample_weights, search_weights
+from tuttut.logic.tab import Tab
+from tuttut.logic.theory import Tuning
+from tuttut.logic.validation import get_tab_difficulty
+
+DEFAULT_WEIGHTS = {"b": 1, "height": 1, "length": 1, "n_changed_strings": 1}
+
+
+def random_midi(nevents, seed):
+    """Returns a MIDI of random chords, some of them repeated, with a few unplayable notes."""
+    rnd = random.Random(seed)
+    midi = pretty_midi.PrettyMIDI()
+    instrument = pretty_midi.Instrument(0)
+    pitches = []
+    for i in range(nevents):
+        if rnd.random() < 0.6:
+            pitches = rnd.sample(range(40, 80), rnd.randint(1, 4)) if rnd.random() < 0.95 else [20]
+        instrument.notes += [pretty_midi.Note(velocity=100, pitch=pitch, start=i / 2, end=i / 2 + 0.5) for pitch in pitches]
+    midi.instruments.append(instrument)
+    return midi
+
+
+class TestLattice(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self) -> None:
+        pass
+
+    def test_rescore(self):
+        midi = random_midi(40, 0)
+        tuning = Tuning()
+        candidates = [DEFAULT_WEIGHTS] + sample_weights(3, {"b": (0.2, 3), "height": (0, 5), "length": (0, 5),
+                                                             "n_changed_strings": (0, 5)})
+
+        for decoder, compress_runs in itertools.product(Tab.decoders, [False, True]):
+            options = {"decoder": decoder, "beam_width": 3, "compress_runs": compress_runs, "fingering_cache": None}
+            tab = Tab("test", tuning, midi, **options)
+            reference = json.dumps(tab.tab)
+            lattice = Lattice.from_tab(tab)
+
+            for weights in candidates:
+                expected = Tab("test", tuning, midi, weights=weights, **options).tab
+                rescored = tab.rescore(weights, lattice)
+                self.assertEqual(json.dumps(rescored), json.dumps(expected))
+                self.assertAlmostEqual(lattice.get_difficulty(weights, DEFAULT_WEIGHTS),
+                                       get_tab_difficulty(rescored, DEFAULT_WEIGHTS))
+
+            # The tab itself is left untouched
+            self.assertEqual(json.dumps(tab.tab), reference)
+
+    def test_get_weights_grid(self):
+        grid = get_weights_grid({"b": [0.5, 1], "height": [1, 2, 3]})
+        self.assertEqual(len(grid), 6)
+        self.assertEqual(grid[0], {"b": 0.5, "height": 1})
+        self.assertEqual(grid[-1], {"b": 1, "height": 3})
+
+    def test_search_weights(self):
+        tuning = Tuning()
+        lattices = [Lattice.from_tab(Tab("test", tuning, random_midi(20, seed), decoder="segment", fingering_cache=None))
+                    for seed in range(2)]
+        candidates = get_weights_grid({"b": [0.5, 1], "height": [1, 4], "length": [1], "n_changed_strings": [0, 1]})
+
+        results = search_weights(lattices, candidates, DEFAULT_WEIGHTS, workers=1)
+        self.assertEqual([result["weights"] for result in results], candidates)
+        for result in results:
+            self.assertEqual(result["difficulties"], [lattice.get_difficulty(result["weights"], DEFAULT_WEIGHTS)
+                                                      for lattice in lattices])
+            self.assertAlmostEqual(result["difficulty"], sum(result["difficulties"]))
+
+        self.assertEqual(search_weights(lattices, candidates, DEFAULT_WEIGHTS, workers=2), results)
+
+
+if __name__ == '__main__':
+    unittest.main()
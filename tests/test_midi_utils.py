@@ -1,4 +1,5 @@
 import unittest
+import numpy as np
 import pretty_midi
 
 from tuttut.logic import midi_utils
@@ -115,7 +116,33 @@ class TestMidiUtils(unittest.TestCase):
         self.assertEqual(midi_utils.round_to_multiple(to_round, base), -5)
 
     def test_quantize(self):
-        pass
+        midi = pretty_midi.PrettyMIDI(resolution=220)
+        instrument = pretty_midi.Instrument(0)
+        instrument.notes = [pretty_midi.Note(velocity=100, pitch=60, start=start, end=3)
+                            for start in [0, 0.01, 0.4, 1.2345, 2.999]]
+        midi.instruments.append(instrument)
+
+        expected = [midi.tick_to_time(midi_utils.round_to_multiple(midi.time_to_tick(note.start), base=220/32))
+                    for note in instrument.notes]
+
+        midi_utils.quantize(midi)
+        self.assertEqual([note.start for note in midi.instruments[0].notes], expected)
+
+    def test_tempo_map(self):
+        midi = pretty_midi.PrettyMIDI(resolution=220)
+        # Tempo changes at ticks 500 and 1200
+        midi._tick_scales = [(0, 0.002), (500, 0.0013), (1200, 0.0031)]
+        midi._update_tick_to_time(1500)
+
+        tempo_map = midi_utils.TempoMap(midi)
+
+        times = np.concatenate([np.linspace(-1, 8, 2000), [midi.tick_to_time(tick) for tick in range(0, 1500, 7)]])
+        self.assertEqual(tempo_map.times_to_ticks(times).tolist(), [midi.time_to_tick(time) for time in times])
+
+        ticks = list(range(0, 3000, 13))
+        self.assertEqual(tempo_map.ticks_to_times(ticks).tolist(), [midi.tick_to_time(tick) for tick in ticks])
+
+        self.assertEqual(tempo_map.times_to_ticks([]).tolist(), [])
 
 
 if __name__ == '__main__':
@@ -0,0 +1,79 @@
+import io
+import tempfile
+import unittest
+from pathlib import Path
+import pretty_midi
+
+from tuttut.logic.fingering_cache import FingeringCache
+from tuttut.logic.parts import get_part_name, tab_parts, write_parts
+from tuttut.logic.tab import Tab
+from tuttut.logic.theory import Tuning
+
+
+def make_midi():
+    midi = pretty_midi.PrettyMIDI()
+    chords = [[(60,), (64, 67), (45, 57)], [(52, 56, 59), (40,), (62, 66, 69), (55,)], [(36,), (38,)], []]
+    for ichords, instrument_chords in enumerate(chords):
+        instrument = pretty_midi.Instrument(program=24, is_drum=ichords == 2, name="Lead" if ichords == 1 else "")
+        for i, pitches in enumerate(instrument_chords):
+            instrument.notes += [pretty_midi.Note(velocity=100, pitch=pitch, start=i, end=i + 1) for pitch in pitches]
+        midi.instruments.append(instrument)
+    return midi
+
+
+class TestParts(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self) -> None:
+        pass
+
+    def test_get_part_name(self):
+        midi = make_midi()
+        self.assertEqual(get_part_name(midi, 0), "1. Acoustic Guitar (nylon)")
+        self.assertEqual(get_part_name(midi, 1), "2. Lead")
+
+    def test_tab_parts(self):
+        midi = make_midi()
+        tuning = Tuning()
+
+        tabs = tab_parts("song", midi, tuning, workers=1, fingering_cache=None)
+
+        # Drums and empty instruments are skipped
+        self.assertEqual([tab.name for tab in tabs], ["song - 1. Acoustic Guitar (nylon)", "song - 2. Lead"])
+        for tab, index in zip(tabs, [0, 1]):
+            self.assertEqual(tab.tab, Tab(tab.name, tuning, midi, instruments=[index], fingering_cache=None).tab)
+
+        # Every part keeps the measures of the whole song
+        self.assertEqual(len(tabs[0].tab["measures"]), len(tabs[1].tab["measures"]))
+
+        parallel_tabs = tab_parts("song", midi, tuning, workers=2, profile=True)
+        self.assertEqual([tab.tab for tab in parallel_tabs], [tab.tab for tab in tabs])
+        self.assertEqual(parallel_tabs[1].profiler.report()["stages"][0]["counts"]["notes"], 8)
+
+    def test_tab_parts_cache(self):
+        midi = make_midi()
+
+        for workers in [1, 2]:
+            cache = FingeringCache()
+            tab_parts("song", midi, Tuning(), workers=workers, fingering_cache=cache)
+            # Every chord of the two parts, including the ones found by the other processes
+            self.assertEqual(len(cache), 7)
+
+    def test_write_parts(self):
+        tabs = tab_parts("song", make_midi(), Tuning(), workers=1)
+
+        with tempfile.TemporaryDirectory() as directory:
+            write_parts(tabs, Path(directory) / "song.txt", split_by=2)
+            text = (Path(directory) / "song.txt").read_text()
+
+        expected = ""
+        for tab in tabs:
+            part = io.StringIO()
+            tab.write_ascii(part, split_by=2)
+            expected += f"{tab.name}\n\n{part.getvalue()}"
+        self.assertEqual(text, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
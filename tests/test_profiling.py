@@ -0,0 +1,74 @@
+import unittest
+import tracemalloc
+import pretty_midi
+
+from tuttut.logic.profiling import Profiler
+from tuttut.logic.tab import Tab
+from tuttut.logic.theory import Tuning
+
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self) -> None:
+        pass
+
+    def test_stage(self):
+        reports = []
+        profiler = Profiler(callback=reports.append)
+
+        with profiler.stage("outer") as counts:
+            counts["items"] = 3
+            with profiler.stage("inner"):
+                data = bytearray(1_000_000)
+                del data
+
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertEqual([report["stage"] for report in reports], ["inner", "outer"])
+        self.assertEqual(reports, profiler.report()["stages"])
+
+        inner, outer = reports
+        self.assertEqual(inner["depth"], 1)
+        self.assertEqual(outer["depth"], 0)
+        self.assertEqual(outer["counts"], {"items": 3})
+        self.assertGreaterEqual(inner["peak_memory"], 1_000_000)
+        self.assertGreaterEqual(outer["peak_memory"], inner["peak_memory"])
+        self.assertGreaterEqual(outer["time"], inner["time"])
+        self.assertEqual(profiler.report()["time"], outer["time"])
+
+    def test_stage_without_memory(self):
+        profiler = Profiler(trace_memory=False)
+        with self.assertRaises(KeyError):
+            with profiler.stage("failing"):
+                raise KeyError()
+
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertEqual(profiler.report()["stages"][0]["stage"], "failing")
+        self.assertIsNone(profiler.report()["stages"][0]["peak_memory"])
+
+    def test_tab_stages(self):
+        midi = pretty_midi.PrettyMIDI()
+        instrument = pretty_midi.Instrument(0)
+        for i, pitches in enumerate([(60,), (64, 67), (45, 57), (52, 56, 59)]):
+            instrument.notes += [pretty_midi.Note(velocity=100, pitch=pitch, start=i/2, end=i/2 + 0.5) for pitch in pitches]
+        midi.instruments.append(instrument)
+
+        for decoder, stages in [("viterbi", ["transition_matrix", "emissions", "decoding"]), ("beam", ["features", "decoding"])]:
+            profiler = Profiler()
+            tab = Tab("test", Tuning(), midi, decoder=decoder, profiler=profiler, fingering_cache=None)
+
+            report = profiler.report()
+            self.assertEqual([stage["stage"] for stage in report["stages"]],
+                             ["build_timeline", "populate", "fingerings"] + stages + ["populate_tab_notes"])
+            counts = {stage["stage"]: stage["counts"] for stage in report["stages"]}
+            self.assertEqual(counts["build_timeline"]["notes"], 8)
+            self.assertEqual(counts["fingerings"]["note_events"], 4)
+            self.assertEqual(counts["fingerings"]["chords"], 4)
+            self.assertEqual(counts["populate_tab_notes"]["notes"], 8)
+
+        self.assertIsNone(Tab("test", Tuning(), midi).profiler)
+
+
+if __name__ == '__main__':
+    unittest.main()
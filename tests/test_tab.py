@@ -0,0 +1,208 @@
+import functools
+import json
+import random
+import tempfile
+import unittest
+from pathlib import Path
+import pretty_midi
+
+from tuttut.logic.midi_utils import fill_measure_str
+from tuttut.logic.profiling import Profiler
+from tuttut.logic.tab import Tab
+from tuttut.logic.theory import Diatonic, Tuning
+
+
+def reference_to_string(tab):
+    """Previous implementation of Tab.to_string, padding all the strings after every event."""
+    res = ["" for _ in tab.tuning.strings]
+    for measure in tab.tab["measures"]:
+        events = [event for event in measure["events"] if "notes" in event]
+        if len(events) == 0:
+            for istring in range(tab.nstrings):
+                res[istring] += "-" * 16 + "|"
+            continue
+
+        for ievent, event in enumerate(events):
+            if ievent == 0:
+                for istring in range(tab.nstrings):
+                    res[istring] += "-" * round(event["measure_timing"] * 16)
+
+            next_event_timing = events[ievent + 1]["measure_timing"] if ievent < (len(events) - 1) else 1.0
+            dashes_to_add = round((next_event_timing - event["measure_timing"]) * 16)
+
+            for note in event["notes"]:
+                res[note["string"]] += str(note["fret"])
+            if dashes_to_add:
+                dashes_to_add -= 1
+
+            res = fill_measure_str(res)
+
+            if dashes_to_add:
+                for istring in range(tab.nstrings):
+                    res[istring] += "-" * dashes_to_add
+
+        for istring in range(tab.nstrings):
+            res[istring] += "|"
+
+    return res
+
+
+def reference_to_ascii(tab, split_by):
+    """Previous implementation of Tab.to_ascii, splitting the strings of to_string on bar lines."""
+    tabs = []
+    for i, string in enumerate(reference_to_string(tab)):
+        bars = string.split("|")
+        note_tab = []
+        header = f"{tab.tuning.strings[i].degree}||" if len(tab.tuning.strings[i].degree) > 1 else f"{tab.tuning.strings[i].degree} ||"
+        for z in range(0, len(bars), split_by):
+            merged_measures = functools.reduce(lambda x, y: f"{x}|{y}", bars[z:z+split_by], "")
+            note_tab += [f"{header}{merged_measures}|"]
+        tabs += [note_tab]
+
+    return "".join("".join(tab[i] + "\n" for tab in tabs) + "\n" for i in range(len(tabs[0])))
+
+
+def random_tab(tuning, nmeasures, seed):
+    """Returns a Tab with random measures, without converting a MIDI."""
+    rnd = random.Random(seed)
+    tab = Tab.__new__(Tab)
+    tab.name, tab.tuning, tab.nstrings, tab.profiler, tab.output_file = "random", tuning, len(tuning.strings), None, None
+
+    measures = []
+    for _ in range(nmeasures):
+        timings = sorted(rnd.sample(range(32), rnd.randint(0, 10)))
+        events = []
+        for timing in timings:
+            event = {"measure_timing": timing / 32}
+            if rnd.random() < 0.9:  # Events without notes only change the time signature
+                strings = rnd.sample(range(tab.nstrings), rnd.randint(0, tab.nstrings))  # Unplayable events have no notes
+                event["notes"] = [{"string": string, "fret": rnd.choice([0, 3, 7, 12, 19])} for string in strings]
+            events.append(event)
+        measures.append({"events": events})
+    tab.tab = {"measures": measures}
+
+    return tab
+
+
+class TestTab(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self) -> None:
+        pass
+
+    def test_to_string(self):
+        for seed, tuning in enumerate([Tuning(), Tuning(Tuning.standard_ukulele_tuning)]):
+            tab = random_tab(tuning, 20, seed)
+            self.assertEqual(tab.to_string(), reference_to_string(tab))
+
+    def test_to_ascii(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for seed, (nmeasures, split_by) in enumerate([(0, 6), (5, 6), (6, 6), (7, 6), (20, 4), (13, 1)]):
+                for tuning in [Tuning(), Tuning(["C#4", "A3", "D3"])]:
+                    tab = random_tab(tuning, nmeasures, seed)
+                    tab.output_file = Path(directory) / "tab.txt"
+                    tab.to_ascii(split_by=split_by)
+
+                    self.assertEqual(tab.output_file.read_text(), reference_to_ascii(tab, split_by))
+
+    def test_save_load(self):
+        midi = pretty_midi.PrettyMIDI()
+        midi.time_signature_changes = [pretty_midi.TimeSignature(4, 4, 0), pretty_midi.TimeSignature(3, 4, 4)]
+        instrument = pretty_midi.Instrument(0)
+        for i, pitches in enumerate([(60,), (64, 67), (45, 57), (52, 56, 59), (20,), (62, 66, 69)]):
+            instrument.notes += [pretty_midi.Note(velocity=100, pitch=pitch, start=i, end=i + 1) for pitch in pitches]
+        midi.instruments.append(instrument)
+
+        tunings = [Tuning(), Tuning(["D4", "A3", "D3"], diatonic=(True, Diatonic.Modes.DORIAN))]
+        with tempfile.TemporaryDirectory() as directory:
+            directory = Path(directory)
+            for tuning in tunings:
+                tab = Tab("test", tuning, midi, output_file=directory / "test.txt", fingering_cache=None)
+                tab.to_ascii()
+
+                for suffix in [".npz", ".jsonl", ".json"]:
+                    tab.save(directory / f"test{suffix}")
+                    loaded = Tab.load(directory / f"test{suffix}", output_file=directory / "loaded.txt")
+
+                    self.assertEqual(loaded.tab, tab.tab)
+                    self.assertEqual(json.dumps(loaded.tab), json.dumps(tab.tab))
+                    loaded.to_ascii()
+                    self.assertEqual((directory / "loaded.txt").read_text(), (directory / "test.txt").read_text())
+
+                loaded = Tab.load(directory / "test.npz")
+                self.assertEqual((loaded.name, loaded.tuning.diatonic, loaded.tuning.mode, loaded.tuning.nfrets),
+                                 (tab.name, tuning.diatonic, tuning.mode, tuning.nfrets))
+
+            with self.assertRaises(ValueError):
+                tab.save(directory / "test.txt")
+
+    def test_to_columns(self):
+        tab = random_tab(Tuning(), 5, 0)
+        for imeasure, measure in enumerate(tab.tab["measures"]):
+            for ievent, event in enumerate(measure["events"]):
+                event.update({"time": imeasure + ievent / 100, "time_ticks": imeasure * 100 + ievent})
+                for note in event.get("notes", []):
+                    note.update({"degree": "C", "octave": "4"})
+
+        columns = tab.to_columns()
+        events = [event for measure in tab.tab["measures"] for event in measure["events"]]
+        self.assertEqual(columns["measure_event_offsets"][-1], len(events))
+        self.assertEqual(len(columns["note_tick"]), sum(len(event.get("notes", [])) for event in events))
+        self.assertTrue(all(columns["note_pitch"] == 60))
+        self.assertEqual(Tab.measures_from_columns(columns), tab.tab["measures"])
+
+
+    def test_reduce_chords(self):
+        midi = pretty_midi.PrettyMIDI()
+        instrument = pretty_midi.Instrument(0)
+        for i, pitches in enumerate([(40, 45, 50, 55, 59, 64, 69, 76), (60,), (40, 45, 50, 55, 59, 64, 69, 76)]):
+            instrument.notes += [pretty_midi.Note(velocity=100, pitch=pitch, start=i, end=i + 1) for pitch in pitches]
+        midi.instruments.append(instrument)
+
+        profiler = Profiler()
+        tab = Tab("test", Tuning(), midi, fingering_cache=None, profiler=profiler)
+        events = [event for measure in tab.tab["measures"] for event in measure["events"] if "notes" in event]
+        self.assertTrue(0 < len(events[0]["notes"]) <= 6)
+        self.assertEqual(events[0]["notes"], events[2]["notes"])
+
+        counts = next(stage["counts"] for stage in profiler.report()["stages"] if stage["stage"] == "fingerings")
+        self.assertEqual((counts["reduced_chords"], counts["reduced_events"], counts["unplayable_events"]), (1, 2, 0))
+
+        tab = Tab("test", Tuning(), midi, fingering_cache=None, reduce_chords=False)
+        events = [event for measure in tab.tab["measures"] for event in measure["events"] if "notes" in event]
+        self.assertEqual([len(event["notes"]) for event in events], [0, 1, 0])
+
+    def test_prune_fingerings(self):
+        rnd = random.Random(0)
+        midi = pretty_midi.PrettyMIDI()
+        instrument = pretty_midi.Instrument(0)
+        for i in range(30):
+            instrument.notes += [pretty_midi.Note(velocity=100, pitch=pitch, start=i / 2, end=i / 2 + 0.5)
+                                 for pitch in rnd.sample(range(40, 76), rnd.randint(1, 3))]
+        midi.instruments.append(instrument)
+        reference = Tab("test", Tuning(), midi, fingering_cache=None)
+
+        for decoder in Tab.decoders:
+            profiler = Profiler()
+            tab = Tab("test", Tuning(), midi, fingering_cache=None, decoder=decoder, max_candidates=4, profiler=profiler)
+            counts = next(stage["counts"] for stage in profiler.report()["stages"] if stage["stage"] == "fingerings")
+            self.assertLessEqual(counts["max_candidates_per_event"], 4)
+            self.assertGreater(counts["pruned_fingerings"], 0)
+            self.assertEqual(counts["fingerings"] + counts["pruned_fingerings"], len(reference.fingerings_vocabulary))
+
+            # Every event is still played, with the notes of the song
+            self.assertEqual(*[[sorted((note["octave"], note["degree"]) for note in event["notes"])
+                                for measure in t.tab["measures"] for event in measure["events"] if "notes" in event]
+                               for t in [tab, reference]])
+
+        # A ratio above the hardest fingering of every chord keeps them all
+        tab = Tab("test", Tuning(), midi, fingering_cache=None, max_difficulty_ratio=1000)
+        self.assertEqual(json.dumps(tab.tab), json.dumps(reference.tab))
+
+        with self.assertRaises(ValueError):
+            Tab("test", Tuning(), midi, fingering_cache=None, max_candidates=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
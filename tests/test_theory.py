@@ -0,0 +1,49 @@
+import pickle
+import unittest
+
+from types import SimpleNamespace
+
+from tuttut.logic.theory import Note, Position, Measure
+
+
+class TestTheory(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_note(self):
+        note = Note(61)
+
+        self.assertEqual((note.name, note.degree, note.octave), ("C#4", "C#", "4"))
+        self.assertIs(Note(61), note)
+        self.assertIs(pickle.loads(pickle.dumps(note)), note)
+
+    def test_note_hash(self):
+        self.assertEqual(hash(Note(60)), hash(Note(60)))
+        self.assertEqual(len({Note(60), Note(60), Note(72)}), 2)
+        self.assertEqual({Note(60): "C4"}[Note(60)], "C4")
+
+    def test_position(self):
+        position = Position(2, 5)
+
+        self.assertEqual((position.string, position.fret), (2, 5))
+        self.assertEqual(position, Position(2, 5))
+        self.assertNotEqual(position, Position(5, 2))
+
+    def test_measure_events(self):
+        tab = SimpleNamespace(event_ticks=[0, 100, 440, 879, 880, 1000], events=["a", "b", "c", "d", "e", "f"])
+
+        measure = Measure(tab, 0, None, 0, 880.0)
+        self.assertEqual(list(measure.events), [(0, "a"), (100, "b"), (440, "c"), (879, "d")])
+
+        measure = Measure(tab, 1, None, 880.0, 1760.0)
+        self.assertEqual(list(measure.events), [(880, "e"), (1000, "f")])
+
+        measure = Measure(tab, 2, None, 1760.0, 2640.0)
+        self.assertEqual(list(measure.events), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,27 +1,76 @@
-from logic.midi_utils import *
-from logic.theory import Note
+import numpy as np
+
+
+def fold_pitches(pitches, pitch_bounds):
+    """Transposes pitches by whole octaves into bounds, like Fretboard.fix_oob_notes for all the notes of a song at once.
+
+    Args:
+        pitches (np.ndarray): MIDI pitches
+        pitch_bounds (tuple): Lowest and highest playable pitch (see Tuning.get_pitch_bounds)
+
+    Returns:
+        tuple: Folded pitches, and whether each one is within the bounds (only false when they are less than an octave apart)
+    """
+    min_pitch, max_pitch = pitch_bounds
+    pitches = np.asarray(pitches, dtype=int)
+
+    # Number of octaves above the highest pitch and below the lowest one, rounded up
+    octaves_above = np.maximum(-((max_pitch - pitches) // 12), 0)
+    octaves_below = np.maximum(-((pitches - min_pitch) // 12), 0)
+    folded = pitches + 12 * (octaves_below - octaves_above)
+
+    return folded, (folded >= min_pitch) & (folded <= max_pitch)
 
 
 class Arrangement():
+    """Notes of the events of a song, fitted to the range of a tuning and grouped in chords."""
+
     def __init__(self, notes, tuning):
+        """Constructor for the Arrangement object.
+
+        Args:
+            notes (list): Notes of each event (any objects with a pitch)
+            tuning (Tuning): Tuning of the instrument
+        """
         self.notes = notes
         self.tuning = tuning
+        self.chords = []
+        self.chord_ids = np.zeros(0, dtype=int)
 
     def fit_notes_to_tuning(self):
-        pitch_bounds = [note.pitch for note in self.tuning.get_bounds()]
+        """Folds the notes of every event into the range of the tuning, removes the duplicates of each event and gives
+        the same id to the events that play the same chord.
+
+        Returns:
+            np.ndarray: Chord of each event, an index in self.chords. Chords are numbered by first appearance and are
+                tuples of sorted pitches.
+        """
+        lengths = np.array([len(event_notes) for event_notes in self.notes], dtype=int)
+        events = np.repeat(np.arange(len(self.notes)), lengths)
+        pitches = np.fromiter((note.pitch for event_notes in self.notes for note in event_notes), dtype=int, count=len(events))
 
-        notes_pitches = [note.pitch for note in self.notes]
+        pitches, in_bounds = fold_pitches(pitches, self.tuning.get_pitch_bounds())
+        events, pitches = events[in_bounds], pitches[in_bounds]
 
-        for i in range(len(notes_pitches)):
-            notes_pitches[i] = self.fit_note_to_tuning(notes_pitches[i], pitch_bounds)
+        # Sorted pitches of each event without duplicates
+        order = np.lexsort((pitches, events))
+        events, pitches = events[order], pitches[order]
+        unique = np.ones(len(pitches), dtype=bool)
+        unique[1:] = (events[1:] != events[:-1]) | (pitches[1:] != pitches[:-1])
+        events, pitches = events[unique], pitches[unique]
 
-        self.notes = [Note(pitch) for pitch in notes_pitches]
+        # One row per event, padded with -1, so that identical chords have identical rows
+        counts = np.bincount(events, minlength=len(self.notes))
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        rows = np.full((len(self.notes), max(counts.max(initial=0), 1)), -1)
+        rows[events, np.arange(len(events)) - offsets[events]] = pitches
 
-    def fit_note_to_tuning(self, pitch, pitch_bounds):
-        while pitch < pitch_bounds[0]:
-            pitch += 12
+        _, first_events, inverse = np.unique(rows, axis=0, return_index=True, return_inverse=True)
 
-        while pitch > pitch_bounds[1]:
-            pitch -= 12
+        # Numbered by first appearance in the song
+        ranks = np.empty(len(first_events), dtype=int)
+        ranks[np.argsort(first_events)] = np.arange(len(first_events))
+        self.chord_ids = ranks[inverse.reshape(-1)]
+        self.chords = [tuple(pitches[offsets[ievent]:offsets[ievent + 1]].tolist()) for ievent in np.sort(first_events)]
 
-        return pitch
+        return self.chord_ids
@@ -0,0 +1,265 @@
+import glob
+import multiprocessing
+import traceback
+from collections import deque
+from multiprocessing.connection import wait
+from pathlib import Path
+from time import perf_counter
+
+import pretty_midi
+from tuttut.logic.fingering_cache import FingeringCache, default_fingering_cache
+from tuttut.logic.fretboard import Fretboard
+from tuttut.logic.parts import tab_parts, write_parts
+from tuttut.logic.profiling import Profiler
+from tuttut.logic.tab import Tab
+from tuttut.logic.theory import Tuning
+
+MIDI_SUFFIXES = {".mid", ".midi"}
+
+
+def collect_sources(sources):
+    """Returns the MIDI files to convert from a list of files, directories, glob patterns or manifest files.
+
+    Directories are searched recursively, directories and glob patterns only match MIDI files. Any other existing
+    file is read as a manifest listing one path per line (blank lines and lines starting with # are ignored),
+    relative to the manifest.
+
+    Args:
+        sources (list): Files, directories, glob patterns or manifest files
+
+    Returns:
+        list: Paths of the MIDI files, without duplicates
+    """
+    files = []
+    for source in sources:
+        source = Path(source)
+        if source.is_dir():
+            files += sorted(path for path in source.rglob("*") if path.suffix.lower() in MIDI_SUFFIXES)
+        elif source.is_file() and source.suffix.lower() in MIDI_SUFFIXES:
+            files.append(source)
+        elif source.is_file():
+            with open(source) as manifest:
+                lines = [line.strip() for line in manifest]
+            files += [source.parent / line for line in lines if line and not line.startswith("#")]
+        else:
+            files += sorted(path for path in map(Path, glob.glob(str(source), recursive=True))
+                            if path.suffix.lower() in MIDI_SUFFIXES)
+
+    return list(dict.fromkeys(files))
+
+
+def get_target(source, target_dir=None):
+    """Returns the text file a MIDI file is converted to.
+
+    Args:
+        source (Path): MIDI file
+        target_dir (Path, optional): Directory of the tabs. Defaults to the directory of the MIDI file.
+
+    Returns:
+        Path: Target file
+    """
+    target = source.with_suffix(".txt")
+    return target_dir / target.name if target_dir is not None else target
+
+
+def convert_file(source, target, tuning, fretboard, split_by=6, profile=False, export=None, parts=False, **tab_options):
+    """Converts a MIDI file to a text tab.
+
+    Args:
+        source (Path): MIDI file
+        target (Path): Text file of the tab
+        tuning (Tuning): Tuning of the instrument
+        fretboard (Fretboard): Fretboard of the tuning, reused between files
+        split_by (int, optional): Number of measures per line. Defaults to 6.
+        profile (bool, optional): Measures the stages of the conversion, reported by the profiler of the tab. Defaults to False.
+        export (str, optional): Also saves the tab next to the text file in this format (npz, jsonl or json). Defaults to None.
+        parts (bool, optional): Tabs each instrument separately into a multi-part text file, see tab_parts. Defaults to False.
+
+    Returns:
+        Tab: The converted tab, or the list of the tabs of the parts
+    """
+    midi = pretty_midi.PrettyMIDI(Path(source).absolute().as_posix())
+    if parts:
+        # Batch workers can't start processes, the parts are tabbed one after the other
+        tabs = tab_parts(Path(source).stem, midi, tuning, workers=1, fretboard=fretboard, profile=profile, **tab_options)
+        write_parts(tabs, target, split_by=split_by)
+        if export is not None:
+            for ipart, tab in enumerate(tabs):
+                tab.save(Path(target).with_suffix(f".part{ipart + 1}.{export}"))
+        return tabs
+
+    profiler = Profiler() if profile else None
+    tab = Tab(Path(source).stem, tuning, midi, output_file=target, fretboard=fretboard, profiler=profiler, **tab_options)
+    tab.to_ascii(split_by=split_by)
+    if export is not None:
+        tab.save(Path(target).with_suffix(f".{export}"))
+    return tab
+
+
+def _worker(connection, tuning_options, options, cache_path):
+    """Worker process, converts the files it receives with a single Tuning and Fretboard.
+
+    When it is stopped, it sends back the entries it added to the fingering cache, saved by the parent process.
+    """
+    # Same cache whether the process was forked or spawned
+    default_fingering_cache.clear()
+    if cache_path is not None and Path(cache_path).exists():
+        default_fingering_cache.load(cache_path)
+    loaded_keys = {key for key, _ in default_fingering_cache.items()}
+
+    tuning = Tuning(**tuning_options)
+    fretboard = Fretboard(tuning)
+
+    while True:
+        task = connection.recv()
+        if task is None:
+            break
+
+        index, source, target = task
+        start = perf_counter()
+        try:
+            tab = convert_file(source, target, tuning, fretboard, **options)
+            result = {"status": "ok", "time": perf_counter() - start}
+            if options.get("profile", False):
+                result["profile"] = [part.profiler.report() for part in tab] if isinstance(tab, list) else tab.profiler.report()
+            connection.send((index, result))
+        except Exception:
+            connection.send((index, {"status": "error", "time": perf_counter() - start,
+                                     "error": traceback.format_exc(limit=-1).strip()}))
+
+    connection.send([(key, value) for key, value in default_fingering_cache.items() if key not in loaded_keys])
+
+
+class BatchConverter:
+    """Converts MIDI files on a pool of worker processes.
+
+    Each worker builds its Tuning and Fretboard once. A file that raises, exceeds the timeout or kills its worker
+    is reported as failed and the worker is replaced, without stopping the other conversions.
+    """
+
+    def __init__(self, tuning_options, options=None, workers=None, timeout=None, cache_path=None):
+        """Constructor for the BatchConverter object.
+
+        Args:
+            tuning_options (dict): Arguments of the Tuning
+            options (dict, optional): Arguments of convert_file (split_by and Tab options). Defaults to None.
+            workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+            timeout (float, optional): Maximum conversion time of a file in seconds. Defaults to None.
+            cache_path (Path, optional): Fingering cache file loaded by the workers, saved with their new entries at the
+                end of each run. Defaults to None.
+        """
+        self.tuning_options = tuning_options
+        self.options = options if options is not None else {}
+        self.workers = workers if workers is not None else multiprocessing.cpu_count()
+        self.timeout = timeout
+        self.cache_path = cache_path
+        self._context = multiprocessing.get_context()
+
+    def _start_worker(self):
+        # Each worker has its own pipe, so that terminating it can't corrupt the communication with the others
+        connection, worker_connection = self._context.Pipe()
+        process = self._context.Process(target=_worker, args=(worker_connection, self.tuning_options,
+                                                              self.options, self.cache_path), daemon=True)
+        process.start()
+        worker_connection.close()
+        return {"process": process, "connection": connection, "task": None, "start": None}
+
+    def run(self, files, target_dir=None, callback=None):
+        """Converts the files.
+
+        The timeout of a file is counted from the moment it is sent to a worker.
+
+        Args:
+            files (list): MIDI files to convert
+            target_dir (Path, optional): Directory of the tabs. Defaults to the directory of each MIDI file.
+            callback (function, optional): Called with the result of each file when it is done. Defaults to None.
+
+        Returns:
+            dict: Result of each file (source, target, status, time, error and profile when profiling) in the order of
+                the files, and a summary
+        """
+        start = perf_counter()
+        tasks = [(index, Path(source), get_target(Path(source), target_dir)) for index, source in enumerate(files)]
+        pending = deque(tasks)
+        results = [None] * len(tasks)
+        workers = []
+
+        def finish(index, result):
+            _, source, target = tasks[index]
+            results[index] = {"source": str(source), "target": str(target), "error": None, **result}
+            if callback is not None:
+                callback(results[index])
+
+        def assign(worker):
+            worker["task"], worker["start"] = None, None
+            if pending:
+                task = pending.popleft()
+                worker["task"], worker["start"] = task[0], perf_counter()
+                worker["connection"].send(task)
+
+        for _ in range(min(self.workers, len(pending))):
+            workers.append(self._start_worker())
+            assign(workers[-1])
+
+        while any(worker["task"] is not None for worker in workers):
+            busy_workers = [worker for worker in workers if worker["task"] is not None]
+            ready = wait([worker["connection"] for worker in busy_workers], timeout=0.1)
+
+            for worker in busy_workers:
+                if worker["connection"] in ready:
+                    try:
+                        index, result = worker["connection"].recv()
+                        finish(index, result)
+                        assign(worker)
+                        continue
+                    except EOFError:
+                        pass  # The worker died, handled below
+
+                timed_out = self.timeout is not None and perf_counter() - worker["start"] > self.timeout
+                crashed = worker["connection"] in ready or not worker["process"].is_alive()
+
+                if timed_out or crashed:
+                    worker["process"].terminate()
+                    worker["process"].join()
+                    worker["connection"].close()
+                    duration = perf_counter() - worker["start"]
+                    if timed_out:
+                        finish(worker["task"], {"status": "timeout", "time": duration, "error": f"Exceeded {self.timeout}s"})
+                    else:
+                        finish(worker["task"], {"status": "crashed", "time": duration,
+                                                "error": f"Worker exited with code {worker['process'].exitcode}"})
+
+                    workers.remove(worker)
+                    # Only replaced if there are files left, a new worker would load the cache for nothing
+                    if pending:
+                        workers.append(self._start_worker())
+                        assign(workers[-1])
+
+        for worker in workers:
+            worker["connection"].send(None)
+        new_entries = []
+        for worker in workers:
+            try:
+                new_entries += worker["connection"].recv()
+            except EOFError:
+                pass  # The worker died, its entries are lost
+            worker["process"].join()
+            worker["connection"].close()
+
+        if self.cache_path is not None:
+            # Only this process writes the file, the entries of the workers can't overwrite each other
+            cache = FingeringCache(maxsize=default_fingering_cache.maxsize, path=self.cache_path)
+            cache.update(new_entries)
+            cache.save(self.cache_path)
+
+        elapsed = perf_counter() - start
+        n_ok = sum(result["status"] == "ok" for result in results)
+        summary = {
+            "files": len(results),
+            "ok": n_ok,
+            "failed": len(results) - n_ok,
+            "time": elapsed,
+            "files_per_second": len(results) / elapsed if elapsed > 0 else 0.0
+        }
+
+        return {"results": results, "summary": summary}
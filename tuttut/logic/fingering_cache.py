@@ -0,0 +1,139 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+
+class FingeringCache:
+    """Bounded LRU cache of the fingerings found for a set of pitches on a fretboard.
+
+    Keys are (fretboard signature, sorted pitches) tuples, values are fingerings stored as tuples of position indices,
+    so that they can be shared between Fretboard objects built for the same tuning.
+    """
+
+    def __init__(self, maxsize=65536, path=None):
+        """Constructor for the FingeringCache object.
+
+        Args:
+            maxsize (int, optional): Maximum number of entries kept. Defaults to 65536.
+            path (Path, optional): File the cache is persisted to, loaded if it already exists. Defaults to None.
+        """
+        self.maxsize = maxsize
+        self.path = Path(path) if path is not None else None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        if self.path is not None and self.path.exists():
+            self.load(self.path)
+
+    def get(self, key):
+        """Returns the cached fingerings for a key, None if they aren't cached.
+
+        Args:
+            key (tuple): Fretboard signature and sorted pitches
+
+        Returns:
+            tuple: Fingerings as tuples of position indices
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Caches the fingerings for a key, evicting the least recently used entries if full.
+
+        Args:
+            key (tuple): Fretboard signature and sorted pitches
+            value (tuple): Fingerings as tuples of position indices
+        """
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def items(self):
+        """Returns the entries of the cache, from the least to the most recently used.
+
+        Returns:
+            list: (key, fingerings) pairs
+        """
+        with self._lock:
+            return list(self._entries.items())
+
+    def update(self, entries):
+        """Caches several entries in order, see put.
+
+        Args:
+            entries (list): (key, fingerings) pairs, ex: the items of another cache
+        """
+        for key, value in entries:
+            self.put(key, value)
+
+    def clear(self):
+        """Removes all the entries and resets the statistics."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Returns the hit/miss statistics of the cache.
+
+        Returns:
+            dict: Hits, misses, hit rate, current size and maximum size
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups > 0 else 0.0,
+            "size": len(self._entries),
+            "maxsize": self.maxsize
+        }
+
+    def save(self, path=None):
+        """Writes the cache entries to a json file.
+
+        Args:
+            path (Path, optional): Target file. Defaults to the path of the cache.
+        """
+        path = Path(path) if path is not None else self.path
+        with self._lock:
+            entries = [[list(signature), list(pitches), [list(fingering) for fingering in fingerings]]
+                       for (signature, pitches), fingerings in self._entries.items()]
+
+        # Written next to the target then renamed, so that concurrent readers never see a partial file
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as file:
+            json.dump({"version": 1, "entries": entries}, file)
+        os.replace(tmp_path, path)
+
+    def load(self, path=None):
+        """Adds the entries of a json file written by save to the cache.
+
+        Args:
+            path (Path, optional): Source file. Defaults to the path of the cache.
+        """
+        path = Path(path) if path is not None else self.path
+        with open(path) as file:
+            data = json.load(file)
+
+        self.update(((tuple(signature), tuple(pitches)), tuple(tuple(fingering) for fingering in fingerings))
+                    for signature, pitches, fingerings in data["entries"])
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Process-wide cache shared by default between all the Fretboard objects
+default_fingering_cache = FingeringCache()
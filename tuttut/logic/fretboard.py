@@ -1,21 +1,109 @@
 import traceback
 import numpy as np
 from pretty_midi.containers import TimeSignature
-from tuttut.logic.theory import Measure, Note
+from tuttut.logic.theory import Measure, Note, Position
 from tuttut.logic.midi_utils import *
 from tuttut.logic.graph_utils import *
-import networkx as nx
+from tuttut.logic.fingering_cache import default_fingering_cache
+import itertools
 import json
 import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+# Fretboard of the current process, set once per worker
+_context = {}
+
+# Minimum number of note options per worker process. Below this, starting a process and building its fretboard costs
+# more than enumerating in-process. Measured on a single-CPU machine, not tuned for multi-core use
+MIN_NOTE_OPTIONS_PER_WORKER = 20000
+
+
+def _init_fingerings_worker(tuning):
+    _context["fretboard"] = Fretboard(tuning, cache=None)
+
+
+def _enumerate_fingerings(pitches, fretboard=None):
+    """Enumerates the fingerings of a chord with the fretboard of the process, as indices of positions."""
+    fretboard = fretboard if fretboard is not None else _context["fretboard"]
+    fingerings = fretboard.get_possible_fingerings(fretboard.get_note_options([Note(pitch) for pitch in pitches]))
+    return tuple(tuple(fretboard.node_index[note] for note in fingering) for fingering in fingerings)
+
 
 class Fretboard:
-    def __init__(self, tuning):
+    def __init__(self, tuning, cache=default_fingering_cache):
+        """Constructor for the Fretboard object.
+
+        Args:
+            tuning (Tuning): Tuning of the instrument
+            cache (FingeringCache, optional): Cache of the fingerings, shared by default between all fretboards. None disables it.
+        """
         self.tuning = tuning
         self.nstrings = tuning.nstrings
         self.scale_length = 650
-        self.G = self._build_complete_graph()
+        self.cache = cache
+        self._build_arrays()
+        self._G = None
+
+    def _build_arrays(self):
+        """Builds the array representation of the fretboard.
+
+        Each fret for each string is a position, indexed in string-major order.
+        For every position the string index, the fret index and the pitch are stored in NumPy arrays,
+        alongside the pairwise distance matrix between all the positions and an index of the positions by pitch.
+        """
+        note_map = self.tuning.get_all_possible_notes()
+
+        self.nodes = [Position(istring, inote) for istring, string in enumerate(note_map) for inote in range(len(string))]
+        self.node_index = {node: i for i, node in enumerate(self.nodes)}
+
+        self.string_index = np.array([node.string for node in self.nodes], dtype=np.int16)
+        self.fret_index = np.array([node.fret for node in self.nodes], dtype=np.int16)
+        self.pitches = np.array([note.pitch for string in note_map for note in string], dtype=np.int16)
+
+        # Parameters of the tuning that determine the positions, used as part of the fingering cache keys
+        self.signature = (self.tuning.nfrets, int(self.tuning.diatonic), int(self.tuning.mode),
+                          *[int(string.pitch) for string in self.tuning.strings])
+
+        self.distances = self._build_distance_matrix()
+        self.reachable = self.distances < 6
+
+        # Number of strings of each bitmask of strings
+        self.string_counts = np.array([bin(mask).count("1") for mask in range(1 << self.nstrings)], dtype=int)
+
+        # Pitch -> nodes playing that pitch, only pitches reachable with the tuning (and its diatonic scale) are present
+        self.pitch_index = defaultdict(list)
+        for node, pitch in zip(self.nodes, self.pitches.tolist()):
+            self.pitch_index[pitch].append(node)
+
+    def _build_distance_matrix(self):
+        """Builds the matrix of the distances between every pair of positions.
+
+        The distance is 0 when the first position of the pair (in string-major order) is an open string.
+
+        Returns:
+            np.ndarray: Distance matrix
+        """
+        x = self.string_index / self.nstrings
+        y = self.fret_index.astype(float)
+        distances = np.hypot(np.subtract.outer(x, x), np.subtract.outer(y, y))
+
+        first_position = np.minimum.outer(np.arange(len(self.nodes)), np.arange(len(self.nodes)))
+        distances[self.fret_index[first_position] == 0] = 0
+
+        return distances
+
+    @property
+    def G(self):
+        """Returns the complete graph view of the fretboard, only built when needed (e.g. for display).
+
+        Returns:
+            nx.Graph: Graph representing the fretboard
+        """
+        if self._G is None:
+            self._G = self._build_complete_graph()
+        return self._G
 
     def _build_complete_graph(self):
         """Builds the complete graph representing the fretboard.
@@ -26,23 +114,40 @@ class Fretboard:
         Returns:
             nx.Graph: Graph representing the fretboard
         """
-        note_map = self.tuning.get_all_possible_notes()
+        import networkx as nx
 
         complete_graph = nx.Graph()
-        for istring, string in enumerate(note_map):
-            for inote, note in enumerate(string):
-                complete_graph.add_node(note, pos=(istring, inote))
+        for node in self.nodes:
+            complete_graph.add_node(node, pos=self.get_pos(node))
 
-        complete_graph_nodes = list(complete_graph.nodes(data=True))
-
-        for node in complete_graph_nodes:
-            for node_to_link in complete_graph_nodes:
-                dst = 0 if node_to_link[1]['pos'][1] == 0 else self.distance_between(
-                    node[1]['pos'], node_to_link[1]['pos'])
-                complete_graph.add_edge(node[0], node_to_link[0], distance=dst)
+        for i, node in enumerate(self.nodes):
+            for j, node_to_link in enumerate(self.nodes[i:], start=i):
+                complete_graph.add_edge(node, node_to_link, distance=float(self.distances[i, j]))
 
         return complete_graph
 
+    def get_pos(self, node):
+        """Returns the position of a node on the fretboard.
+
+        Args:
+            node (Position): Node of the fretboard
+
+        Returns:
+            tuple: String index and fret index of the node
+        """
+        return node.string, node.fret
+
+    def get_note(self, node):
+        """Returns the note played at a node of the fretboard.
+
+        Args:
+            node (Position): Node of the fretboard
+
+        Returns:
+            Note: Note played
+        """
+        return Note(self.pitches[self.node_index[node]])
+
     def get_note_options(self, notes):
         """Returns note arrays from a list of theory.Notes"""
         note_options = [self.get_specific_note_options(note) for note in notes]
@@ -51,45 +156,284 @@ class Fretboard:
         return note_options
 
     def get_specific_note_options(self, note):
-        """Get all nodes that correspond to a specific note in a graph.
+        """Get all nodes that correspond to a specific note on the fretboard.
 
         Args:
             note (Note): Note to find on the fretboard
 
         Returns:
-            list: List of nodes thar play the specified note
+            list: List of positions that play the specified note
+        """
+        return list(self.pitch_index.get(note.pitch, []))
+
+    def get_fingerings(self, notes):
+        """Returns all possible fingerings for a set of notes, using the fingering cache if any.
+
+        Args:
+            notes (list): List of theory.Notes
+
+        Returns:
+            list: List of fingerings, each with one position per note (sorted by pitch) that can be played
+        """
+        notes = [note for note in sort_notes_by_pitch(notes) if note.pitch in self.pitch_index]
+        note_options = self.get_note_options(notes)
+
+        if self.cache is None:
+            return self.get_possible_fingerings(note_options)
+
+        key = (self.signature, tuple(note.pitch for note in notes))
+        cached_fingerings = self.cache.get(key)
+
+        if cached_fingerings is None:
+            fingerings = self.get_possible_fingerings(note_options)
+            self.cache.put(key, tuple(tuple(self.node_index[note] for note in fingering) for fingering in fingerings))
+            return fingerings
+
+        return [tuple(self.nodes[i] for i in fingering) for fingering in cached_fingerings]
+
+    def get_chords_fingerings(self, chords, workers=1):
+        """Returns all possible fingerings for several sets of notes, enumerating them on a pool of processes.
+
+        Chords found in the fingering cache aren't enumerated again. The chords to enumerate are split between at most
+        one process per MIN_NOTE_OPTIONS_PER_WORKER note options, so songs with few chords are enumerated in this
+        process. The results are the same as get_fingerings for each chord, in the order of the chords.
+
+        Args:
+            chords (list): Lists of theory.Notes
+            workers (int, optional): Maximum number of processes, 1 enumerates in this process. None uses the number
+                of CPUs. Defaults to 1.
+
+        Returns:
+            list: Fingerings of each chord, see get_fingerings
         """
-        nodes = list(self.G.nodes)
+        workers = workers or os.cpu_count()
+        if workers == 1:
+            return [self.get_fingerings(notes) for notes in chords]
+
+        results = [None] * len(chords)
+        missing = {}  # Pitches of the chords to enumerate -> indices of the chords with these pitches
+        for ichord, notes in enumerate(chords):
+            pitches = tuple(note.pitch for note in sort_notes_by_pitch(notes) if note.pitch in self.pitch_index)
+            cached_fingerings = self.cache.get((self.signature, pitches)) if self.cache is not None else None
+
+            if cached_fingerings is None:
+                missing.setdefault(pitches, []).append(ichord)
+            else:
+                results[ichord] = [tuple(self.nodes[i] for i in fingering) for fingering in cached_fingerings]
 
-        return [node for node in nodes if node == note]
+        n_note_options = sum(len(self.pitch_index[pitch]) for pitches in missing for pitch in pitches)
+        workers = min(workers, len(missing), n_note_options // MIN_NOTE_OPTIONS_PER_WORKER)
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_fingerings_worker,
+                                     initargs=(self.tuning,)) as executor:
+                enumerated = list(executor.map(_enumerate_fingerings, missing, chunksize=max(1, len(missing) // (4 * workers))))
+        else:
+            enumerated = [_enumerate_fingerings(pitches, self) for pitches in missing]
+
+        for (pitches, ichords), fingerings in zip(missing.items(), enumerated):
+            if self.cache is not None:
+                self.cache.put((self.signature, pitches), fingerings)
+            for ichord in ichords:
+                results[ichord] = [tuple(self.nodes[i] for i in fingering) for fingering in fingerings]
+
+        return results
 
     def get_possible_fingerings(self, note_options):
-        """Returns all possible fingerings in a path graph
+        """Returns all possible fingerings for a set of notes.
+
+        Notes are assigned to distinct strings by backtracking, in the order of the notes and of their positions,
+        pruning the assignments that exceed the fret span. A fingering is kept if its notes can be linked
+        in some order through possible edges (see is_edge_possible).
 
         Args:
-            G (networkx.Graph): Fretboard graph
-            note_arrays (list): List of possible positions for the notes
+            note_options (list): List of possible positions for the notes
 
         Returns:
-            list: List of paths
+            list: List of fingerings, each with one position per note, in canonical order
         """
-        fingerings = []
+        if len(note_options) == 0:
+            return []
 
         if len(note_options) == 1:
             return [(note,) for note in note_options[0]]
 
-        for note_options_permutation in list(itertools.permutations(note_options)):
-            path_graph = build_path_graph(self.G, note_options_permutation)
-            # display_path_graph(path_graph)
-            for possible_source_node in note_options_permutation[0]:
-                permutation_fingerings = nx.all_simple_paths(
-                    path_graph, possible_source_node, target=note_options_permutation[-1])
-                for fingering in permutation_fingerings:
-                    if not is_path_already_checked(fingerings, fingering) and self.is_fingering_possible(fingering, note_options_permutation):
-                        fingerings.append(tuple(fingering))
+        if not self.is_chord_feasible(note_options):
+            return []
+
+        options = []
+        for note_array in note_options:
+            indices = [self.node_index[note] for note in note_array]
+            options.append(list(zip(indices, self.string_index[indices].tolist(), self.fret_index[indices].tolist())))
+
+        fingerings = []
+        chosen = []
+
+        def backtrack(depth, used_strings, min_fret, max_fret):
+            if depth == len(options):
+                if self.is_linkable(chosen):
+                    fingerings.append(tuple(self.nodes[i] for i in chosen))
+                return
+
+            for i, string, fret in options[depth]:
+                if used_strings & (1 << string):
+                    continue
+
+                new_min_fret, new_max_fret = min_fret, max_fret
+                if fret != 0:
+                    new_min_fret, new_max_fret = min(min_fret, fret), max(max_fret, fret)
+                    # No more than 5 fret span
+                    if new_max_fret - new_min_fret >= 5:
+                        continue
+
+                chosen.append(i)
+                backtrack(depth + 1, used_strings | (1 << string), new_min_fret, new_max_fret)
+                chosen.pop()
+
+        backtrack(0, 0, math.inf, -math.inf)
 
         return fingerings
 
+    def get_string_masks(self, note_options):
+        """Returns the strings each note can be played on, for each window of frets a fingering can fit in.
+
+        A fingering presses frets within a span of 5, so its pressed frets are in a window [lo, lo + 4] starting on one
+        of them. Open strings fit in every window.
+
+        Args:
+            note_options (list): List of possible positions for the notes
+
+        Returns:
+            np.ndarray: Bitmask of strings for each note (rows) and each window (columns)
+        """
+        indices = np.array([self.node_index[node] for note_array in note_options for node in note_array], dtype=int)
+        owners = np.repeat(np.arange(len(note_options)), [len(note_array) for note_array in note_options])
+        frets = self.fret_index[indices].astype(int)
+
+        windows = np.unique(np.append(frets, 0))
+        in_window = (frets[:, None] == 0) | ((frets[:, None] >= windows) & (frets[:, None] <= windows + 4))
+
+        # A pitch is at most once on each string, so the sum of the string bits is their union
+        masks = np.zeros((len(note_options), len(windows)), dtype=np.int64)
+        np.add.at(masks, owners, in_window * (1 << self.string_index[indices].astype(np.int64))[:, None])
+
+        return masks
+
+    def get_feasible_subsets(self, masks):
+        """Checks for every subset of notes if they can be played on distinct strings within a window of frets.
+
+        By Hall's theorem, notes can be assigned distinct strings if and only if every group of them can be played on
+        at least as many strings as there are notes in the group.
+
+        Args:
+            masks (np.ndarray): Bitmask of the strings of each note for each window (see get_string_masks)
+
+        Returns:
+            np.ndarray: For each subset of notes (bit i set for note i), if it fits on distinct strings in some window
+        """
+        n = len(masks)
+
+        # Union of the strings and number of notes of every subset, for each window
+        unions = np.zeros((1 << n, masks.shape[1]), dtype=np.int64)
+        sizes = np.zeros(1 << n, dtype=int)
+        for i in range(n):
+            unions[1 << i:1 << (i + 1)] = unions[:1 << i] | masks[i]
+            sizes[1 << i:1 << (i + 1)] = sizes[:1 << i] + 1
+
+        # A subset can't be played if it contains a group of notes with too few strings
+        blocked = self.string_counts[unions] < sizes[:, None]
+        for i in range(n):
+            blocked = blocked.reshape(-1, 2, 1 << i, masks.shape[1])
+            blocked[:, 1] |= blocked[:, 0]
+
+        return ~blocked.reshape(1 << n, -1).all(axis=1)
+
+    def is_chord_feasible(self, note_options):
+        """Cheap necessary condition for a chord to have fingerings: its notes fit on distinct strings within a 5 fret span.
+
+        Args:
+            note_options (list): List of possible positions for the notes
+
+        Returns:
+            bool: False if no fingering can exist, True if some may exist
+        """
+        if len(note_options) > self.nstrings:
+            return False
+
+        return bool(self.get_feasible_subsets(self.get_string_masks(note_options))[-1])
+
+    def reduce_chord(self, notes):
+        """Finds the largest playable subset of a chord, dropping inner voices first.
+
+        Subsets are tried from the largest one, keeping the highest note, then the lowest one, then the inner notes
+        from the highest to the lowest.
+
+        Args:
+            notes (list): List of theory.Notes
+
+        Returns:
+            tuple: Notes of the subset, sorted by pitch, and their fingerings (see get_fingerings). No notes if none
+                can be played.
+        """
+        notes = [note for note in sort_notes_by_pitch(notes) if note.pitch in self.pitch_index]
+        if len(notes) == 0:
+            return [], []
+
+        # Highest note, lowest note, then inner notes from the highest to the lowest. Bounds the subsets checked at
+        # once, the innermost voices of larger chords are dropped first
+        priorities = [len(notes) - 1, 0] + list(range(len(notes) - 2, 0, -1)) if len(notes) > 1 else [0]
+        priorities = priorities[:max(self.nstrings, 12)]
+        kept_indices = sorted(priorities)
+        notes = [notes[i] for i in kept_indices]
+        # The same order, as indices in the kept notes
+        search_order = [kept_indices.index(i) for i in priorities]
+
+        feasible = self.get_feasible_subsets(self.get_string_masks(self.get_note_options(notes)))
+
+        for size in range(min(len(notes), self.nstrings), 0, -1):
+            for subset in itertools.combinations(search_order, size):
+                if not feasible[sum(1 << i for i in subset)]:
+                    continue
+
+                # Enumerated without the cache, only the subset returned is cached
+                subset_notes = [notes[i] for i in sorted(subset)]
+                fingerings = self.get_possible_fingerings(self.get_note_options(subset_notes))
+                if len(fingerings) > 0:
+                    if self.cache is not None:
+                        self.cache.put((self.signature, tuple(note.pitch for note in subset_notes)),
+                                       tuple(tuple(self.node_index[note] for note in fingering) for fingering in fingerings))
+                    return subset_notes, fingerings
+
+        return [], []
+
+    def is_linkable(self, indices):
+        """Checks if positions can be visited one after the other through possible edges, in any order.
+
+        Args:
+            indices (list): Indices of positions on distinct strings
+
+        Returns:
+            bool: If a path going through all the positions exists
+        """
+        reachable = self.reachable[np.ix_(indices, indices)]
+        if reachable.all():
+            return True
+
+        # Hamiltonian path search, ends[mask] is the set of positions a path visiting mask can end on
+        n = len(indices)
+        neighbours = [sum(1 << j for j in range(n) if reachable[i, j] and i != j) for i in range(n)]
+        ends = [0] * (1 << n)
+        for i in range(n):
+            ends[1 << i] = 1 << i
+
+        for mask in range(1, 1 << n):
+            for i in range(n):
+                if ends[mask] & (1 << i):
+                    for j in range(n):
+                        if neighbours[i] & ~mask & (1 << j):
+                            ends[mask | (1 << j)] |= 1 << j
+
+        return ends[(1 << n) - 1] != 0
+
     def fix_oob_notes(self, notes, preserve_highest_note=False):
         min_possible_pitch, max_possible_pitch = self.tuning.get_pitch_bounds()
 
@@ -164,35 +508,37 @@ class Fretboard:
         """Checks if a connection is possible between 2 nodes
 
         Args:
-            possible_note (Note): Source note
-            possible_target_note (Note): Target note
-            G (networkx.Graph): Fretboard graph
+            possible_note (Position): Source position
+            possible_target_note (Position): Target position
 
         Returns:
             bool: Possibility of the connection
         """
-        is_distance_possible = self.G[possible_note][possible_target_note]["distance"] < 6
-        is_different_string = self.G.nodes[possible_note]["pos"][0] != self.G.nodes[possible_target_note]["pos"][0]
-        return is_distance_possible and is_different_string
+        i, j = self.node_index[possible_note], self.node_index[possible_target_note]
+        is_distance_possible = self.reachable[i, j]
+        is_different_string = self.string_index[i] != self.string_index[j]
+        return bool(is_distance_possible and is_different_string)
 
     def is_fingering_possible(self, fingering, note_arrays):
         """Checks if path is possible and playable.
 
         Args:
-            G (networkx.Graph): Fretboard graph
-            path (tuple): Notes path
+            path (tuple): Positions path
             note_arrays (list): List of possible positions for the notes
 
         Returns:
             bool: If the path is possible and playable
         """
+        indices = [self.node_index[note] for note in fingering]
+
         # No 2 fingers on a single string
-        plucked_strings = [self.G.nodes[note]["pos"][0] for note in fingering]
-        one_per_string = len(plucked_strings) == len(set(plucked_strings))
+        plucked_strings = self.string_index[indices]
+        one_per_string = len(plucked_strings) == len(set(plucked_strings.tolist()))
 
         # No more than 5 fret span
-        used_frets = [self.G.nodes[note]["pos"][1] for note in fingering if self.G.nodes[note]["pos"][1] != 0]
-        max_fret_span = (max(used_frets) - min(used_frets)) < 5 if len(used_frets) > 0 else True
+        used_frets = self.fret_index[indices]
+        used_frets = used_frets[used_frets != 0]
+        max_fret_span = (used_frets.max() - used_frets.min()) < 5 if len(used_frets) > 0 else True
 
         # Path doesn't visit more nodes than necessary
         right_length = len(fingering) <= len(note_arrays)
@@ -203,9 +549,11 @@ class Fretboard:
         """Displays notes played on a plt graph.
 
         Args:
-            G (networkx.Graph): Fretboard graph
             path (tuple): Path to display
         """
+        import networkx as nx
+        plt = import_pyplot()
+
         pos = nx.get_node_attributes(self.G, 'pos')
         plt.figure(figsize=(2, 6))
         nx.draw(self.G, pos)
@@ -213,6 +561,9 @@ class Fretboard:
         plt.show()
 
     def display_complete_graph(self):
+        import networkx as nx
+        plt = import_pyplot()
+
         positions = nx.get_node_attributes(self.G, "pos")
         nx.draw(self.G, pos=positions)
         plt.show()
@@ -1,22 +1,22 @@
 import numpy as np
 import math
-import networkx as nx
-import matplotlib.pyplot as plt
 import itertools
 
 from tuttut.logic.theory import *
 
 
-def build_path_graph(G, note_arrays):
+def build_path_graph(fretboard, note_arrays):
     """Returns a path graph corresponding to all possible notes of a chord.
 
     Args:
-        G (networkx.Graph): Fretboard graph
+        fretboard (Fretboard): Fretboard
         note_arrays (list): List of possible positions for the notes
 
     Returns:
         networkx.DiGraph: Path graph for all possible position
     """
+    import networkx as nx
+
     res = nx.DiGraph()
 
     for x, note_array in enumerate(note_arrays):
@@ -26,27 +26,56 @@ def build_path_graph(G, note_arrays):
     for idx, note_array in enumerate(note_arrays[:-1]):  # Go through every array except the last
         for possible_note in note_array:
             for possible_target_note in note_arrays[idx+1]:
-                distance = G[possible_note][possible_target_note]["distance"]
-                if is_edge_possible(possible_note, possible_target_note, G):
+                distance = fretboard.distances[fretboard.node_index[possible_note], fretboard.node_index[possible_target_note]]
+                if fretboard.is_edge_possible(possible_note, possible_target_note):
                     res.add_edge(possible_note, possible_target_note, distance=distance)
 
     return res
 
 
-def is_edge_possible(possible_note, possible_target_note, G):  # Should be in Fretboard but is used by build_path_graph
+def find_path_graph_fingerings(fretboard, note_options):
+    """Returns all possible fingerings by walking path graphs of every permutation of the notes.
+
+    Reference implementation of Fretboard.get_possible_fingerings, factorial in the number of notes.
+
+    Args:
+        fretboard (Fretboard): Fretboard
+        note_options (list): List of possible positions for the notes
+
+    Returns:
+        list: List of paths
+    """
+    import networkx as nx
+
+    fingerings = []
+
+    if len(note_options) == 1:
+        return [(note,) for note in note_options[0]]
+
+    for note_options_permutation in list(itertools.permutations(note_options)):
+        path_graph = build_path_graph(fretboard, note_options_permutation)
+        for possible_source_node in note_options_permutation[0]:
+            permutation_fingerings = nx.all_simple_paths(
+                path_graph, possible_source_node, target=note_options_permutation[-1])
+            for fingering in permutation_fingerings:
+                if not is_path_already_checked(fingerings, fingering) and fretboard.is_fingering_possible(fingering, note_options_permutation):
+                    fingerings.append(tuple(fingering))
+
+    return fingerings
+
+
+def is_edge_possible(possible_note, possible_target_note, fretboard):
     """Checks if a connection is possible between 2 nodes
 
     Args:
-        possible_note (Note): Source note
-        possible_target_note (Note): Target note
-        G (networkx.Graph): Fretboard graph
+        possible_note (Position): Source position
+        possible_target_note (Position): Target position
+        fretboard (Fretboard): Fretboard
 
     Returns:
         bool: Possibility of the connection
     """
-    is_distance_possible = G[possible_note][possible_target_note]["distance"] < 6
-    is_different_string = G.nodes[possible_note]["pos"][0] != G.nodes[possible_target_note]["pos"][0]
-    return is_distance_possible and is_different_string
+    return fretboard.is_edge_possible(possible_note, possible_target_note)
 
 
 def is_path_already_checked(paths, current_path):
@@ -66,28 +95,28 @@ def is_path_already_checked(paths, current_path):
     return False
 
 
-def compute_path_difficulty(G, path, previous_path, weights, tuning):
+def compute_path_difficulty(fretboard, path, previous_path, weights, tuning):
     """Computes the difficulty of a path.
 
     Args:
-        G (networkx.Graph): Fretboard graph
+        fretboard (Fretboard): Fretboard
         path (tuple): Path to compute the difficulty for
         previous_path (tuple): Previous played path
 
     Returns:
         float: Difficulty metric of a path
     """
-    raw_height = get_raw_height(G, path, previous_path)
-    previous_raw_height = get_raw_height(G, previous_path) if len(previous_path) > 0 else 0
+    raw_height = get_raw_height(fretboard, path, previous_path)
+    previous_raw_height = get_raw_height(fretboard, previous_path) if len(previous_path) > 0 else 0
 
-    height = get_height_score(G, path, tuning, previous_path)
+    height = get_height_score(fretboard, path, tuning, previous_path)
 
     dheight = get_dheight_score(raw_height, previous_raw_height, tuning)
 
-    # length = get_path_length(G, path)
-    span = get_path_span(G, path)
+    # length = get_path_length(fretboard, path)
+    span = get_path_span(fretboard, path)
 
-    n_changed_strings = get_n_changed_strings(G, path, previous_path, tuning)
+    n_changed_strings = get_n_changed_strings(fretboard, path, previous_path, tuning)
 
     easiness = laplace_distro(dheight, b=weights["b"]) * 1/(1+height * weights["height"]) * \
         1/(1+span * weights["length"]) * 1/(1+n_changed_strings * weights["n_changed_strings"])
@@ -95,20 +124,20 @@ def compute_path_difficulty(G, path, previous_path, weights, tuning):
     return 1/easiness
 
 
-def compute_isolated_path_difficulty(G, path, tuning):
+def compute_isolated_path_difficulty(fretboard, path, tuning):
     """Computes the difficulty of a path not taking into account the previous one played.
 
     Args:
-        G (networkx.Graph): Fretboard graph
+        fretboard (Fretboard): Fretboard
         path (tuple): Path to compute the difficulty for
         previous_path (tuple): Previous played path
 
     Returns:
         float: Difficulty metric of a path
     """
-    height = get_height_score(G, path, tuning)
+    height = get_height_score(fretboard, path, tuning)
 
-    span = get_path_span(G, path)
+    span = get_path_span(fretboard, path)
 
     easiness = 1/(1+height) * 1/(1+span)
 
@@ -129,11 +158,11 @@ def laplace_distro(x, b, mu=0.0):
     return (1/(2*b))*math.exp(-abs(x-mu)/(b))
 
 
-def get_nfingers(G, path):
+def get_nfingers(fretboard, path):
     """Returns the number of fingers needed for a path.
 
     Args:
-        G (networkx.Graph): Fretboard graph
+        fretboard (Fretboard): Fretboard
         path (tuple): Path to compute the number of fingers for
 
     Returns:
@@ -141,30 +170,28 @@ def get_nfingers(G, path):
     """
     count = 0
     for note in path:
-        ifret = G.nodes[note]["pos"][1]
+        ifret = fretboard.get_pos(note)[1]
         if ifret != 0:
             count += 1
 
     return count
 
 
-def get_n_changed_strings(G, path, previous_path, tuning):
+def get_n_changed_strings(fretboard, path, previous_path, tuning):
     """Returns the number of strings that have changed compared to the previous shape.
 
     Args:
-        G (networkx.Graph): Fretboard graph
+        fretboard (Fretboard): Fretboard
         path (tuple): Path to compute the number of changed strings for
         previous_path (tuple): Previous played path
 
     Returns:
         int: Number of changed strings
     """
-    # used_strings = set([G.nodes[note]["pos"][0] for note in path])
-    # previous_used_strings = set([G.nodes[note]["pos"][0] for note in previous_path])
-
-    used_strings = set([G.nodes[note]["pos"][0] for note in path])
+    used_strings = set([fretboard.get_pos(note)[0] for note in path])
     # Does not take into account open strings
-    previous_used_strings = set([G.nodes[note]["pos"][0] for note in previous_path if G.nodes[note]["pos"][1] != 0])
+    previous_positions = [fretboard.get_pos(note) for note in previous_path]
+    previous_used_strings = set([string for string, fret in previous_positions if fret != 0])
 
     n_changed_strings = len(path) - len(set(used_strings).intersection(previous_used_strings))
 
@@ -173,34 +200,34 @@ def get_n_changed_strings(G, path, previous_path, tuning):
     return n_changed_strings_score
 
 
-def get_height_score(G, path, tuning, previous_path=None):
+def get_height_score(fretboard, path, tuning, previous_path=None):
     """Returns the height score for calculating difficulty (0-1)
 
       Args:
-          G (networkx.Graph): Fretboard graph
+          fretboard (Fretboard): Fretboard
           path (tuple): Path to compute the height for
           previous_path (tuple, optional): Previous played path. Defaults to None.
 
       Returns:
           float: Height of the path if possible, height of the previous path instead
     """
-    height = get_raw_height(G, path, previous_path)/tuning.nfrets
+    height = get_raw_height(fretboard, path, previous_path)/tuning.nfrets
     assert 0 <= height <= 1
-    return get_raw_height(G, path, previous_path)/tuning.nfrets
+    return get_raw_height(fretboard, path, previous_path)/tuning.nfrets
 
 
-def get_raw_height(G, path, previous_path=None):
+def get_raw_height(fretboard, path, previous_path=None):
     """Returns the average height on the fretboard of highest and lowest notes in the path.
 
     Args:
-        G (networkx.Graph): Fretboard graph
+        fretboard (Fretboard): Fretboard
         path (tuple): Path to compute the height for
         previous_path (tuple, optional): Previous played path. Defaults to None.
 
     Returns:
         float: Height of the path if possible, height of the previous path instead
     """
-    y = [G.nodes[note]["pos"][1] for note in path if G.nodes[note]["pos"][1] != 0]
+    y = [fret for _, fret in map(fretboard.get_pos, path) if fret != 0]
 
     if len(y) > 0:
         return (max(y) + min(y))/2
@@ -208,7 +235,7 @@ def get_raw_height(G, path, previous_path=None):
     elif previous_path is None:
         return 0
     else:
-        return get_raw_height(G, previous_path)
+        return get_raw_height(fretboard, previous_path)
 
 
 def get_dheight_score(height, previous_height, tuning):
@@ -223,13 +250,13 @@ def get_dheight_score(height, previous_height, tuning):
     return dheight
 
 
-def get_path_length(G, path):
+def get_path_length(fretboard, path):
     """Returns the total length of a path.
 
     Corresponds to the sum of all the distances between the notes.
 
     Args:
-        G (networkx.Graph): Fretboard graph
+        fretboard (Fretboard): Fretboard
         path (tuple): Path to compute the length for
 
     Returns:
@@ -237,31 +264,45 @@ def get_path_length(G, path):
     """
     res = 0
     for i in range(len(path)-1):
-        res += G[path[i]][path[i+1]]["distance"]
+        res += fretboard.distances[fretboard.node_index[path[i]], fretboard.node_index[path[i+1]]]
 
     length = res/10  # 10 probably the maximum distance between notes
     assert 0 <= length <= 1
     return length
 
 
-def get_path_span(G, path):
+def get_path_span(fretboard, path):
     """Returns the vertical span of a path.
 
     Args:
-        G (networkx.Graph): Fretboard graph
+        fretboard (Fretboard): Fretboard
         path (tuple): Path to compute the span for
 
     Returns:
         float: Span of the path
     """
 
-    y = [G.nodes[note]["pos"][1] for note in path if G.nodes[note]["pos"][1] != 0]
+    y = [fret for _, fret in map(fretboard.get_pos, path) if fret != 0]
 
     span = (max(y) - min(y))/5 if len(y) > 0 else 0
     assert 0 <= span <= 1
     return span
 
 
+def import_pyplot():
+    """Imports matplotlib.pyplot, only needed (and imported) to display graphs.
+
+    Returns:
+        module: matplotlib.pyplot
+    """
+    try:
+        import matplotlib.pyplot as plt
+    except ImportError as e:
+        raise ImportError("Displaying graphs requires matplotlib, install it with the plot extra (tuttut-dt[plot])") from e
+
+    return plt
+
+
 def display_path_graph(path_graph, show_distances=True, show_names=True):
     """Displays the path graph on a plt plot.
 
@@ -270,6 +311,9 @@ def display_path_graph(path_graph, show_distances=True, show_names=True):
         show_distances (bool, optional): If the distances should be shown on the graph. Defaults to True.
         show_names (bool, optional): If the note names should be shown on the graph. Defaults to True.
     """
+    import networkx as nx
+    plt = import_pyplot()
+
     pos = nx.get_node_attributes(path_graph, 'pos')
     nx.draw(path_graph, pos, with_labels=show_names)
 
@@ -283,77 +327,412 @@ def display_path_graph(path_graph, show_distances=True, show_names=True):
     plt.show()
 
 
-def viterbi(V, Tm, Em, initial_distribution=None):
-    """Implementation of the Viterbi algorithm.
+def viterbi(V, Tm, emissions, initial_distribution=None, counts=None):
+    """Implementation of the Viterbi algorithm, in log space.
+
+    Each time step is computed for all the states at once. Unplayable observations (-1) are skipped,
+    the transition goes from the previous playable observation to the next one.
+    Emission probabilities are 1 for the observation emitted by a state (see build_emissions), 0 otherwise.
 
     Args:
-        V (list): Sequence of observations.
+        V (list): Sequence of observations, -1 for unplayable ones.
         Tm (np.ndarray): Transition matrix
-        Em (np.ndarray): Emission matrix
+        emissions (np.ndarray): Observation emitted by each state
         initial_distribution (list, optional): Initial distribution. Defaults to None.
+        counts (list, optional): Number of repetitions of each observation (see compress_runs), a repeated
+            observation keeps the same state. Defaults to None.
 
     Returns:
-        list: The most likely sequence of hidden states 
+        np.ndarray: The most likely sequence of hidden states, -1 for unplayable observations
     """
-    T = len(V)
     M = Tm.shape[0]
+    S = np.full(len(V), -1)
+    played = [t for t, observation in enumerate(V) if observation >= 0]
+
+    if len(played) == 0:
+        return S
 
     initial_distribution = initial_distribution if initial_distribution is not None else np.full(M, 1/M)
 
-    omega = np.zeros((T, M))
-    omega[0, :] = np.log(initial_distribution * Em[:, V[0]])
+    # Impossible transitions and emissions are -inf
+    with np.errstate(divide="ignore"):
+        log_Tm = np.log(Tm)
+        omega = np.log(initial_distribution)
+
+    omega = np.where(emissions == V[played[0]], omega, -np.inf)
+    if counts is not None and counts[played[0]] > 1:
+        omega = omega + (counts[played[0]] - 1) * np.diag(log_Tm)
+
+    # Most probable previous state of each state, for every playable observation after the first
+    prev = np.zeros((len(played) - 1, M), dtype=np.min_scalar_type(M))
+
+    for i, t in enumerate(played[1:]):
+        probability = omega[:, None] + log_Tm
+
+        prev[i] = np.argmax(probability, axis=0)
+        omega = np.where(emissions == V[t], np.max(probability, axis=0), -np.inf)
+        if counts is not None and counts[t] > 1:
+            omega = omega + (counts[t] - 1) * np.diag(log_Tm)
+
+    # Backtrack from the most probable last state
+    state = np.argmax(omega)
+    S[played[-1]] = state
+    for i in range(len(played) - 2, -1, -1):
+        state = prev[i, state]
+        S[played[i]] = state
+
+    return S
+
+
+def get_fingering_features(fretboard, fingerings):
+    """Computes the features used by the difficulty metric for every fingering.
+
+    Args:
+        fretboard (Fretboard): Fretboard
+        fingerings (list): Fingerings to compute the features for
+
+    Returns:
+        dict: Arrays of raw height, span, number of notes, whether frets are pressed (one value per fingering),
+            used strings and strings pressed on a fret (one boolean row of nstrings values per fingering)
+    """
+    n = len(fingerings)
+    lengths = np.array([len(fingering) for fingering in fingerings], dtype=int)
+    indices = np.array([fretboard.node_index[note] for fingering in fingerings for note in fingering], dtype=int)
+    owners = np.repeat(np.arange(n), lengths)
+
+    frets = fretboard.fret_index[indices].astype(int)
+    strings = fretboard.string_index[indices].astype(int)
+    pressed = frets != 0
+
+    max_frets = np.full(n, -1)
+    min_frets = np.full(n, np.iinfo(int).max)
+    np.maximum.at(max_frets, owners[pressed], frets[pressed])
+    np.minimum.at(min_frets, owners[pressed], frets[pressed])
+    has_pressed = max_frets >= 0
+
+    used_strings = np.zeros((n, fretboard.nstrings), dtype=bool)
+    used_strings[owners, strings] = True
+    pressed_strings = np.zeros((n, fretboard.nstrings), dtype=bool)
+    pressed_strings[owners[pressed], strings[pressed]] = True
+
+    return {
+        "raw_height": np.where(has_pressed, (max_frets + min_frets) / 2, 0),
+        "span": np.where(has_pressed, (max_frets - min_frets) / 5, 0),
+        "length": lengths,
+        "has_pressed": has_pressed,
+        "used_strings": used_strings,
+        "pressed_strings": pressed_strings
+    }
+
+
+def compute_transition_features(previous_features, features, tuning):
+    """Computes the terms of the difficulty metric that don't depend on the weights, for every transition
+    between two sets of fingerings.
+
+    Args:
+        previous_features (dict): Features of the previous fingerings
+        features (dict): Features of the current fingerings
+        tuning (Tuning): Tuning of the instrument
+
+    Returns:
+        dict: Height, height difference, span and number of changed strings, previous fingerings as rows and
+            current fingerings as columns (span has a single row, it only depends on the current fingering)
+    """
+    previous_raw_height = previous_features["raw_height"][:, None]
+
+    # Height of the previous fingering if the current one only uses open strings
+    raw_height = np.where(features["has_pressed"][None, :], features["raw_height"][None, :], previous_raw_height)
+
+    # Open strings of the previous fingering are not taken into account
+    n_kept_strings = previous_features["pressed_strings"].astype(int) @ features["used_strings"].T.astype(int)
+
+    return {
+        "height": raw_height / tuning.nfrets,
+        "dheight": np.abs(raw_height - previous_raw_height) / tuning.nfrets,
+        "span": features["span"][None, :],
+        "n_changed_strings": (features["length"][None, :] - n_kept_strings) / tuning.nstrings
+    }
+
+
+def compute_transition_easiness(transition_features, weights):
+    """Computes the easiness (1/difficulty) of transitions from their features (see compute_transition_features).
+
+    Args:
+        transition_features (dict): Features of the transitions
+        weights (dict): Weights of the difficulty metric
+
+    Returns:
+        np.ndarray: Easiness matrix, previous fingerings as rows and current fingerings as columns
+    """
+    laplace = (1/(2*weights["b"])) * np.exp(-np.abs(transition_features["dheight"])/weights["b"])
+
+    return laplace * 1/(1+transition_features["height"] * weights["height"]) * \
+        1/(1+transition_features["span"] * weights["length"]) * \
+        1/(1+transition_features["n_changed_strings"] * weights["n_changed_strings"])
+
+
+def compute_easiness_matrix(previous_features, features, weights, tuning):
+    """Computes the easiness (1/difficulty) of every transition between two sets of fingerings.
+
+    Vectorized equivalent of compute_path_difficulty, see get_fingering_features.
+
+    Args:
+        previous_features (dict): Features of the previous fingerings
+        features (dict): Features of the current fingerings
+        weights (dict): Weights of the difficulty metric
+        tuning (Tuning): Tuning of the instrument
+
+    Returns:
+        np.ndarray: Easiness matrix, previous fingerings as rows and current fingerings as columns
+    """
+    return compute_transition_easiness(compute_transition_features(previous_features, features, tuning), weights)
+
+
+def segment_viterbi(V, chord_ranges, features, weights, tuning, initial_distribution=None, counts=None):
+    """Implementation of the Viterbi algorithm over a trellis of the fingerings of consecutive observations.
+
+    Transitions are only computed between the fingerings of two consecutive observations, and normalized
+    over the fingerings of the next one. The blocks of transitions are shared between identical pairs of observations,
+    so memory depends on the song length and the number of fingerings per observation, not on the whole vocabulary.
+
+    Args:
+        V (list): Sequence of observations, -1 for unplayable ones.
+        chord_ranges (list): Start and end in the fingerings vocabulary of the fingerings of each observation
+        features (dict): Features of the fingerings vocabulary (see get_fingering_features)
+        weights (dict): Weights of the difficulty metric
+        tuning (Tuning): Tuning of the instrument
+        initial_distribution (list, optional): Initial distribution over the fingerings of the first playable observation.
+            Defaults to None.
+        counts (list, optional): Number of repetitions of each observation (see compress_runs), a repeated
+            observation keeps the same fingering. Defaults to None.
+
+    Returns:
+        np.ndarray: Index in the fingerings vocabulary of the most likely fingering for each observation, -1 if unplayable
+    """
+    log_blocks = {}
+
+    def get_log_block(previous_observation, observation):
+        if (previous_observation, observation) not in log_blocks:
+            previous_start, previous_end = chord_ranges[previous_observation]
+            start, end = chord_ranges[observation]
+            easiness = compute_easiness_matrix({key: value[previous_start:previous_end] for key, value in features.items()},
+                                               {key: value[start:end] for key, value in features.items()}, weights, tuning)
+            log_blocks[previous_observation, observation] = np.log(easiness / np.sum(easiness, axis=1, keepdims=True))
+
+        return log_blocks[previous_observation, observation]
+
+    return decode_trellis(V, chord_ranges, get_log_block, initial_distribution, counts)
 
-    prev = np.zeros((T - 1, M))
 
-    for t in range(1, T):
-        for j in range(M):
-            # Same as Forward Probability
-            probability = omega[t - 1] + np.log(Tm[:, j]) + np.log(Em[j, V[t]])
+def decode_trellis(V, chord_ranges, get_log_block, initial_distribution=None, counts=None):
+    """Viterbi algorithm over a trellis of the fingerings of consecutive observations, see segment_viterbi.
 
-            # This is our most probable state given previous state at time t (1)
-            prev[t - 1, j] = np.argmax(probability)
+    Args:
+        V (list): Sequence of observations, -1 for unplayable ones.
+        chord_ranges (list): Start and end in the fingerings vocabulary of the fingerings of each observation
+        get_log_block (function): Returns the log transition probabilities from the fingerings of an observation
+            (rows) to the fingerings of the next one (columns)
+        initial_distribution (list, optional): Initial distribution over the fingerings of the first playable observation.
+            Defaults to None.
+        counts (list, optional): Number of repetitions of each observation (see compress_runs), a repeated
+            observation keeps the same fingering. Defaults to None.
+
+    Returns:
+        np.ndarray: Index in the fingerings vocabulary of the most likely fingering for each observation, -1 if unplayable
+    """
+    S = np.full(len(V), -1)
+    played = [t for t, observation in enumerate(V) if observation >= 0]
+
+    if len(played) == 0:
+        return S
+
+    start, end = chord_ranges[V[played[0]]]
+    omega = np.log(initial_distribution) if initial_distribution is not None else np.full(end - start, -np.log(end - start))
+    if counts is not None and counts[played[0]] > 1:
+        omega = omega + (counts[played[0]] - 1) * np.diag(get_log_block(V[played[0]], V[played[0]]))
+
+    prev = []
+    for t_previous, t in zip(played[:-1], played[1:]):
+        probability = omega[:, None] + get_log_block(V[t_previous], V[t])
+
+        prev.append(np.argmax(probability, axis=0).astype(np.int32))
+        omega = np.max(probability, axis=0)
+        if counts is not None and counts[t] > 1:
+            omega = omega + (counts[t] - 1) * np.diag(get_log_block(V[t], V[t]))
+
+    # Backtrack from the most probable last state
+    states = [int(np.argmax(omega))]
+    for previous_states in reversed(prev):
+        states.append(int(previous_states[states[-1]]))
+
+    for t, state in zip(played, reversed(states)):
+        S[t] = chord_ranges[V[t]][0] + state
+
+    return S
+
+
+def beam_viterbi(V, chord_ranges, features, weights, tuning, initial_distribution=None, beam_width=32, counts=None):
+    """Beam search over the trellis of segment_viterbi, keeping the beam_width most likely fingerings per observation.
+
+    Each fingering of the next observation keeps its most likely predecessor in the beam, then only the beam_width
+    most likely ones are kept. The cost of a step depends on beam_width instead of the number of fingerings of the
+    previous observation. With a beam at least as wide as the fingerings of every observation, the result is the same
+    as segment_viterbi.
+
+    Args:
+        V (list): Sequence of observations, -1 for unplayable ones.
+        chord_ranges (list): Start and end in the fingerings vocabulary of the fingerings of each observation
+        features (dict): Features of the fingerings vocabulary (see get_fingering_features)
+        weights (dict): Weights of the difficulty metric
+        tuning (Tuning): Tuning of the instrument
+        initial_distribution (list, optional): Initial distribution over the fingerings of the first playable observation.
+            Defaults to None.
+        beam_width (int, optional): Number of fingerings kept per observation. Defaults to 32.
+        counts (list, optional): Number of repetitions of each observation (see compress_runs), a repeated
+            observation keeps the same fingering. Defaults to None.
+
+    Returns:
+        np.ndarray: Index in the fingerings vocabulary of the most likely fingering found for each observation,
+            -1 if unplayable
+    """
+    def get_log_rows(previous_observation, previous_fingerings, observation):
+        start, end = chord_ranges[observation]
+        easiness = compute_easiness_matrix({key: value[previous_fingerings] for key, value in features.items()},
+                                           {key: value[start:end] for key, value in features.items()}, weights, tuning)
+        return np.log(easiness / np.sum(easiness, axis=1, keepdims=True))
+
+    return decode_beam(V, chord_ranges, get_log_rows, initial_distribution, beam_width, counts)
+
+
+def decode_beam(V, chord_ranges, get_log_rows, initial_distribution=None, beam_width=32, counts=None):
+    """Beam search over a trellis of the fingerings of consecutive observations, see beam_viterbi.
+
+    Args:
+        V (list): Sequence of observations, -1 for unplayable ones.
+        chord_ranges (list): Start and end in the fingerings vocabulary of the fingerings of each observation
+        get_log_rows (function): Returns the log transition probabilities from some fingerings of an observation (rows,
+            indices in the fingerings vocabulary) to the fingerings of the next one (columns)
+        initial_distribution (list, optional): Initial distribution over the fingerings of the first playable observation.
+            Defaults to None.
+        beam_width (int, optional): Number of fingerings kept per observation. Defaults to 32.
+        counts (list, optional): Number of repetitions of each observation (see compress_runs), a repeated
+            observation keeps the same fingering. Defaults to None.
+
+    Returns:
+        np.ndarray: Index in the fingerings vocabulary of the most likely fingering found for each observation,
+            -1 if unplayable
+    """
+    if beam_width < 1:
+        raise ValueError(f"beam_width must be at least 1, got {beam_width}")
 
-            # This is the probability of the most probable state (2)
-            omega[t, j] = np.max(probability)
+    S = np.full(len(V), -1)
+    played = [t for t, observation in enumerate(V) if observation >= 0]
 
-    # Path Array
-    S = np.zeros(T)
+    if len(played) == 0:
+        return S
 
-    # Find the most probable last hidden state
-    last_state = np.argmax(omega[T - 1, :])
+    def keep_best(scores):
+        # Stable, so that ties keep the lowest fingering like np.argmax
+        return np.argsort(-scores, kind="stable")[:beam_width]
 
-    S[0] = last_state
+    log_stays = {}
 
-    backtrack_index = 1
-    for i in range(T - 2, -1, -1):
-        S[backtrack_index] = prev[i, int(last_state)]
-        last_state = prev[i, int(last_state)]
-        backtrack_index += 1
+    def get_log_stay(t):
+        # Log probability of keeping each fingering of a repeated observation
+        if V[t] not in log_stays:
+            start, end = chord_ranges[V[t]]
+            log_stays[V[t]] = np.diag(get_log_rows(V[t], np.arange(start, end), V[t]))
 
-    # Flip the path array since we were backtracking
-    S = np.flip(S, axis=0)
+        return (counts[t] - 1) * log_stays[V[t]]
 
-    return S.astype(int)
+    start, end = chord_ranges[V[played[0]]]
+    with np.errstate(divide="ignore"):
+        omega = np.log(initial_distribution) if initial_distribution is not None else np.full(end - start, -np.log(end - start))
+    if counts is not None and counts[played[0]] > 1:
+        omega = omega + get_log_stay(played[0])
 
+    beam = start + keep_best(omega)
+    scores = omega[beam - start]
+
+    beams = [beam]
+    prev = []
+    for t_previous, t in zip(played[:-1], played[1:]):
+        start, end = chord_ranges[V[t]]
+        probability = scores[:, None] + get_log_rows(V[t_previous], beam, V[t])
+
+        best = np.max(probability, axis=0)
+        if counts is not None and counts[t] > 1:
+            best = best + get_log_stay(t)
+        kept = keep_best(best)
+
+        prev.append(np.argmax(probability, axis=0)[kept])
+        beam = start + kept
+        scores = best[kept]
+        beams.append(beam)
+
+    # Backtrack from the most likely fingering of the last beam
+    position = int(np.argmax(scores))
+    for i in range(len(played) - 1, -1, -1):
+        S[played[i]] = beams[i][position]
+        if i > 0:
+            position = int(prev[i - 1][position])
+
+    return S
+
+
+def segment_path_log_probability(S, chord_ranges, features, weights, tuning, initial_distribution=None):
+    """Log probability of a sequence of fingerings under the model of segment_viterbi and beam_viterbi.
+
+    Args:
+        S (list): Index in the fingerings vocabulary of the fingering of each observation, -1 if unplayable
+        chord_ranges (list): Start and end in the fingerings vocabulary of the fingerings of each observation
+        features (dict): Features of the fingerings vocabulary (see get_fingering_features)
+        weights (dict): Weights of the difficulty metric
+        tuning (Tuning): Tuning of the instrument
+        initial_distribution (list, optional): Initial distribution over the fingerings of the first playable observation.
+            Defaults to None.
 
-def build_transition_matrix(G, fingerings, weights, tuning):
+    Returns:
+        float: Log probability of the sequence, the opposite of its cost
+    """
+    fingerings = [state for state in S if state >= 0]
+    if len(fingerings) == 0:
+        return 0.0
+
+    starts = np.array([start for start, _ in chord_ranges])
+    ends = np.array([end for _, end in chord_ranges])
+
+    def get_range(state):
+        ichord = np.searchsorted(ends, state, side="right")
+        return starts[ichord], ends[ichord]
+
+    start, end = get_range(fingerings[0])
+    with np.errstate(divide="ignore"):
+        log_probability = np.log(initial_distribution[fingerings[0] - start]) if initial_distribution is not None else -np.log(end - start)
+
+    for previous_state, state in zip(fingerings[:-1], fingerings[1:]):
+        start, end = get_range(state)
+        easiness = compute_easiness_matrix({key: value[[previous_state]] for key, value in features.items()},
+                                           {key: value[start:end] for key, value in features.items()}, weights, tuning)[0]
+        log_probability += np.log(easiness[state - start] / np.sum(easiness))
+
+    return float(log_probability)
+
+
+def build_transition_matrix(fretboard, fingerings, weights, tuning):
     """Builds the transition matrix according to all the present fingerings.
 
     Args:
-        G (networkx.Graph): Fretboard graph
+        fretboard (Fretboard): Fretboard
         fingerings (list): All the fingerings that can be used to play a piece.
 
     Returns:
         np.ndarray: Transition matrix
     """
-    transition_matrix = np.zeros((len(fingerings), len(fingerings)))
-    for iprevious in range(len(fingerings)):
-        difficulties = np.array([1/compute_path_difficulty(G, fingerings[icurrent], fingerings[iprevious], weights, tuning)
-                                for icurrent in range(len(fingerings))])
+    features = get_fingering_features(fretboard, fingerings)
+    easiness = compute_easiness_matrix(features, features, weights, tuning)
 
-        transition_matrix[iprevious] = difficulties_to_probabilities(difficulties)
-
-    return transition_matrix
+    return easiness / np.sum(easiness, axis=1, keepdims=True)
 
 
 def difficulties_to_probabilities(difficulties):
@@ -369,23 +748,67 @@ def difficulties_to_probabilities(difficulties):
     return np.array([difficulty/difficulties_total for difficulty in difficulties])
 
 
-def expand_emission_matrix(emission_matrix, all_paths):
-    """Expands the emission matrix as new notes come by.
+def prune_fingerings(difficulties, max_candidates=None, max_difficulty_ratio=None):
+    """Selects the easiest fingerings of a chord, the others are left out of the transition model.
 
     Args:
-        emission_matrix (np.ndarray): Current emission matrix
-        all_paths (list): All current paths
+        difficulties (list): Isolated difficulty of each fingering (see compute_isolated_path_difficulty)
+        max_candidates (int, optional): Maximum number of fingerings kept, ties keep the first ones. Defaults to None.
+        max_difficulty_ratio (float, optional): Fingerings more than this ratio harder than the easiest one are left
+            out. Defaults to None.
 
     Returns:
-        np.ndarray: New updated emission matrix
-    """
-    if len(emission_matrix) > 0:
-        filler = np.zeros((len(all_paths), emission_matrix.shape[1]))
-        emission_matrix = np.vstack((emission_matrix, filler))
-        column = np.vstack((np.vstack(np.zeros(len(emission_matrix)-len(all_paths))),
-                           np.vstack(np.ones(len(all_paths)))))
-        emission_matrix = np.hstack((emission_matrix, column))
-    else:
-        emission_matrix = np.vstack((np.ones(len(all_paths))))
+        np.ndarray: Indices of the kept fingerings, in their original order
+    """
+    difficulties = np.asarray(difficulties, dtype=float)
+    kept = np.argsort(difficulties, kind="stable")
+
+    if max_difficulty_ratio is not None and len(kept) > 0:
+        kept = kept[difficulties[kept] <= difficulties[kept[0]] * max_difficulty_ratio]
+    if max_candidates is not None:
+        kept = kept[:max_candidates]
+
+    return np.sort(kept)
+
+
+def compress_runs(V):
+    """Collapses the runs of identical consecutive observations into one observation with its number of repetitions.
+
+    Args:
+        V (list): Sequence of observations
 
-    return emission_matrix
+    Returns:
+        tuple: Observations without consecutive repetitions, number of repetitions of each one
+    """
+    V = np.asarray(V, dtype=int)
+    if len(V) == 0:
+        return V, np.zeros(0, dtype=int)
+
+    starts = np.flatnonzero(np.concatenate(([True], V[1:] != V[:-1])))
+    return V[starts], np.diff(np.append(starts, len(V)))
+
+
+def expand_runs(S, counts):
+    """Repeats the decoded states of compressed observations, see compress_runs.
+
+    Args:
+        S (np.ndarray): State of each compressed observation
+        counts (np.ndarray): Number of repetitions of each compressed observation
+
+    Returns:
+        np.ndarray: State of each observation of the original sequence
+    """
+    return np.repeat(S, counts)
+
+
+def build_emissions(chord_ranges):
+    """Builds the emissions of the fingerings, each fingering emits exactly one observation.
+
+    Args:
+        chord_ranges (list): Start and end in the fingerings vocabulary of the fingerings of each observation
+
+    Returns:
+        np.ndarray: Observation emitted by each fingering of the vocabulary
+    """
+    counts = [end - start for start, end in chord_ranges]
+    return np.repeat(np.arange(len(chord_ranges), dtype=np.int32), counts)
@@ -0,0 +1,213 @@
+import itertools
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+from tuttut.logic.graph_utils import *
+from tuttut.logic.validation import get_positions_difficulty
+
+# Lattices and evaluation weights of the current process, set once per worker
+_context = {}
+
+
+class Lattice:
+    """Candidate fingerings of the events of a song, with the features of their transitions.
+
+    The features don't depend on the weights of the difficulty metric, so they are extracted once and the song can be
+    decoded again under many weights. A lattice doesn't keep the fretboard and can be sent to other processes.
+    """
+
+    def __init__(self, V, chord_ranges, fingerings, features, tuning, initial_distribution=None, decoder="segment", beam_width=32,
+                 compress_runs=False):
+        """Constructor for the Lattice object.
+
+        Args:
+            V (list): Sequence of observations, -1 for unplayable ones.
+            chord_ranges (list): Start and end in the fingerings vocabulary of the fingerings of each observation
+            fingerings (list): Fingerings vocabulary
+            features (dict): Features of the fingerings vocabulary (see get_fingering_features)
+            tuning (Tuning): Tuning of the instrument
+            initial_distribution (list, optional): Initial distribution over the fingerings of the first playable
+                observation. Defaults to None.
+            decoder (str, optional): Decoder of the tab, see Tab. Defaults to "segment".
+            beam_width (int, optional): Number of fingerings kept per event by the "beam" decoder. Defaults to 32.
+            compress_runs (bool, optional): Decodes each run of a repeated chord as one event, see Tab. Defaults to False.
+        """
+        self.V = list(V)
+        self.chord_ranges = list(chord_ranges)
+        self.fingerings = [tuple(tuple(position) for position in fingering) for fingering in fingerings]
+        self.tuning = tuning
+        self.initial_distribution = initial_distribution
+        self.decoder = decoder
+        self.beam_width = beam_width
+        self.compress_runs = compress_runs
+
+        if decoder == "viterbi":
+            # Transitions between all the fingerings of the song
+            self.transition_features = compute_transition_features(features, features, tuning)
+        else:
+            # Transitions between the fingerings of each distinct pair of consecutive observations
+            played = [observation for observation in self.V if observation >= 0]
+            self.transition_features = {}
+            for previous_observation, observation in zip(played[:-1], played[1:]):
+                if (previous_observation, observation) not in self.transition_features:
+                    previous_start, previous_end = chord_ranges[previous_observation]
+                    start, end = chord_ranges[observation]
+                    self.transition_features[previous_observation, observation] = compute_transition_features(
+                        {key: value[previous_start:previous_end] for key, value in features.items()},
+                        {key: value[start:end] for key, value in features.items()}, tuning)
+
+    @classmethod
+    def from_tab(cls, tab):
+        """Extracts the lattice of a converted tab.
+
+        Args:
+            tab (Tab): Tab converted from a MIDI
+
+        Returns:
+            Lattice: Lattice of the tab, decoding it with the weights of the tab gives the fingerings of the tab
+        """
+        features = get_fingering_features(tab.fretboard, tab.fingerings_vocabulary)
+        return cls(tab.notes_sequence, tab.chord_ranges, tab.fingerings_vocabulary, features, tab.tuning,
+                   tab.initial_probabilities, tab.decoder, tab.beam_width, tab.compress_runs)
+
+    def decode(self, weights):
+        """Decodes the most likely fingerings under weights of the difficulty metric, with the decoder of the lattice.
+
+        Args:
+            weights (dict): Weights of the difficulty metric
+
+        Returns:
+            np.ndarray: Index in the fingerings vocabulary of the fingering of each observation, -1 if unplayable
+        """
+        if self.compress_runs:
+            V, counts = compress_runs(self.V)
+            return expand_runs(self.decode_observations(V, weights, counts), counts)
+
+        return self.decode_observations(self.V, weights)
+
+    def decode_observations(self, V, weights, counts=None):
+        """Decodes a sequence of observations of the lattice, see decode.
+
+        Args:
+            V (list): Sequence of observations, -1 for unplayable ones.
+            weights (dict): Weights of the difficulty metric
+            counts (list, optional): Number of repetitions of each observation (see compress_runs). Defaults to None.
+
+        Returns:
+            np.ndarray: Index in the fingerings vocabulary of the fingering of each observation, -1 if unplayable
+        """
+        if self.decoder == "viterbi":
+            easiness = compute_transition_easiness(self.transition_features, weights)
+            transition_matrix = easiness / np.sum(easiness, axis=1, keepdims=True)
+            initial_distribution = np.hstack((self.initial_distribution, np.zeros(
+                len(transition_matrix) - len(self.initial_distribution)))) if self.initial_distribution is not None else None
+
+            return viterbi(V, transition_matrix, build_emissions(self.chord_ranges), initial_distribution, counts)
+
+        if self.decoder == "beam":
+            def get_log_rows(previous_observation, previous_fingerings, observation):
+                transition_features = self.transition_features[previous_observation, observation]
+                rows = previous_fingerings - self.chord_ranges[previous_observation][0]
+                # The span only depends on the next fingering, it has a single row
+                easiness = compute_transition_easiness({key: value[rows] if len(value) > 1 else value
+                                                        for key, value in transition_features.items()}, weights)
+                return np.log(easiness / np.sum(easiness, axis=1, keepdims=True))
+
+            return decode_beam(V, self.chord_ranges, get_log_rows, self.initial_distribution, self.beam_width, counts)
+
+        log_blocks = {}
+
+        def get_log_block(previous_observation, observation):
+            if (previous_observation, observation) not in log_blocks:
+                easiness = compute_transition_easiness(self.transition_features[previous_observation, observation], weights)
+                log_blocks[previous_observation, observation] = np.log(easiness / np.sum(easiness, axis=1, keepdims=True))
+
+            return log_blocks[previous_observation, observation]
+
+        return decode_trellis(V, self.chord_ranges, get_log_block, self.initial_distribution, counts)
+
+    def get_positions(self, sequence):
+        """Returns the positions of a decoded sequence, like validation.get_tab_positions for its tab.
+
+        Args:
+            sequence (list): Index in the fingerings vocabulary of the fingering of each observation, -1 if unplayable
+
+        Returns:
+            list: (string, fret) of the notes of each playable event
+        """
+        return [self.fingerings[i] for i in sequence if i >= 0]
+
+    def get_difficulty(self, weights, evaluation_weights):
+        """Decodes the song under weights and measures the difficulty of the result, like validation.get_tab_difficulty.
+
+        Args:
+            weights (dict): Weights of the difficulty metric used to decode
+            evaluation_weights (dict): Weights of the difficulty metric used to measure the result
+
+        Returns:
+            float: Difficulty of the decoded fingerings
+        """
+        return get_positions_difficulty(self.get_positions(self.decode(weights)), evaluation_weights)
+
+
+def get_weights_grid(values):
+    """Returns every combination of the values of the weights, for a grid search.
+
+    Args:
+        values (dict): Values of each weight, ex: {"b": [0.5, 1], "height": [1, 2]}
+
+    Returns:
+        list: One dict of weights per combination
+    """
+    return [dict(zip(values, combination)) for combination in itertools.product(*values.values())]
+
+
+def sample_weights(n, ranges, seed=0):
+    """Draws random weights, uniformly in their ranges, for a random search.
+
+    Args:
+        n (int): Number of weights to draw
+        ranges (dict): Minimum and maximum of each weight, ex: {"b": (0.5, 2), "height": (0, 4)}
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        list: n dicts of weights
+    """
+    rnd = random.Random(seed)
+    return [{key: rnd.uniform(low, high) for key, (low, high) in ranges.items()} for _ in range(n)]
+
+
+def _init_search_worker(lattices, evaluation_weights):
+    _context.update(lattices=lattices, evaluation_weights=evaluation_weights)
+
+
+def _score_weights(weights):
+    """Difficulty of each lattice of the process decoded under weights."""
+    return [lattice.get_difficulty(weights, _context["evaluation_weights"]) for lattice in _context["lattices"]]
+
+
+def search_weights(lattices, candidates, evaluation_weights, workers=None):
+    """Decodes a corpus under each candidate weights and measures the difficulty of the results, on a pool of processes.
+
+    Args:
+        lattices (list): Lattices of the songs of the corpus
+        candidates (list): Weights to try, see get_weights_grid and sample_weights
+        evaluation_weights (dict): Weights of the difficulty metric used to measure the decoded songs
+        workers (int, optional): Number of processes, 1 searches in this process. Defaults to the number of CPUs.
+
+    Returns:
+        list: For each candidate in order, its weights, the difficulty of each song and their total
+    """
+    if workers == 1 or len(candidates) <= 1:
+        _init_search_worker(lattices, evaluation_weights)
+        scores = [_score_weights(weights) for weights in candidates]
+        _context.clear()
+    else:
+        workers = min(workers or os.cpu_count(), len(candidates))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_search_worker,
+                                 initargs=(lattices, evaluation_weights)) as executor:
+            scores = list(executor.map(_score_weights, candidates, chunksize=max(1, len(candidates) // (4 * workers))))
+
+    return [{"weights": weights, "difficulties": difficulties, "difficulty": sum(difficulties)}
+            for weights, difficulties in zip(candidates, scores)]
@@ -1,3 +1,4 @@
+import numpy as np
 import pretty_midi
 import tuttut.logic.theory as theory
 # from app.graph_utils import
@@ -18,7 +19,84 @@ def measure_length_ticks(midi, time_signature):
     return measure_length
 
 
-def get_notes_between(midi, notes, begin, end):
+class TempoMap:
+    """Converts arrays of times to ticks and back, following the tempo changes of a MIDI.
+
+    Gives the same results as pretty_midi's time_to_tick and tick_to_time, one array at a time.
+    """
+
+    def __init__(self, midi):
+        """Constructor for the TempoMap object.
+
+        Args:
+            midi (pretty_midi.PrettyMIDI): MIDI object
+        """
+        self.tick_scales = list(midi._tick_scales)
+        self.tick_to_time = None
+        # Covers the same ticks as the mapping of the MIDI, past which times are extrapolated the same way
+        self._update_tick_to_time(len(midi._PrettyMIDI__tick_to_time) - 1)
+
+    def _update_tick_to_time(self, max_tick):
+        # Same computation as pretty_midi, so that the times are exactly the same
+        max_tick = max(max_tick, max(tick for tick, _ in self.tick_scales))
+        tick_to_time = np.zeros(max_tick + 1)
+        last_end_time = 0
+        for (start_tick, tick_scale), (end_tick, _) in zip(self.tick_scales[:-1], self.tick_scales[1:]):
+            ticks = np.arange(end_tick - start_tick + 1)
+            tick_to_time[start_tick:end_tick + 1] = last_end_time + tick_scale*ticks
+            last_end_time = tick_to_time[end_tick]
+
+        start_tick, tick_scale = self.tick_scales[-1]
+        ticks = np.arange(max_tick + 1 - start_tick)
+        tick_to_time[start_tick:] = last_end_time + tick_scale*ticks
+        self.tick_to_time = tick_to_time
+
+    def ticks_to_times(self, ticks):
+        """Converts ticks to times.
+
+        Args:
+            ticks (array-like): Ticks
+
+        Returns:
+            np.ndarray: Times in seconds
+        """
+        ticks = np.asarray(ticks, dtype=np.int64)
+        if ticks.size > 0 and ticks.max() >= len(self.tick_to_time):
+            self._update_tick_to_time(int(ticks.max()))
+
+        return self.tick_to_time[ticks]
+
+    def times_to_ticks(self, times):
+        """Converts times to the closest ticks.
+
+        Args:
+            times (array-like): Times in seconds
+
+        Returns:
+            np.ndarray: Ticks
+        """
+        times = np.asarray(times, dtype=float)
+        last_tick = len(self.tick_to_time) - 1
+
+        ticks = np.searchsorted(self.tick_to_time, times, side="left")
+        next_ticks = np.minimum(ticks, last_tick)
+        previous_ticks = np.maximum(ticks - 1, 0)
+        # Like pretty_midi, takes the previous tick only if it is strictly closer
+        closer = (ticks > 0) & (np.abs(times - self.tick_to_time[previous_ticks]) <
+                                np.abs(times - self.tick_to_time[next_ticks]))
+        ticks = ticks - closer
+
+        # Past the last tick, extrapolates with the final tempo
+        past_end = ticks > last_tick
+        if np.any(past_end):
+            _, final_tick_scale = self.tick_scales[-1]
+            extrapolated = last_tick + (times[past_end] - self.tick_to_time[-1])/final_tick_scale
+            ticks[past_end] = np.round(extrapolated)
+
+        return ticks
+
+
+def get_notes_between(midi, notes, begin, end, tempo_map=None):
     """Return all notes between two specific timings in a midi file.
 
     Args:
@@ -26,17 +104,16 @@ def get_notes_between(midi, notes, begin, end):
         notes (list): Notes to search in
         begin (int): Timing of the lower bound in ticks
         end (int): Timing of the upper bound in ticks
+        tempo_map (TempoMap, optional): Tempo map of the MIDI. Defaults to a new one.
 
     Returns:
         list: Notes between the lower and upper bounds
     """
-    res = []
-    for note in notes:
-        note_start_ticks = midi.time_to_tick(note.start)
-        if note_start_ticks >= begin and note_start_ticks < end:
-            res.append(note)
+    tempo_map = TempoMap(midi) if tempo_map is None else tempo_map
+    notes_start_ticks = tempo_map.times_to_ticks([note.start for note in notes])
+    between = (notes_start_ticks >= begin) & (notes_start_ticks < end)
 
-    return res
+    return [note for note, is_between in zip(notes, between) if is_between]
 
 
 def get_non_drum(instruments):
@@ -99,15 +176,17 @@ def quantize(midi):
         midi (pretty_midi.PrettyMIDI): MIDI object to quantize
     """
     quantization_factor = 32
+    base = midi.resolution/quantization_factor
+    tempo_map = TempoMap(midi)
 
     for instrument in midi.instruments:
-        quantized_notes = []
-        for note in instrument.notes:
-            rounded = round_to_multiple(midi.time_to_tick(note.start), base=midi.resolution/quantization_factor)
-            quantized_notes.append(pretty_midi.Note(velocity=note.velocity, pitch=note.pitch,
-                                   start=midi.tick_to_time(rounded), end=note.end))
+        ticks = tempo_map.times_to_ticks([note.start for note in instrument.notes])
+        # Same rounding as round_to_multiple
+        rounded = (base * np.round(ticks/base)).astype(np.int64)
+        starts = tempo_map.ticks_to_times(rounded).tolist()
 
-        instrument.notes = quantized_notes
+        instrument.notes = [pretty_midi.Note(velocity=note.velocity, pitch=note.pitch, start=start, end=note.end)
+                            for note, start in zip(instrument.notes, starts)]
 
 
 def transpose_note(note, semitones):
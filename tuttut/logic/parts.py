@@ -0,0 +1,111 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pretty_midi
+from tuttut.logic.fingering_cache import default_fingering_cache
+from tuttut.logic.fretboard import Fretboard
+from tuttut.logic.profiling import Profiler
+from tuttut.logic.tab import Tab
+
+# Song converted by the current process, set once per worker
+_context = {}
+
+
+def get_part_name(midi, index):
+    """Returns the name of the part of an instrument.
+
+    Args:
+        midi (pretty_midi.PrettyMIDI): MIDI object
+        index (int): Index of the instrument in midi.instruments
+
+    Returns:
+        str: Name of the track, or of its General MIDI program if it has none
+    """
+    instrument = midi.instruments[index]
+    name = instrument.name.strip() or pretty_midi.program_to_instrument_name(instrument.program)
+    return f"{index + 1}. {name}"
+
+
+def _init_part_worker(name, midi, tuning, tab_options, fretboard=None, cache=default_fingering_cache):
+    _context.update(name=name, midi=midi, tuning=tuning, tab_options=tab_options)
+    _context["fretboard"] = fretboard if fretboard is not None else Fretboard(tuning, cache=cache)
+
+
+def _init_part_pool_worker(name, midi, tuning, tab_options, use_cache):
+    # The cache of the parent can't be shared, each process fills its own default cache, empty whether the process was
+    # forked or spawned, and returns the new entries
+    default_fingering_cache.clear()
+    _init_part_worker(name, midi, tuning, tab_options, cache=default_fingering_cache if use_cache else None)
+    _context["cached_keys"] = set() if use_cache else None
+
+
+def _tab_part(index, profile=False):
+    """Tabs one instrument of the song of the process, returns what is needed to rebuild its tab and the entries it
+    added to the fingering cache of a pool process."""
+    profiler = Profiler() if profile else None
+    tab = Tab(f"{_context['name']} - {get_part_name(_context['midi'], index)}", _context["tuning"], _context["midi"],
+              fretboard=_context["fretboard"], profiler=profiler, instruments=[index], **_context["tab_options"])
+
+    new_entries = []
+    if _context.get("cached_keys") is not None:
+        new_entries = [(key, value) for key, value in default_fingering_cache.items() if key not in _context["cached_keys"]]
+        _context["cached_keys"].update(key for key, _ in new_entries)
+
+    return tab.get_metadata(), tab.tab["measures"], profiler.stages if profiler is not None else None, new_entries
+
+
+def tab_parts(name, midi, tuning, workers=None, fretboard=None, profile=False, **tab_options):
+    """Tabs each non-drum instrument of a MIDI separately, on a pool of processes.
+
+    Every part keeps the measures of the whole song. Instruments with no notes are skipped.
+
+    Args:
+        name (str): Name of the song
+        midi (pretty_midi.PrettyMIDI): MIDI object
+        tuning (Tuning): Tuning of the instrument
+        workers (int, optional): Number of processes, 1 tabs the parts in this process. Defaults to the number of CPUs.
+        fretboard (Fretboard, optional): Fretboard of the tuning, used when tabbing in this process. Defaults to a new one.
+        profile (bool, optional): Measures the stages of each part, reported by the profiler of its tab. Defaults to False.
+        **tab_options: Arguments of the Tab of each part. fingering_cache (shared by default, None disables it) is
+            the cache of the fretboard, the fingerings found by the other processes are added to it.
+
+    Returns:
+        list: One Tab per part, in the order of the instruments
+    """
+    indices = [i for i, instrument in enumerate(midi.instruments) if not instrument.is_drum and len(instrument.notes) > 0]
+    cache = tab_options.pop("fingering_cache", default_fingering_cache)
+
+    if workers == 1 or len(indices) <= 1:
+        _init_part_worker(name, midi, tuning, tab_options, fretboard, cache)
+        results = [_tab_part(index, profile) for index in indices]
+        _context.clear()
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count(), len(indices)), initializer=_init_part_pool_worker,
+                                 initargs=(name, midi, tuning, tab_options, cache is not None)) as executor:
+            results = list(executor.map(_tab_part, indices, [profile] * len(indices)))
+
+    tabs = []
+    for metadata, measures, stages, new_entries in results:
+        if cache is not None:
+            cache.update(new_entries)
+        tab = Tab.from_measures(metadata, measures)
+        if stages is not None:
+            tab.profiler = Profiler()
+            tab.profiler.stages = stages
+        tabs.append(tab)
+
+    return tabs
+
+
+def write_parts(tabs, output_file, split_by=6):
+    """Writes the ascii tabs of several parts to one text file, each one under its name.
+
+    Args:
+        tabs (list): Tabs of the parts
+        output_file (Path): Text file
+        split_by (int, optional): Number of measures per line. Defaults to 6.
+    """
+    with open(output_file, "w") as file:
+        for tab in tabs:
+            file.write(f"{tab.name}\n\n")
+            tab.write_ascii(file, split_by)
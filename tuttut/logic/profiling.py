@@ -0,0 +1,82 @@
+import tracemalloc
+from contextlib import contextmanager
+from time import perf_counter
+
+
+class Profiler:
+    """Measures the wall time, peak memory and counts of the stages of a conversion.
+
+    Stages can be nested (to_ascii calls to_string), each one reports its own peak memory.
+    """
+
+    def __init__(self, callback=None, trace_memory=True):
+        """Constructor for the Profiler object.
+
+        Args:
+            callback (function, optional): Called with the report of each stage when it ends. Defaults to None.
+            trace_memory (bool, optional): Measures the peak memory of the stages with tracemalloc, which slows down
+                the conversion. Defaults to True.
+        """
+        self.callback = callback
+        self.trace_memory = trace_memory
+        self.stages = []
+        self._stack = []
+        self._started_tracing = False
+
+    @contextmanager
+    def stage(self, name):
+        """Measures a stage.
+
+        Args:
+            name (str): Name of the stage
+
+        Yields:
+            dict: Counts of the stage, filled by the measured code
+        """
+        counts = {}
+        frame = {"peak": 0, "memory": 0}
+
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            if self._stack:
+                # The peak of the parent stage so far, before resetting it for this stage
+                self._stack[-1]["peak"] = max(self._stack[-1]["peak"], tracemalloc.get_traced_memory()[1])
+            frame["memory"] = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+
+        self._stack.append(frame)
+        start = perf_counter()
+        try:
+            yield counts
+        finally:
+            elapsed = perf_counter() - start
+            self._stack.pop()
+
+            peak_memory = None
+            if self.trace_memory:
+                peak = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+                peak_memory = peak - frame["memory"]
+                if self._stack:
+                    self._stack[-1]["peak"] = max(self._stack[-1]["peak"], peak)
+                elif self._started_tracing:
+                    tracemalloc.stop()
+                    self._started_tracing = False
+
+            report = {"stage": name, "depth": len(self._stack), "time": elapsed, "peak_memory": peak_memory, "counts": counts}
+            self.stages.append(report)
+            if self.callback is not None:
+                self.callback(report)
+
+    def report(self):
+        """Returns the report of the measured stages.
+
+        Returns:
+            dict: Stages in the order they ended (name, nesting depth, time in seconds, peak memory in bytes, counts),
+                and the total time of the outermost stages
+        """
+        return {
+            "stages": list(self.stages),
+            "time": sum(stage["time"] for stage in self.stages if stage["depth"] == 0)
+        }
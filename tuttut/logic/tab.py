@@ -1,14 +1,18 @@
 import traceback
 import numpy as np
+from pretty_midi import note_name_to_number, note_number_to_name
 from pretty_midi.containers import TimeSignature
-from tuttut.logic.theory import Measure, Note
+from tuttut.logic.theory import Diatonic, Measure, Note, Tuning
 from tuttut.logic.fretboard import Fretboard
+from tuttut.logic.fingering_cache import default_fingering_cache
+from tuttut.logic.arrangement import Arrangement
 from tuttut.logic.midi_utils import *
 from tuttut.logic.graph_utils import *
-import networkx as nx
+from tuttut.logic.lattice import Lattice
 import json
 import os
-import functools
+import itertools
+from contextlib import nullcontext
 from pathlib import Path
 from time import time
 
@@ -16,14 +20,44 @@ from time import time
 class Tab:
     """Tab object."""
 
-    def __init__(self, name, tuning, midi, output_file=None, weights=None):
+    decoders = ["viterbi", "segment", "beam"]
+
+    def __init__(self, name, tuning, midi, output_file=None, weights=None, fingering_cache=default_fingering_cache, decoder="viterbi", fretboard=None, beam_width=32, profiler=None, instruments=None, compress_runs=False, workers=1, reduce_chords=True, max_candidates=None, max_difficulty_ratio=None):
         """Constructor for the Tab object.
 
         Args:
             name (string): Name of the tab
             tuning (Tuning): Tuning of the instrument for the tab
             midi (pretty_midi.PrettyMIDI): The MIDI we're trying to convert to tab
+            fingering_cache (FingeringCache, optional): Cache of the fingerings, shared between tabs by default. None disables it.
+            decoder (str, optional): "viterbi" decodes with a transition matrix over all the fingerings of the song,
+                "segment" only between the fingerings of consecutive events, "beam" keeps the beam_width most likely
+                fingerings of each event. Defaults to "viterbi".
+            fretboard (Fretboard, optional): Fretboard of the tuning, to reuse it between tabs. Defaults to a new one.
+            beam_width (int, optional): Number of fingerings kept per event by the "beam" decoder. Defaults to 32.
+            profiler (Profiler, optional): Measures the stages of the conversion and of the exports. Defaults to None.
+            instruments (list, optional): Indices in midi.instruments of the instruments to tab. Defaults to all the
+                non-drum instruments.
+            compress_runs (bool, optional): Decodes each run of a repeated chord as one event that keeps its fingering,
+                faster on songs with repeated chords. The decoders may otherwise change the fingering within a run.
+                Defaults to False.
+            workers (int, optional): Maximum number of processes enumerating the fingerings of the chords of the song,
+                None uses the number of CPUs. Songs with few chords are enumerated in this process (see
+                Fretboard.get_chords_fingerings). Defaults to 1.
+            reduce_chords (bool, optional): Plays the largest playable subset of the chords that can't be played, dropping
+                inner voices first (see Fretboard.reduce_chord), instead of leaving their events empty. Defaults to True.
+            max_candidates (int, optional): Number of easiest fingerings of each chord kept for decoding, which caps the
+                number of states of each event. Defaults to None, keeping them all.
+            max_difficulty_ratio (float, optional): Leaves out the fingerings of each chord more than this ratio harder
+                than its easiest one. Defaults to None, keeping them all.
         """
+        if decoder not in self.decoders:
+            raise ValueError(f"Unknown decoder {decoder}, expected one of {self.decoders}")
+        if max_candidates is not None and max_candidates < 1:
+            raise ValueError(f"max_candidates must be at least 1, got {max_candidates}")
+        if max_difficulty_ratio is not None and max_difficulty_ratio < 1:
+            raise ValueError(f"max_difficulty_ratio must be at least 1, got {max_difficulty_ratio}")
+
         # quantize(midi)
 
         self.name = name
@@ -33,25 +67,58 @@ class Tab:
         self.nstrings = len(tuning.strings)
         self.measures = []
         self.midi = midi
-        self.fretboard = Fretboard(tuning)
+        self.fretboard = fretboard if fretboard is not None else Fretboard(tuning, cache=fingering_cache)
         self.weights = {"b": 1, "height": 1, "length": 1, "n_changed_strings": 1} if weights is None else weights
-        self.timeline = self.build_timeline()
-        self.output_file = output_file
+        self.profiler = profiler
+        self.instruments = [midi.instruments[i] for i in instruments] if instruments is not None else get_non_drum(midi.instruments)
+
+        with self.stage("build_timeline") as counts:
+            self.tempo_map = TempoMap(midi)
+            self.timeline = self.build_timeline()
+            # Ticks of the timeline and their events, sorted by tick
+            self.event_ticks = sorted(self.timeline)
+            self.events = [self.timeline[tick] for tick in self.event_ticks]
+            self.event_times = self.tempo_map.ticks_to_times(self.event_ticks).tolist()
+            counts["instruments"] = len(self.instruments)
+            counts["notes"] = sum(len(event.get("notes", [])) for event in self.events)
+            counts["events"] = len(self.events)
 
-        self.populate()
+        self.output_file = output_file
+        self.decoder = decoder
+        self.beam_width = beam_width
+        self.compress_runs = compress_runs
+        self.workers = workers
+        self.reduce_chords = reduce_chords
+        self.max_candidates = max_candidates
+        self.max_difficulty_ratio = max_difficulty_ratio
+
+        with self.stage("populate") as counts:
+            self.populate()
+            counts["measures"] = len(self.measures)
 
         self.tab = self.gen_tab()
 
+    def stage(self, name):
+        """Measures a stage of the conversion with the profiler, if any.
+
+        Args:
+            name (str): Name of the stage
+
+        Returns:
+            contextmanager: Context of the stage, yielding its counts
+        """
+        return self.profiler.stage(name) if self.profiler is not None else nullcontext({})
+
     def populate(self):
         """Populates tab with Measures."""
+        time_sig_times = [time_signature.time for time_signature in self.time_signatures] + [self.midi.get_end_time()]
+        time_sig_ticks = self.tempo_map.times_to_ticks(time_sig_times).tolist()
+
         for i, time_signature in enumerate(self.time_signatures):
             measure_length_in_ticks = measure_length_ticks(self.midi, time_signature)
 
-            time_sig_start = self.midi.time_to_tick(time_signature.time)
-
-            time_sig_end = self.time_signatures[i +
-                                                1].time if i < len(self.time_signatures)-1 else self.midi.get_end_time()
-            time_sig_end = self.midi.time_to_tick(time_sig_end)
+            time_sig_start = time_sig_ticks[i]
+            time_sig_end = time_sig_ticks[i + 1]
 
             # List of all the measure start ticks (ex : [0, 1024, 2048])
             measure_ticks = np.arange(time_sig_start, time_sig_end, measure_length_in_ticks)
@@ -62,26 +129,19 @@ class Tab:
 
     def build_timeline(self):
         timeline = defaultdict(dict)
-        non_drum_instruments = get_non_drum(self.midi.instruments)
-
-        # Notes
-        for instrument in non_drum_instruments:
-            notes = instrument.notes
-            notes.sort(key=lambda x: x.start)
-
-            assert [note.start for note in notes] == sorted([note.start for note in notes])  # Are notes sorted by time
+        # Notes of all the instruments, merged by start time. The sort is stable, so notes starting together
+        # keep the order of their instruments
+        notes = [note for instrument in self.instruments for note in instrument.notes]
+        starts = np.fromiter((note.start for note in notes), dtype=float, count=len(notes))
+        order = np.argsort(starts, kind="stable")
+        notes_ticks = self.tempo_map.times_to_ticks(starts[order])
 
-            for note in notes:
-                note_tick = self.midi.time_to_tick(note.start)
-
-                if "notes" in timeline[note_tick]:
-                    timeline[note_tick]["notes"].append(note)
-                else:
-                    timeline[note_tick]["notes"] = [note]
+        for note_tick, inote in zip(notes_ticks.tolist(), order.tolist()):
+            timeline[note_tick].setdefault("notes", []).append(notes[inote])
 
         # Time signatures
-        for time_signature in self.time_signatures:
-            time_signature_tick = self.midi.time_to_tick(time_signature.time)
+        time_signatures_ticks = self.tempo_map.times_to_ticks([ts.time for ts in self.time_signatures])
+        for time_signature_tick, time_signature in zip(time_signatures_ticks.tolist(), self.time_signatures):
             timeline[time_signature_tick]["time_signature"] = time_signature
 
         return timeline
@@ -95,76 +155,152 @@ class Tab:
 
         tab["measures"] = []
 
-        notes_vocabulary = []
         notes_sequence = []
 
         fingerings_vocabulary = []
+        chord_ranges = []  # Start and end of the fingerings of each playable chord in fingerings_vocabulary
 
-        emission_matrix = np.array([])
         initial_probabilities = None
 
-        for measure in self.measures:
-            res_measure = {"events": []}
-
-            measure_events = measure.timeline
-
-            for event_tick, event_types in measure_events.items():
-                event = {
-                    "time": self.midi.tick_to_time(int(event_tick)),
-                    "time_ticks": int(event_tick),
-                    "measure_timing": (event_tick - measure.measure_start)/measure.duration_ticks
-                }
-
-                if "time_signature" in event_types:
-                    ts = event_types["time_signature"]
-                    event["time_signature_change"] = [ts.numerator, ts.denominator]
-
-                if "notes" in event_types:  # if notes contains one or more notes at a specific timing
-                    event["notes"] = []  # Signals there are notes in this event
-
-                    notes = event_types["notes"]
-
-                    notes_pitches = tuple(set([note.pitch for note in notes]))
-                    notes = [Note(pitch) for pitch in notes_pitches]
-
-                    notes = self.fretboard.fix_oob_notes(notes, preserve_highest_note=False)
-
-                    note_options = self.fretboard.get_note_options(notes)
-
-                    if notes_pitches not in notes_vocabulary:
-                        fingering_options = self.fretboard.get_possible_fingerings(note_options)
-
-                        if len(fingering_options) > 0:
-                            notes_vocabulary.append(notes_pitches)
-
-                            fingerings_vocabulary += fingering_options
-
-                            if initial_probabilities is None:
-                                isolated_difficulties = [compute_isolated_path_difficulty(
-                                    self.fretboard.G, path, self.tuning) for path in fingering_options]
-                                initial_probabilities = difficulties_to_probabilities(isolated_difficulties)
-
-                            emission_matrix = expand_emission_matrix(emission_matrix, fingering_options)
-
-                    if notes_pitches in notes_vocabulary:
-                        notes_sequence.append(notes_vocabulary.index(notes_pitches))
-                    else:
-                        notes_sequence.append(-1)
-
-                res_measure["events"].append(event)
-
-            tab["measures"].append(res_measure)
-
-        transition_matrix = build_transition_matrix(self.fretboard.G, fingerings_vocabulary, self.weights, self.tuning)
-
-        initial_probabilities = np.hstack((initial_probabilities, np.zeros(
-            len(transition_matrix) - len(initial_probabilities))))
-
-        sequence_indices = viterbi(notes_sequence, transition_matrix, emission_matrix, initial_probabilities)
+        cache_stats = self.fretboard.cache.stats() if self.fretboard.cache is not None else None
+
+        with self.stage("fingerings") as counts:
+            # Chord of each event with notes, folded into the range of the tuning
+            note_events = [ievent for ievent, event_types in enumerate(self.events) if "notes" in event_types]
+            arrangement = Arrangement([self.events[ievent]["notes"] for ievent in note_events], self.tuning)
+            event_chords = dict(zip(note_events, arrangement.fit_notes_to_tuning().tolist()))
+
+            chords_fingerings = self.fretboard.get_chords_fingerings(
+                [[Note(pitch) for pitch in chord] for chord in arrangement.chords], workers=self.workers)
+
+            # Index of each chord in chord_ranges, -1 if it can't be played. Chords reduced to the same notes share it
+            observations = []
+            played_chords = {}
+            reduced_chords = set()
+            pruned_fingerings = 0
+            pruned_chords = 0
+            for chord, fingering_options in zip(arrangement.chords, chords_fingerings):
+                if len(fingering_options) == 0 and self.reduce_chords:
+                    notes, fingering_options = self.fretboard.reduce_chord([Note(pitch) for pitch in chord])
+                    if len(notes) > 0:
+                        reduced_chords.add(len(observations))
+                        chord = tuple(note.pitch for note in notes)
+
+                if len(fingering_options) == 0:
+                    observations.append(-1)
+                    continue
 
-        final_sequence = np.array(fingerings_vocabulary, dtype=object)[sequence_indices]
+                if chord in played_chords:
+                    observations.append(played_chords[chord])
+                    continue
 
-        tab = self.populate_tab_notes(tab, final_sequence)
+                if self.max_candidates is not None or self.max_difficulty_ratio is not None:
+                    isolated_difficulties = [compute_isolated_path_difficulty(
+                        self.fretboard, path, self.tuning) for path in fingering_options]
+                    kept = prune_fingerings(isolated_difficulties, self.max_candidates, self.max_difficulty_ratio)
+                    if len(kept) < len(fingering_options):
+                        pruned_fingerings += len(fingering_options) - len(kept)
+                        pruned_chords += 1
+                        fingering_options = [fingering_options[i] for i in kept.tolist()]
+
+                played_chords[chord] = len(chord_ranges)
+                observations.append(len(chord_ranges))
+                chord_ranges.append((len(fingerings_vocabulary), len(fingerings_vocabulary) + len(fingering_options)))
+                fingerings_vocabulary += fingering_options
+
+                if initial_probabilities is None:
+                    isolated_difficulties = [compute_isolated_path_difficulty(
+                        self.fretboard, path, self.tuning) for path in fingering_options]
+                    initial_probabilities = difficulties_to_probabilities(isolated_difficulties)
+
+            for measure in self.measures:
+                res_measure = {"events": []}
+
+                for ievent, (event_tick, event_types) in enumerate(measure.events, measure.event_start):
+                    event = {
+                        "time": self.event_times[ievent],
+                        "time_ticks": int(event_tick),
+                        "measure_timing": (event_tick - measure.measure_start)/measure.duration_ticks
+                    }
+
+                    if "time_signature" in event_types:
+                        ts = event_types["time_signature"]
+                        event["time_signature_change"] = [ts.numerator, ts.denominator]
+
+                    if "notes" in event_types:  # if notes contains one or more notes at a specific timing
+                        event["notes"] = []  # Signals there are notes in this event
+                        notes_sequence.append(observations[event_chords[ievent]])
+
+                    res_measure["events"].append(event)
+
+                tab["measures"].append(res_measure)
+
+            candidates = [chord_ranges[observation][1] - chord_ranges[observation][0] for observation in notes_sequence if observation >= 0]
+            counts["events"] = len(self.events)
+            counts["note_events"] = len(notes_sequence)
+            counts["unplayable_events"] = notes_sequence.count(-1)
+            counts["chords"] = len(chord_ranges)
+            counts["reduced_chords"] = len(reduced_chords)
+            counts["reduced_events"] = sum(event_chord in reduced_chords for event_chord in event_chords.values())
+            counts["pruned_chords"] = pruned_chords
+            counts["pruned_fingerings"] = pruned_fingerings
+            counts["fingerings"] = len(fingerings_vocabulary)
+            counts["mean_candidates_per_event"] = float(np.mean(candidates)) if candidates else 0.0
+            counts["max_candidates_per_event"] = max(candidates, default=0)
+            if cache_stats is not None:
+                new_cache_stats = self.fretboard.cache.stats()
+                counts["cache_hits"] = new_cache_stats["hits"] - cache_stats["hits"]
+                counts["cache_misses"] = new_cache_stats["misses"] - cache_stats["misses"]
+
+        # Kept to decode the song again under other weights (see rescore)
+        self.notes_sequence = notes_sequence
+        self.chord_ranges = chord_ranges
+        self.fingerings_vocabulary = fingerings_vocabulary
+        self.initial_probabilities = initial_probabilities
+
+        V, runs = compress_runs(notes_sequence) if self.compress_runs else (notes_sequence, None)
+
+        if self.decoder in ["segment", "beam"]:
+            with self.stage("features") as counts:
+                features = get_fingering_features(self.fretboard, fingerings_vocabulary)
+                counts["fingerings"] = len(fingerings_vocabulary)
+
+            with self.stage("decoding") as counts:
+                if self.decoder == "segment":
+                    sequence_indices = segment_viterbi(V, chord_ranges, features, self.weights, self.tuning,
+                                                       initial_probabilities, counts=runs)
+                else:
+                    sequence_indices = beam_viterbi(V, chord_ranges, features, self.weights, self.tuning,
+                                                    initial_probabilities, beam_width=self.beam_width, counts=runs)
+                counts["decoder"] = self.decoder
+                counts["observations"] = len(notes_sequence)
+                counts["decoded_observations"] = len(V)
+        else:
+            with self.stage("transition_matrix") as counts:
+                transition_matrix = build_transition_matrix(self.fretboard, fingerings_vocabulary, self.weights, self.tuning)
+                counts["fingerings"] = len(fingerings_vocabulary)
+                counts["matrix_bytes"] = transition_matrix.nbytes
+
+            with self.stage("emissions") as counts:
+                emissions = build_emissions(chord_ranges)
+                counts["states"] = len(emissions)
+
+            with self.stage("decoding") as counts:
+                sequence_indices = viterbi(V, transition_matrix, emissions, np.hstack((
+                    initial_probabilities, np.zeros(len(transition_matrix) - len(initial_probabilities)))), counts=runs)
+                counts["decoder"] = self.decoder
+                counts["observations"] = len(notes_sequence)
+                counts["decoded_observations"] = len(V)
+
+        if runs is not None:
+            sequence_indices = expand_runs(sequence_indices, runs)
+
+        # Unplayable events (-1) have no notes
+        final_sequence = [fingerings_vocabulary[i] if i >= 0 else () for i in sequence_indices]
+
+        with self.stage("populate_tab_notes") as counts:
+            tab = self.populate_tab_notes(tab, final_sequence)
+            counts["notes"] = sum(len(fingering) for fingering in final_sequence)
 
         return tab
 
@@ -184,11 +320,12 @@ class Tab:
                 if "notes" not in event:
                     continue
 
-                for path_note in sequence[ievent]:
-                    string, fret = self.fretboard.G.nodes[path_note]["pos"]
+                for position in sequence[ievent]:
+                    string, fret = self.fretboard.get_pos(position)
+                    note = self.fretboard.get_note(position)
                     event["notes"].append({
-                        "degree": path_note.degree,
-                        "octave": path_note.octave,
+                        "degree": note.degree,
+                        "octave": note.octave,
                         "string": string,
                         "fret": fret
                     })
@@ -196,84 +333,294 @@ class Tab:
 
         return tab
 
-    def to_string(self):
-        """Generates the text for the ascii tabs.
+    def rescore(self, weights, lattice=None):
+        """Decodes the fingerings of the song again under other weights, without computing the fingerings and their
+        features again.
+
+        Args:
+            weights (dict): Weights of the difficulty metric
+            lattice (Lattice, optional): Lattice of the tab, to reuse it between calls. Defaults to a new one.
 
         Returns:
-            list: List containing tab text for each guitar string
+            dict: The tab with the fingerings decoded under the weights, the same as converting the song with them.
+                self.tab is left untouched.
         """
-        res = []
-        for string in self.tuning.strings:
-            res.append("")
+        lattice = lattice if lattice is not None else Lattice.from_tab(self)
+        sequence_indices = lattice.decode(weights)
+
+        tab = {"tuning": self.tab["tuning"], "measures": []}
         for measure in self.tab["measures"]:
-            events = [event for event in measure["events"] if "notes" in event]
-            if len(events) == 0:
-                for istring in range(self.nstrings):
-                    res[istring] += "-" * 16
+            events = [{**event, "notes": []} if "notes" in event else dict(event) for event in measure["events"]]
+            tab["measures"].append({"events": events})
 
-                for istring in range(self.nstrings):
-                    res[istring] += "|"
-                continue
+        return self.populate_tab_notes(tab, [self.fingerings_vocabulary[i] if i >= 0 else () for i in sequence_indices])
 
-            for ievent, event in enumerate(events):
-                if ievent == 0:
-                    next_event_timing = event["measure_timing"]
-                    dashes_to_add = round((next_event_timing - 0) * 16)
-                    for istring in range(self.nstrings):
-                        res[istring] += "-" * dashes_to_add
+    def render_measure(self, measure):
+        """Generates the text of a measure, without its bar lines.
 
-                next_event_timing = events[ievent + 1]["measure_timing"] if ievent < (len(events) - 1) else 1.0
-                dashes_to_add = round((next_event_timing - event["measure_timing"]) * 16)
+        Each event is a column as wide as its longest fret, followed by dashes up to the next event.
+
+        Args:
+            measure (dict): Measure of the tab
+
+        Returns:
+            list: Text of the measure for each guitar string, all of the same length
+        """
+        events = [event for event in measure["events"] if "notes" in event]
+        if len(events) == 0:
+            return ["-" * 16] * self.nstrings
 
-                for note in event["notes"]:
-                    string, fret = note["string"], note["fret"]
-                    res[string] += str(fret)
-                if dashes_to_add:
-                    dashes_to_add -= 1
+        cells = [["-" * round(events[0]["measure_timing"] * 16)] for _ in range(self.nstrings)]
 
-                res = fill_measure_str(res)
+        for ievent, event in enumerate(events):
+            next_event_timing = events[ievent + 1]["measure_timing"] if ievent < (len(events) - 1) else 1.0
+            dashes_to_add = round((next_event_timing - event["measure_timing"]) * 16)
+            # The frets take the place of one dash
+            dashes = "-" * (dashes_to_add - 1) if dashes_to_add else ""
 
-                if dashes_to_add:
-                    for istring in range(self.nstrings):
-                        res[istring] += "-" * dashes_to_add
+            frets = {}
+            for note in event["notes"]:
+                frets[note["string"]] = frets.get(note["string"], "") + str(note["fret"])
+            width = max((len(fret) for fret in frets.values()), default=0)
 
             for istring in range(self.nstrings):
-                res[istring] += "|"
+                cells[istring].append(frets.get(istring, "").ljust(width, "-"))
+                cells[istring].append(dashes)
+
+        return ["".join(string_cells) for string_cells in cells]
+
+    def to_string(self):
+        """Generates the text for the ascii tabs.
+
+        Returns:
+            list: List containing tab text for each guitar string
+        """
+        with self.stage("to_string") as counts:
+            measures = [self.render_measure(measure) for measure in self.tab["measures"]]
+            res = ["".join(f"{measure[istring]}|" for measure in measures) for istring in range(self.nstrings)]
+            counts["characters"] = sum(len(string) for string in res)
 
         return res
 
-    def to_json(self):
-        """Exports the tab to a json file."""
+    def to_json(self, path=None):
+        """Exports the tab to a json file.
+
+        Args:
+            path (Path, optional): JSON file. Defaults to the name of the tab in the json directory.
+        """
         if self.tab is None:
             return
 
         json_object = json.dumps(self.tab, indent=4)
 
-        with open(os.path.join("json", self.name + ".json"), "w") as outfile:
+        path = os.path.join("json", self.name + ".json") if path is None else path
+        with open(path, "w") as outfile:
             outfile.write(json_object)
 
+    def get_metadata(self):
+        """Returns what is needed to rebuild the tab besides its measures.
+
+        Returns:
+            dict: Name of the tab, pitches of the strings, diatonic mode and number of frets of the tuning
+        """
+        return {
+            "name": self.name,
+            "tuning": [int(string.pitch) for string in self.tuning.strings],
+            "diatonic": bool(self.tuning.diatonic),
+            "mode": int(self.tuning.mode),
+            "nfrets": int(self.tuning.nfrets)
+        }
+
+    def to_jsonl(self, path):
+        """Exports the tab to a JSON lines file, written and read one measure at a time.
+
+        The first line holds the metadata of the tab (see get_metadata), each next line a measure.
+
+        Args:
+            path (Path): JSON lines file
+        """
+        if self.tab is None:
+            return
+
+        with open(path, "w") as file:
+            file.write(json.dumps(self.get_metadata()) + "\n")
+            for measure in self.tab["measures"]:
+                file.write(json.dumps(measure) + "\n")
+
+    def to_columns(self):
+        """Returns the measures of the tab as flat arrays.
+
+        Measures are ranges of events, and notes refer to their event by tick (ticks of events are unique).
+
+        Returns:
+            dict: Arrays of the events (tick, time, measure timing, whether it has notes, time signature change
+                or 0, 0) and of the notes (tick, string, fret, pitch), and start of the events of each measure
+        """
+        measures = self.tab["measures"]
+        events = [event for measure in measures for event in measure["events"]]
+        notes = [(event["time_ticks"], note) for event in events for note in event.get("notes", [])]
+
+        return {
+            "measure_event_offsets": np.cumsum([0] + [len(measure["events"]) for measure in measures], dtype=np.int64),
+            "event_tick": np.array([event["time_ticks"] for event in events], dtype=np.int64),
+            "event_time": np.array([event["time"] for event in events], dtype=np.float64),
+            "event_measure_timing": np.array([event["measure_timing"] for event in events], dtype=np.float64),
+            "event_has_notes": np.array(["notes" in event for event in events], dtype=bool),
+            "event_time_signature": np.array([event.get("time_signature_change", (0, 0)) for event in events],
+                                             dtype=np.int16).reshape(-1, 2),
+            "note_tick": np.array([tick for tick, _ in notes], dtype=np.int64),
+            "note_string": np.array([note["string"] for _, note in notes], dtype=np.int8),
+            "note_fret": np.array([note["fret"] for _, note in notes], dtype=np.int16),
+            "note_pitch": np.array([note_name_to_number(note["degree"] + note["octave"]) for _, note in notes], dtype=np.int16)
+        }
+
+    def to_npz(self, path):
+        """Exports the tab to a compressed numpy file of flat arrays (see to_columns).
+
+        Args:
+            path (Path): npz file
+        """
+        if self.tab is None:
+            return
+
+        with open(path, "wb") as file:
+            np.savez_compressed(file, metadata=np.array(json.dumps(self.get_metadata())), **self.to_columns())
+
+    @staticmethod
+    def measures_from_columns(columns):
+        """Rebuilds the measures of a tab from flat arrays (see to_columns).
+
+        Args:
+            columns (dict): Arrays of the measures, events and notes
+
+        Returns:
+            list: Measures of the tab
+        """
+        event_ticks = columns["event_tick"].tolist()
+        times = columns["event_time"].tolist()
+        measure_timings = columns["event_measure_timing"].tolist()
+        has_notes = columns["event_has_notes"].tolist()
+        time_signatures = columns["event_time_signature"].tolist()
+
+        # Notes of each event, in the order of the notes
+        note_events = np.searchsorted(columns["event_tick"], columns["note_tick"])
+        note_offsets = np.searchsorted(note_events, np.arange(len(event_ticks) + 1)).tolist()
+        names = {pitch: (Note(pitch).degree, Note(pitch).octave) for pitch in set(columns["note_pitch"].tolist())}
+        notes = [{"degree": names[pitch][0], "octave": names[pitch][1], "string": string, "fret": fret}
+                 for pitch, string, fret in zip(columns["note_pitch"].tolist(), columns["note_string"].tolist(),
+                                                columns["note_fret"].tolist())]
+
+        events = []
+        for ievent, tick in enumerate(event_ticks):
+            event = {"time": times[ievent], "time_ticks": tick, "measure_timing": measure_timings[ievent]}
+            if time_signatures[ievent] != [0, 0]:
+                event["time_signature_change"] = time_signatures[ievent]
+            if has_notes[ievent]:
+                event["notes"] = notes[note_offsets[ievent]:note_offsets[ievent + 1]]
+            events.append(event)
+
+        offsets = columns["measure_event_offsets"].tolist()
+        return [{"events": events[start:end]} for start, end in zip(offsets[:-1], offsets[1:])]
+
+    @classmethod
+    def from_measures(cls, metadata, measures, output_file=None):
+        """Rebuilds a tab from its measures, without converting a MIDI.
+
+        The tab can be exported and rendered, but not converted again.
+
+        Args:
+            metadata (dict): Metadata of the tab (see get_metadata)
+            measures (list): Measures of the tab
+            output_file (Path, optional): Text file of to_ascii. Defaults to None.
+
+        Returns:
+            Tab: The tab
+        """
+        tuning = Tuning(strings=[note_number_to_name(pitch) for pitch in metadata["tuning"]],
+                        diatonic=(metadata.get("diatonic", False), Diatonic.Modes(metadata.get("mode", 0))))
+        tuning.nfrets = metadata.get("nfrets", tuning.nfrets)
+
+        tab = cls.__new__(cls)
+        tab.name = metadata["name"]
+        tab.tuning = tuning
+        tab.nstrings = len(tuning.strings)
+        tab.output_file = output_file
+        tab.profiler = None
+        tab.tab = {"tuning": list(metadata["tuning"]), "measures": measures}
+        return tab
+
+    def save(self, path):
+        """Exports the tab with to_npz, to_jsonl or to_json, depending on the suffix of the file.
+
+        Args:
+            path (Path): npz, JSON lines or JSON file
+        """
+        exports = {".npz": self.to_npz, ".jsonl": self.to_jsonl, ".json": self.to_json}
+        suffix = Path(path).suffix
+        if suffix not in exports:
+            raise ValueError(f"Unknown tab format {suffix}, expected one of {list(exports)}")
+        exports[suffix](path)
+
+    @classmethod
+    def load(cls, path, output_file=None):
+        """Loads a tab exported with to_npz, to_jsonl or to_json.
+
+        Args:
+            path (Path): npz, JSON lines or JSON file
+            output_file (Path, optional): Text file of to_ascii. Defaults to None.
+
+        Returns:
+            Tab: The tab, that can be exported and rendered
+        """
+        path = Path(path)
+        if path.suffix == ".npz":
+            with np.load(path, allow_pickle=False) as data:
+                metadata = json.loads(str(data["metadata"]))
+                measures = cls.measures_from_columns({key: data[key] for key in data.files if key != "metadata"})
+        elif path.suffix == ".jsonl":
+            with open(path) as file:
+                metadata = json.loads(file.readline())
+                measures = [json.loads(line) for line in file if line.strip()]
+        else:
+            with open(path) as file:
+                tab = json.load(file)
+            metadata = {"name": path.stem, "tuning": tab["tuning"]}
+            measures = tab["measures"]
+
+        return cls.from_measures(metadata, measures, output_file)
+
+    def write_ascii(self, file, split_by=6):
+        """Writes the ascii tab to an open text file.
+
+        Args:
+            file (TextIO): Text file
+            split_by (int, optional): Number of measures per line. Defaults to 6.
+
+        Returns:
+            int: Number of lines written
+        """
+        headers = [f"{string.degree}||" if len(string.degree) > 1 else f"{string.degree} ||" for string in self.tuning.strings]
+        # Measures are rendered while writing, the last line of bars ends with an empty one
+        bars = itertools.chain(map(self.render_measure, self.tab["measures"]), [[""] * self.nstrings])
+
+        nlines = 0
+        while line_bars := list(itertools.islice(bars, split_by)):
+            for istring, header in enumerate(headers):
+                file.write(f"{header}|{'|'.join(bar[istring] for bar in line_bars)}|\n")
+            file.write("\n")
+            nlines += self.nstrings + 1
+
+        return nlines
+
     def to_ascii(self, split_by=6):
         """Exports the tab to a text file."""
         if self.tab is None:
             return
 
-        notes_str: list = self.to_string()
-        tabs = []
-        for i, string in enumerate(notes_str):
-            bars = string.split("|")
-            note_tab = []
-            header = f"{self.tuning.strings[i].degree}||" if len(self.tuning.strings[i].degree) > 1 else f"{self.tuning.strings[i].degree} ||"
-            for z in range(0, len(bars), split_by):
-                merged_measures = functools.reduce(lambda x, y: f"{x}|{y}", bars[z:z+split_by], "")
-                note_tab += [f"{header}{merged_measures}|"]
-            tabs += [note_tab]
-
-        output_file = Path(f"{self.name}").with_suffix(".txt") if self.output_file is None else self.output_file
-        with open(output_file, "w") as file:
-            for i in range(len(tabs[0])):
-                for tab in tabs:
-                    file.write(tab[i] + "\n")
-                file.write("\n")
+        with self.stage("to_ascii") as counts:
+            output_file = Path(f"{self.name}").with_suffix(".txt") if self.output_file is None else self.output_file
+            with open(output_file, "w") as file:
+                counts["lines"] = self.write_ascii(file, split_by)
 
     def __repr__(self):
         """Used to print out the tab.
@@ -3,11 +3,29 @@ import numpy as np
 import tuttut.logic.midi_utils as midi_utils
 from pretty_midi import note_number_to_name, note_name_to_number
 import pretty_midi
+from bisect import bisect_left
 from collections import defaultdict
+from typing import NamedTuple
 
 
 class Note:
-    """Note object."""
+    """Note object.
+
+    Notes are interned by pitch: Note(pitch) always returns the same object for the same pitch.
+    """
+    __slots__ = ("pitch",)
+
+    names = [note_number_to_name(pitch) for pitch in range(128)]
+    _interned = {}
+
+    def __new__(cls, pitch: int):
+        pitch = int(pitch)
+        note = cls._interned.get(pitch)
+        if note is None:
+            note = super().__new__(cls)
+            note.pitch = pitch
+            cls._interned[pitch] = note
+        return note
 
     def __init__(self, pitch: int):
         """Constructor for the Note object.
@@ -16,25 +34,43 @@ class Note:
             pitch (int) : MIDI note number of the note
         """
 
-        self.pitch = pitch
-        self.name = note_number_to_name(pitch)
-        self.degree = self.name[:-1]
-        self.octave = self.name[-1]
+    @property
+    def name(self):
+        """Returns the name of the note (ex : C#4)."""
+        return self.names[self.pitch] if 0 <= self.pitch < len(self.names) else note_number_to_name(self.pitch)
+
+    @property
+    def degree(self):
+        return self.name[:-1]
+
+    @property
+    def octave(self):
+        return self.name[-1]
 
     def __eq__(self, other):
         """States the rules for whether or not 2 notes are equal.
 
-        Two notes are considered equal if they are note objects and their degrees and octaves are the same.
+        Two notes are considered equal if they are note objects and their pitches are the same.
         """
         return isinstance(other, Note) and self.pitch == other.pitch
 
     def __hash__(self):
         """Computes the hash for the Note."""
-        return hash((self.name, id(self)))
+        return hash(self.pitch)
+
+    def __reduce__(self):
+        """Pickles the Note by pitch, so that it is interned again when unpickled."""
+        return (Note, (self.pitch,))
 
     def __repr__(self):
         """Returns a representation of the Note."""
-        return self.name + "-" + str(hash(self))[2:4]
+        return self.name
+
+
+class Position(NamedTuple):
+    """Position on a fretboard."""
+    string: int
+    fret: int
 
 
 class Degree(Enum):  # Degree of a note enum
@@ -156,8 +192,20 @@ class Measure:
         self.measure_start = measure_start
         self.measure_end = measure_end
 
-        self.timeline = midi_utils.get_events_between(self.tab.timeline, measure_start, measure_end)
+        # Range of the events of the measure in the sorted events of the tab
+        self.event_start = bisect_left(self.tab.event_ticks, measure_start)
+        self.event_end = bisect_left(self.tab.event_ticks, measure_end)
 
     @property
     def duration_ticks(self):
         return self.measure_end - self.measure_start
+
+    @property
+    def events(self):
+        """Returns the events of the measure.
+
+        Returns:
+            Iterator: Tick and event pairs, sorted by tick
+        """
+        for ievent in range(self.event_start, self.event_end):
+            yield self.tab.event_ticks[ievent], self.tab.events[ievent]
@@ -1,4 +1,4 @@
-from logic.midi_utils import *
+from tuttut.logic.midi_utils import *
 import numpy as np
 import math
 
@@ -15,8 +15,11 @@ def get_tab_positions(tab_json):
 
 
 def get_tab_difficulty(tab, weights):
+    return get_positions_difficulty(get_tab_positions(tab), weights)
+
+
+def get_positions_difficulty(positions, weights):
     total_difficulty = 0
-    positions = get_tab_positions(tab)
     for i in range(len(positions)):
         total_difficulty += get_position_difficulty(positions[i], positions[i-1] if i > 0 else None, weights)
     return total_difficulty
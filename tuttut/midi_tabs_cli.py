@@ -1,7 +1,13 @@
 import pretty_midi
 from tuttut.logic.tab import Tab
 from tuttut.logic.theory import Tuning, Diatonic
+from tuttut.logic.fingering_cache import default_fingering_cache
+from tuttut.logic.batch import BatchConverter, collect_sources, MIDI_SUFFIXES
+from tuttut.logic.profiling import Profiler
+from tuttut.logic.parts import tab_parts, write_parts
 import argparse
+import json
+import sys
 import traceback
 from time import time
 import numpy as np
@@ -16,21 +22,84 @@ def parse_args():
         argparse.ArgumentParser: The parser object
     """
     parser = argparse.ArgumentParser(description="MIDI to stringed instrument tabs convertor")
-    parser.add_argument("source", metavar="src", type=Path, help="File(path) of MIDI file to convert")
-    parser.add_argument("-t", "--target", metavar="target", type=Path, help="Target file(path)", default=None)
+    parser.add_argument("source", metavar="src", type=Path, nargs="+",
+                        help="File(path) of MIDI file to convert. Several files, directories, glob patterns or manifest files (one path per line) convert in batch")
+    parser.add_argument("-t", "--target", metavar="target", type=Path, help="Target file(path), target directory in batch mode", default=None)
     parser.add_argument("-tu", "--tuning", metavar="tuning", type=str, help="Tuning in string form, from low to high. For example 'D4G4B4E5'", default=None)
     parser.add_argument("-f", "--frets", metavar="frets", type=int, help="Amount of frets on instrument", default=20)
     parser.add_argument("-s", "--split", metavar="split", type=int, help="Split bars into new line after x amount of measures", default=6)
     parser.add_argument("-dt", "--diatonic", help="If specified, uses diatonic scale", action="store_true")
     parser.add_argument("-dtm", "--diatonic-mode", metavar="diatonic_mode", type=str, help="If specified, uses specified diatonic mode. Defaults to Ionian (major) mode",
                         default=None, choices=Diatonic.Modes._member_names_)
+    parser.add_argument("-d", "--decoder", metavar="decoder", type=str, help="Decoder used to choose fingerings, 'segment' only considers transitions between consecutive events, 'beam' also keeps only the most likely fingerings of each event. Defaults to viterbi",
+                        default="viterbi", choices=Tab.decoders)
+    parser.add_argument("-bw", "--beam-width", metavar="beam_width", type=int, help="Number of fingerings kept per event by the beam decoder. Defaults to 32", default=32)
+    parser.add_argument("-r", "--compress-runs", help="Decodes each run of a repeated chord as one event that keeps its fingering, faster on rhythm parts", action="store_true")
+    parser.add_argument("--no-reduce-chords", dest="reduce_chords", help="Leaves the chords that can't be played empty instead of playing their largest playable subset", action="store_false")
+    parser.add_argument("-mc", "--max-candidates", metavar="max_candidates", type=int, help="Number of easiest fingerings of each chord kept for decoding, faster on dense chords. Defaults to all of them", default=None)
+    parser.add_argument("-mr", "--max-difficulty-ratio", metavar="max_difficulty_ratio", type=float, help="Leaves out the fingerings of each chord more than this ratio harder than its easiest one. Defaults to none", default=None)
+    parser.add_argument("-c", "--cache", metavar="cache", type=Path, help="Fingering cache file, loaded if it exists and saved after conversion", default=None)
+    parser.add_argument("-w", "--workers", metavar="workers", type=int, help="Number of worker processes converting files in batch mode, parts in parts mode, or enumerating the fingerings of the chords of a single file. Defaults to the number of CPUs. For a single file it is a maximum, one process is started per 20000 note options of its distinct chords, so most songs are enumerated without starting any", default=None)
+    parser.add_argument("--timeout", metavar="timeout", type=float, help="Maximum conversion time of a file in batch mode, in seconds", default=None)
+    parser.add_argument("-e", "--export", metavar="export", type=str, help="Also saves the tab next to the text file in this format, to reload it without converting again",
+                        default=None, choices=["npz", "jsonl", "json"])
+    parser.add_argument("--parts", help="Tabs each instrument separately, in parallel, into one multi-part text file", action="store_true")
+    parser.add_argument("-p", "--profile", metavar="profile", type=Path, help="JSON file of the time, peak memory and counts of each conversion stage, '-' prints it on stdout and the other messages on stderr", default=None)
     return parser.parse_args()
 
 
+def write_profile(path, report):
+    """Writes a profiling report as JSON.
+
+    Args:
+        path (Path): JSON file, '-' prints the report on the standard output
+        report (dict): Profiling report
+    """
+    if str(path) == "-":
+        print(json.dumps(report, indent=4), file=sys.__stdout__)
+    else:
+        with open(path, "w") as file:
+            json.dump(report, file, indent=4)
+
+
+def run_batch(args, tuning_options, options):
+    """Converts all the MIDI files of the sources on a pool of workers and prints their status.
+
+    Args:
+        args (argparse.Namespace): Parsed arguments
+        tuning_options (dict): Arguments of the Tuning
+        options (dict): Arguments of the conversion of a file
+    """
+    files = collect_sources(args.source)
+    if args.target is not None:
+        args.target.mkdir(parents=True, exist_ok=True)
+
+    def print_result(result):
+        print(f"[{result['status']}] {result['source']} ({round(result['time'], 2)}s)")
+        if result["error"] is not None:
+            print(f"    {result['error'].splitlines()[-1]}")
+
+    converter = BatchConverter(tuning_options, options, workers=args.workers, timeout=args.timeout, cache_path=args.cache)
+    report = converter.run(files, target_dir=args.target, callback=print_result)
+    summary = report["summary"]
+
+    if args.profile is not None:
+        write_profile(args.profile, report)
+
+    print(f"Converted {summary['ok']}/{summary['files']} files in {round(summary['time'], 2)}s "
+          f"({round(summary['files_per_second'], 2)} files/s), {summary['failed']} failed")
+    if summary["failed"] > 0:
+        raise SystemExit(1)
+
+
 if __name__ == "__main__":
     args = parse_args()
-    source: Path = args.source
-    target: Path = args.target if args.target is not None else Path(f"./{args.source.with_suffix(".txt")}")
+    if args.profile is not None and str(args.profile) == "-":
+        # Only the profile is printed on the standard output, so that it can be piped, the messages go to stderr
+        sys.stdout = sys.stderr
+    batch: bool = len(args.source) > 1 or args.source[0].suffix.lower() not in MIDI_SUFFIXES
+    source: Path = args.source[0]
+    target: Path = args.target if args.target is not None else Path(f"./{source.with_suffix('.txt')}")
     diatonic: bool = args.diatonic
     diatonic_mode: Diatonic.Modes = Diatonic.Modes.from_str(args.diatonic_mode) if args.diatonic_mode is not None else Diatonic.Modes.IONIAN
     frets: int = args.frets if args.frets is not None else 20
@@ -47,15 +116,50 @@ if __name__ == "__main__":
 
     weights = {'b': 1, 'height': 1, 'length': 1, 'n_changed_strings': 1}
 
+    if batch:
+        print(f"Using tuning: {tuning}")
+        run_batch(args, {"strings": tuning, "diatonic": (diatonic, diatonic_mode), "nfrets": frets},
+                  {"split_by": split_by, "weights": weights, "decoder": args.decoder, "beam_width": args.beam_width,
+                   "compress_runs": args.compress_runs, "reduce_chords": args.reduce_chords,
+                   "max_candidates": args.max_candidates, "max_difficulty_ratio": args.max_difficulty_ratio,
+                   "profile": args.profile is not None, "export": args.export, "parts": args.parts})
+        raise SystemExit()
+
     try:
         start = time()
+        if args.cache is not None and args.cache.exists():
+            default_fingering_cache.load(args.cache)
         print(f"Using tuning: {tuning}")
         if diatonic:
             print(f"In {diatonic_mode.name} diatonic mode")
         f = pretty_midi.PrettyMIDI(source.absolute().as_posix())
-        tab = Tab(source.stem, Tuning(strings=tuning, diatonic=(diatonic, diatonic_mode), nfrets=frets), f, weights=weights, output_file=target)
-        # tab = Tab(file.stem, Tuning([Note(69), Note(64), Note(60), Note(67)]), f, weights=weights)
-        tab.to_ascii(split_by=split_by)
+        tab_tuning = Tuning(strings=tuning, diatonic=(diatonic, diatonic_mode), nfrets=frets)
+        if args.parts:
+            tabs = tab_parts(source.stem, f, tab_tuning, workers=args.workers, profile=args.profile is not None,
+                             weights=weights, decoder=args.decoder, beam_width=args.beam_width, compress_runs=args.compress_runs,
+                             reduce_chords=args.reduce_chords, max_candidates=args.max_candidates,
+                             max_difficulty_ratio=args.max_difficulty_ratio)
+            write_parts(tabs, target, split_by=split_by)
+            print(f"Tabbed {len(tabs)} parts")
+            if args.export is not None:
+                for ipart, tab in enumerate(tabs):
+                    tab.save(target.with_suffix(f".part{ipart + 1}.{args.export}"))
+            if args.profile is not None:
+                write_profile(args.profile, {"source": str(source), "parts": [{"name": tab.name, **tab.profiler.report()} for tab in tabs]})
+        else:
+            profiler = Profiler() if args.profile is not None else None
+            tab = Tab(source.stem, tab_tuning, f, weights=weights, output_file=target,
+                      decoder=args.decoder, beam_width=args.beam_width, compress_runs=args.compress_runs,
+                      reduce_chords=args.reduce_chords, max_candidates=args.max_candidates,
+                      max_difficulty_ratio=args.max_difficulty_ratio, workers=args.workers, profiler=profiler)
+            # tab = Tab(file.stem, Tuning([Note(69), Note(64), Note(60), Note(67)]), f, weights=weights)
+            tab.to_ascii(split_by=split_by)
+            if args.export is not None:
+                tab.save(target.with_suffix(f".{args.export}"))
+            if profiler is not None:
+                write_profile(args.profile, {"source": str(source), **profiler.report()})
+        if args.cache is not None:
+            default_fingering_cache.save(args.cache)
         print(f"Time taken: {round(time() - start, 2)}s")
 
     except Exception as e: